@@ -8,44 +8,48 @@ simulation interface
 import csv
 import json
 import logging
+import os
+import pickle
 import random
 
 from abc import ABC
 from abc import abstractmethod
-from dataclasses import dataclass
-from dataclasses import field
 from datetime import datetime
-from enum import Enum
-from functools import total_ordering
 from functools import wraps
-from heapq import heappop
-from heapq import heappush
+from math import inf
 from time import time
-from typing import Any
+from types import MethodType
 
 from iams.exceptions import StopSimulation
+from iams.utils.events import AttributeCallback
+from iams.utils.events import CallableCallback
+from iams.utils.events import ProfiledCallback
+# the event sets are re-exported for the configuration of simulations
+from iams.utils.events import CalendarQueue  # noqa: F401 pylint: disable=unused-import
+from iams.utils.events import EventHeap  # noqa: F401 pylint: disable=unused-import
+from iams.utils.events import Priority
+from iams.utils.events import Queue  # noqa: F401 pylint: disable=unused-import
+from iams.utils.events import QueueHeap
+from iams.utils.state import StateRegistry
+from iams.utils.variates import Variates
+from iams.utils.writer import BackgroundWriter
+from iams.utils.writer import get_writer
 
 
 logger = logging.getLogger(__name__)
 
 
-class Priority(Enum):
-    """
-    Event-states enum
-    """
-    HIGHEST = 1
-    HIGH = 3
-    NORMAL = 5
-    LOW = 7
-    LOWEST = 9
-
-
 class Agent(ABC):
     """
     basic agent class for simulations
     """
     # pylint: disable=no-member
 
+    # names of numeric state fields kept in the simulations state registry
+    state_fields = ()
+    # view of the state fields (in the order of state_fields), set on registration
+    state = None
+
     def __call__(self, simulation, dryrun):
         """
         init agent in simulation
@@ -76,6 +80,9 @@ class Agent(ABC):
 def manage_random_state(func):
     """
     manages the random-state to get consistend results between different simulation runs
+
+    this swaps the global random-state on every step, use the streams of
+    :meth:`SimulationInterface.get_random` instead
     """
     def generator(seed, args, kwargs):
         random.seed(seed)
@@ -94,90 +101,54 @@ def manage_random_state(func):
     return wrapper
 
 
-@total_ordering
-@dataclass(frozen=True)
-class Queue:  # pylint: disable=too-many-instance-attributes
-    """
-    Storage of simulation events
-    """
-    time: float = field(compare=True, repr=True, hash=False)
-    obj: Any = field(compare=False, repr=False, hash=False)
-    callback: str = field(compare=False, repr=True, hash=False)
-    dt: float = field(compare=True, repr=False, hash=False)  # pylint: disable=invalid-name
-    priority: Priority = field(default=Priority.NORMAL, compare=True, repr=True, hash=True)
-    args: list = field(compare=False, repr=False, default_factory=list, hash=False)
-    kwargs: dict = field(compare=False, repr=False, default_factory=dict, hash=False)
-    deleted: bool = field(compare=False, repr=False, hash=False, default=False)
-
-    def __str__(self):
-        return "%.4f:%s:%s" % (self.time, self.obj, self.callback)  # pylint: disable=consider-using-f-string
-
-    def __lt__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) < (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __le__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) <= (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __eq__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) == (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __ne__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) != (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __ge__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) >= (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __gt__(self, other):
-        if isinstance(other, Queue):
-            return (self.time, self.priority.value, other.dt) > (other.time, other.priority.value, self.dt)
-        raise NotImplementedError
-
-    def __post_init__(self):
-        if isinstance(self.priority, str):
-            # pylint: disable=no-member
-            try:
-                priority = Priority[self.priority.upper()]
-            except KeyError:
-                priority = Priority.NORMAL
-            object.__setattr__(self, 'priority', priority)
-
-    def cancel(self):
-        """
-        cancel event from queue
-        """
-        object.__setattr__(self, 'deleted', True)
-
-
 class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
     """
     simulation interface
     """
+    # the methods are the hooks and helpers which the simulations and their agents call or override
+    # pylint: disable=too-many-public-methods
+    # event set used to store the scheduled events
+    queue_class = QueueHeap
+    # process events sharing the time and priority as a batch
+    batch_dispatch = False
+    # serializer used for checkpoints (needs to provide dump and load)
+    checkpoint_serializer = pickle
+    # number of scheduled events between calls of periodic
+    periodic_events = 1000
+    # output format of write_columns ('npy', 'parquet' or 'csv') and number of records per block
+    columns_format = 'npy'
+    columns_block = 65536
+    # number of chunks queued for a background thread writing the output (None writes from the event loop)
+    output_queue = None
 
     def __init__(self, df, name, folder, fobj, seed, start, stop):  # pylint: disable=too-many-arguments
         logger.info("=== Start: %s", datetime.now())
         logger.info("=== Initialize %s", self.__class__.__qualname__)
         self._agents = {}
+        self._checkpoint = None
+        self._column_writer = None
+        self._csv_fieldnames = None
         self._csv_writer = None
         self._df = df
         self._events = 0
         self._fobj = fobj
         self._folder = folder
+        self._functions = {}
         self._limit = stop
+        self._log_events = True
         self._name = name
-        self._queue = []
+        self._profile = None
+        self._progress = None
+        self._queue = self.queue_class(**self.queue_kwargs())
+        self._router = None
+        self._state = None
+        self._stopped = False
         self._time = start
         logger.info("=== Setting random-seed: %s", seed)
         random.seed(seed)
+        self._random = {}
+        self._seed = random.getrandbits(128) if seed is None else seed
+        self._variates = {}
         self.post_init()
 
     def post_init(self):
@@ -192,8 +163,15 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
         """
         return {}
 
+    def queue_kwargs(self):  # pylint: disable=no-self-use
+        """
+        returns the keyword arguments of the event set (i.e. the compaction settings)
+        """
+        return {}
+
     def __call__(self, dryrun, settings):
         timer = time()
+        self.bind_fast_mode()
 
         logger.info("=== Setup simulation")
         self.setup(**settings)
@@ -203,18 +181,282 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
             self._agents[agent](self, dryrun)
 
         logger.info("=== Start simulation")
-        while self._queue:
-            event = heappop(self._queue)
+        self.run(dryrun, timer)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # checkpoints and progress samples are enabled again by the runner after loading a checkpoint
+        state['_checkpoint'] = None
+        state['_progress'] = None
+        state['_fobj'] = None
+        state['_csv_writer'] = None
+        state['_csv_fieldnames'] = getattr(self._csv_writer, 'fieldnames', None)
+        return state
+
+    def __setstate__(self, state):
+        self._csv_fieldnames = None
+        self._log_events = True
+        self._router = None
+        self.__dict__.update(state)
+
+    def resume(self, dryrun):
+        """
+        continues a simulation loaded with :meth:`load_checkpoint`
+        """
+        timer = time()
+        self.bind_fast_mode()
+        logger.info("=== Resume simulation at %s", self._time)
+        self.run(dryrun, timer)
+
+    def warmup(self, dryrun, settings, until, path):
+        """
+        runs the simulation until ``until`` and saves a checkpoint to ``path`` (without stopping it)
+
+        The checkpoint is used as a warm start for runs which differ in
+        settings only applied after the warm-up (see :meth:`warm_start`).
+        """
+        self.bind_fast_mode()
+
+        logger.info("=== Setup simulation")
+        self.setup(**settings)
+
+        logger.info("=== Init agents")
+        for agent in sorted(self._agents):
+            self._agents[agent](self, dryrun)
+
+        logger.info("=== Start warm-up until %s", until)
+        limit, self._limit = self._limit, until
+        self.open_output()
+        try:
+            self.process(dryrun)
+            self._limit = limit
+
+            logger.info("=== Save warm-up at %s", self._time)
+            if not self.save_checkpoint(path):
+                raise TypeError(f"The state of {self} cannot be serialized")
+        finally:
+            self.close_output()
+
+    def warm_start(self, **settings):
+        """
+        called on a simulation restored from a warm-up checkpoint with the settings of the run
+
+        overwrite to apply the settings which differ from the warm-up to the
+        simulation and its agents
+        """
+
+    def run(self, dryrun, timer):
+        """
+        processes the events and stops the simulation
+        """
+        self.open_output()
+        try:
+            self.process(dryrun)
+            if self._progress is not None:
+                self.sample_progress()
+
+            # reduce processed events by events still in queue
+            self._events -= len(self._queue)
+
+            logger.info("=== Calling stop on agents")
+            for agent in sorted(self._agents):
+                try:
+                    self._agents[agent].stop(self, dryrun)
+                except (AttributeError, TypeError, NotImplementedError):
+                    logger.debug("%s does not provide a stop method", agent)
+            logger.info("=== Stop simulation")
+            self.stop(dryrun)
+        finally:
+            self.close_output()
+            if self._profile is not None:
+                self.save_profile()
+        timer = time() - timer
+        eps = self._events / timer
+        if timer < 90:  # pragma: no branch
+            timer = "%.3f seconds" % timer  # pylint: disable=consider-using-f-string
+        elif timer < 7200:  # pragma: no cover
+            timer = "%.3f minutes" % (timer / 60)  # pylint: disable=consider-using-f-string
+        else:  # pragma: no cover
+            timer = "%.3f hours" % (timer / 3600)  # pylint: disable=consider-using-f-string
+        logger.info("=== End: %s", datetime.now())
+        logger.info("=== Processed %s events in %s (%.2f per second)", self._events, timer, eps)
+        logger.info(
+            "=== Queue size: %s (peak %s), cancelled: %s (pending %s, %.2f%%), compactions: %s",
+            len(self._queue),
+            self._queue.peak,
+            self._queue.cancellations,
+            self._queue.cancelled,
+            100 * self._queue.cancelled / max(len(self._queue), 1),
+            self._queue.compactions,
+        )
+
+    def bind_fast_mode(self):
+        """
+        disables the logging of scheduled events if the logger is not enabled for DEBUG
+        """
+        self._log_events = logger.isEnabledFor(logging.DEBUG)
+        if not self._log_events:
+            logger.info("=== Using fast mode (logging of events disabled)")
+
+    def enable_checkpoints(self, path, interval):
+        """
+        saves a checkpoint to ``path`` every ``interval`` seconds (wall-time)
+        """
+        self._checkpoint = {'path': path, 'interval': interval, 'next': time() + interval}
+
+    def save_checkpoint(self, path=None):
+        """
+        saves the state of the simulation (event queue, time, agents, random-state, ...)
+
+        Returns False if the state cannot be serialized. In this case no
+        further checkpoints are saved.
+        """
+        if path is None:
+            path = self._checkpoint['path']
+        self.flush_output()
+        data = {
+            'simulation': self,
+            'random': random.getstate(),
+            'position': self._fobj.tell(),
+        }
+        try:
+            with open(path + '.tmp', 'wb') as fobj:
+                self.checkpoint_serializer.dump(data, fobj)
+        except (AttributeError, TypeError, pickle.PicklingError) as exception:
+            logger.warning("Cannot save checkpoint, checkpoints are disabled: %s", exception)
+            self._checkpoint = None
+            os.remove(path + '.tmp')
+            return False
+        os.replace(path + '.tmp', path)
+        logger.debug("Saved checkpoint at %.3f to %s", self._time, path)
+        return True
+
+    @classmethod
+    def load_checkpoint(cls, path, fobj, name=None):
+        """
+        loads a simulation from a checkpoint and truncates fobj to the checkpoints position
+
+        ``name`` renames the simulation (used to start several runs from a warm-up)
+        """
+        with open(path, 'rb') as checkpoint:
+            data = cls.checkpoint_serializer.load(checkpoint)
+        simulation = data['simulation']
+        if not isinstance(simulation, cls):
+            raise TypeError(f"{path} contains no checkpoint of {cls.__qualname__}")
+
+        random.setstate(data['random'])
+        fobj.seek(data['position'])
+        fobj.truncate()
+        simulation._fobj = fobj  # pylint: disable=protected-access
+        if name is not None:
+            simulation._name = name  # pylint: disable=protected-access
+        if simulation._csv_fieldnames is not None:  # pylint: disable=protected-access
+            simulation._csv_writer = csv.DictWriter(fobj, fieldnames=simulation._csv_fieldnames)  # pylint: disable=protected-access  # noqa: E501
+        simulation.attach_output(fobj)
+        return simulation
+
+    def next_periodic(self):
+        """
+        returns the number of scheduled events at which periodic is called next
+        """
+        progress = self._progress
+        if self._checkpoint is None and (progress is None or progress['interval'] is None):
+            result = inf
+        else:
+            result = self._events + self.periodic_events
+        if progress is not None and progress['events'] is not None:
+            result = min(result, progress['last'][1] + progress['events'])
+        return result
+
+    def periodic(self):
+        """
+        called from the event loop every ``periodic_events`` scheduled events, returns :meth:`next_periodic`
+        """
+        if self._checkpoint is not None and time() >= self._checkpoint['next']:
+            if self.save_checkpoint():
+                self._checkpoint['next'] = time() + self._checkpoint['interval']
+        progress = self._progress
+        if progress is not None:
+            last_time, last_events = progress['last']
+            if progress['events'] is not None and self._events >= last_events + progress['events'] or \
+                    progress['interval'] is not None and time() >= last_time + progress['interval']:
+                self.sample_progress()
+        return self.next_periodic()
+
+    def enable_progress(self, path, events=None, interval=None, append=False):
+        """
+        samples the progress every ``events`` scheduled events and/or every ``interval`` seconds (wall-time)
+
+        the samples (wall-time, simulated time, processed events, events per
+        second, queue size, cancelled events in the queue and the estimated
+        remaining seconds if the simulation has a stop time) are appended to
+        the CSV file ``path`` (or only logged if path is None)
+        """
+        self._progress = {
+            'events': events,
+            'interval': interval,
+            'last': (time(), self._events),
+            'path': path,
+            'start': (time(), self._time),
+        }
+        if path is not None and (not append or not os.path.exists(path)):
+            with open(path, 'w', encoding='utf-8') as fobj:
+                fobj.write('wall,time,events,events_per_second,queue,cancelled,eta\n')
+
+    def sample_progress(self):
+        """
+        writes a sample of the progress
+        """
+        progress = self._progress
+        now = time()
+        last_time, last_events = progress['last']
+        rate = (self._events - last_events) / max(now - last_time, 1e-9)
+        queue = len(self._queue)
+
+        start_time, start = progress['start']
+        if self._limit is None or self._time <= start:
+            eta = ''
+        else:
+            done = min((self._time - start) / (self._limit - start), 1.0)
+            eta = f'{(now - start_time) * (1.0 - done) / done:.1f}'
+
+        progress['last'] = (now, self._events)
+        if progress['path'] is not None:
+            with open(progress['path'], 'a', encoding='utf-8') as fobj:
+                fobj.write(f'{now:.3f},{self._time},{self._events - queue},{rate:.1f},{queue},{self._queue.cancelled},{eta}\n')  # noqa: E501
+        logger.info("=== Progress: %s events at %.3f (%.0f per second, queue %s), eta %ss", self._events - queue, self._time, rate, queue, eta or '-')  # noqa: E501
+
+    def process(self, dryrun):
+        """
+        processes the events until the queue is empty or the limit is reached
+        """
+        if self.batch_dispatch:
+            self.process_batches(dryrun)
+        else:
+            self.process_events(dryrun)
+
+    def process_events(self, dryrun):
+        """
+        processes the events one by one
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        periodic = self.next_periodic()
+        queue = self._queue
+        while queue:
+            if self._events >= periodic:
+                periodic = self.periodic()
+
+            event = queue.pop()
 
             if event.deleted:
                 continue
 
             if self._limit is not None and event.time > self._limit:
-                self._events -= 1
+                queue.push_back(event)
                 break
 
             delta = event.time - self._time
-            if delta > 0:  # pragma: no branch
+            if debug and delta > 0:  # pragma: no branch
                 logger.debug("Update timestamp: %.3f", event.time)
 
             # callback to act interact with event, gather statistics, etc
@@ -225,32 +467,211 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
 
             # run event
             try:
-                getattr(event.obj, event.callback)(self, *event.args, **event.kwargs)
+                event.function(event.obj, self, *event.args, **event.kwargs)
             except StopSimulation as exception:
                 logger.info("Simulation stopped: %s", exception)
+                self._stopped = True
                 break
 
-        # reduce processed events by events still in queue
-        self._events -= len(self._queue)
+    def process_batches(self, dryrun):
+        """
+        processes all events sharing the time and priority as a batch
 
-        logger.info("=== Calling stop on agents")
-        for agent in sorted(self._agents):
+        :meth:`batch_callback` is called once per batch (if it is overwritten,
+        otherwise :meth:`event_callback` is called before every event like in
+        :meth:`process_events`). The events are executed in exactly the same
+        order as in :meth:`process_events`, events with a higher priority
+        which are scheduled during the batch are executed before the remaining
+        events.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        queue = self._queue
+        callbacks = self.get_callbacks()
+        batch_callback, event_callback = callbacks
+
+        periodic = self.next_periodic()
+        while queue:
+            if self._events >= periodic:
+                periodic = self.periodic()
+
+            head = queue.peek()
+            if head is None or self._limit is not None and head.time > self._limit:
+                break
+
+            batch = queue.pop_batch()
+            delta = head.time - self._time
+            if debug and delta > 0:  # pragma: no branch
+                logger.debug("Update timestamp: %.3f", head.time)
+
+            # callback to act interact with events, gather statistics, etc (like event_callback
+            # it is called before the time is updated, to see the state during the last ``dt``)
+            if batch_callback is not None:
+                batch_callback(batch, delta, dryrun)
+            elif event_callback is not None:
+                event_callback(head, delta, dryrun)
+
+            # update time
+            self._time = head.time
+
+            # run events
             try:
-                self._agents[agent].stop(self, dryrun)
-            except (AttributeError, TypeError, NotImplementedError):
-                logger.debug("%s does not provide a stop method", agent)
-        logger.info("=== Stop simulation")
-        self.stop(dryrun)
-        timer = time() - timer
-        eps = self._events / timer
-        if timer < 90:  # pragma: no branch
-            timer = "%.3f seconds" % timer  # pylint: disable=consider-using-f-string
-        elif timer < 7200:  # pragma: no cover
-            timer = "%.3f minutes" % (timer / 60)  # pylint: disable=consider-using-f-string
-        else:  # pragma: no cover
-            timer = "%.3f hours" % (timer / 3600)  # pylint: disable=consider-using-f-string
-        logger.info("=== End: %s", datetime.now())
-        logger.info("=== Processed %s events in %s (%.2f per second)", self._events, timer, eps)
+                self.dispatch_batch(batch, callbacks, dryrun)
+            except StopSimulation as exception:
+                logger.info("Simulation stopped: %s", exception)
+                self._stopped = True
+                break
+
+    def get_callbacks(self):
+        """
+        returns the overwritten :meth:`batch_callback` and :meth:`event_callback` of a batch dispatch (or None)
+
+        event_callback is only returned if batch_callback is not overwritten
+        """
+        cls = self.__class__
+        if cls.batch_callback is not SimulationInterface.batch_callback:
+            return self.batch_callback, None
+        if cls.event_callback is not SimulationInterface.event_callback:
+            return None, self.event_callback
+        return None, None
+
+    def dispatch_batch(self, batch, callbacks, dryrun):
+        """
+        executes the events of a batch (and the events scheduled before its remaining events)
+        """
+        event_callback = callbacks[1]
+        remaining = len(batch)
+        try:
+            for i, event in enumerate(batch):
+                remaining = len(batch) - i
+                if event.deleted:  # cancelled by a previous event of the batch
+                    continue
+                if i:
+                    self.dispatch_preceding(event, callbacks, dryrun)
+                    if event_callback is not None:
+                        event_callback(event, 0, dryrun)
+                remaining -= 1
+                event.function(event.obj, self, *event.args, **event.kwargs)
+        except StopSimulation:
+            # events remaining in the batch are still queued in process_events
+            self._events -= remaining
+            raise
+
+    def dispatch_preceding(self, event, callbacks, dryrun):
+        """
+        executes the events which were scheduled with a higher priority than event (or in the past)
+        """
+        batch_callback, event_callback = callbacks
+        queue = self._queue
+        time_, value = event.time, event.priority.value
+        head = queue.peek()
+        while head is not None and (head.time < time_ or head.time == time_ and head.priority.value < value):
+            queue.pop()
+            if batch_callback is not None:
+                batch_callback([head], 0, dryrun)
+            elif event_callback is not None:
+                event_callback(head, 0, dryrun)
+            head.function(head.obj, self, *head.args, **head.kwargs)
+            head = queue.peek()
+
+    def get_function(self, obj, callback):
+        """
+        returns the function of the callback, which is called with ``(obj, simulation, *args, **kwargs)``
+
+        ``callback`` is either the name of a method of ``obj`` or a callable,
+        which is called with ``(simulation, *args, **kwargs)``. Methods are
+        resolved on the class of ``obj`` and cached per class and callback
+        name, unless ``obj`` is a class or overrides the callback in its
+        ``__dict__``. An AttributeError is raised if ``obj`` has no such callback.
+        """
+        if not isinstance(callback, str):
+            return self.get_callable(obj, callback)
+        if isinstance(obj, type) or callback in getattr(obj, '__dict__', ()):
+            # the callback is not resolved on the class of obj
+            return self.get_method(obj, callback)
+        key = (obj.__class__, callback)
+        try:
+            return self._functions[key]
+        except KeyError:
+            function = self._functions[key] = self.get_method(obj, callback)
+            return function
+
+    def get_callable(self, obj, callback):
+        """
+        returns the function of a callable passed as callback (see get_function)
+        """
+        if isinstance(callback, MethodType) and callback.__self__ is obj:
+            function = callback.__func__
+        elif callable(callback):
+            function = CallableCallback(callback)
+        else:
+            raise TypeError(f"{callback!r} is not callable")
+        if self._profile is None:
+            return function
+        return self.profile_function(obj, getattr(callback, '__name__', repr(callback)), function)
+
+    def get_method(self, obj, callback):
+        """
+        returns the function of the callback named callback without using the cache (see get_function)
+        """
+        method = getattr(obj, callback)
+        if isinstance(method, MethodType) and method.__self__ is obj:
+            function = method.__func__
+        elif callable(method):
+            function = AttributeCallback(callback)
+        else:
+            raise TypeError(f"{obj!r}.{callback} is not callable")
+        if self._profile is None:
+            return function
+        return self.profile_function(obj, callback, function)
+
+    def profile_function(self, obj, callback, function):
+        """
+        returns function wrapped to collect the statistics of (class of obj, callback)
+        """
+        key = (obj.__class__.__qualname__, callback)
+        try:
+            stats = self._profile['stats'][key]
+        except KeyError:
+            stats = self._profile['stats'][key] = [0, 0.0, 0]
+        return ProfiledCallback(function, stats)
+
+    def enable_profiling(self, path=None):
+        """
+        collects the calls, wall-time and scheduled events per agent class and callback
+
+        the report is written to ``path`` (or logged) when the simulation
+        stops. Only events scheduled after this call are measured.
+        """
+        if self._profile is None:
+            self._profile = {'path': path, 'stats': {}}
+        else:
+            self._profile['path'] = path
+        self._functions = {}
+
+    def profile_report(self):
+        """
+        returns the profiling statistics as text (sorted by the cumulative wall-time)
+        """
+        stats = sorted(self._profile['stats'].items(), key=lambda item: (-item[1][1], item[0]))
+        total = sum(value[1] for _, value in stats) or 1.0
+        lines = [f"{'class':<30s} {'callback':<30s} {'calls':>10s} {'seconds':>10s} {'%':>6s} {'us/call':>10s} {'fan-out':>8s}"]  # noqa: E501
+        for (cls, callback), (calls, seconds, scheduled) in stats:
+            lines.append(
+                f"{cls:<30s} {callback:<30s} {calls:>10d} {seconds:>10.3f} {100 * seconds / total:>6.2f}"
+                f" {1e6 * seconds / max(calls, 1):>10.2f} {scheduled / max(calls, 1):>8.3f}",
+            )
+        return '\n'.join(lines) + '\n'
+
+    def save_profile(self):
+        """
+        writes (or logs) the profiling report
+        """
+        report = self.profile_report()
+        if self._profile['path'] is None:
+            logger.info("=== Profile:\n%s", report)
+            return
+        with open(self._profile['path'], 'w', encoding='utf-8') as fobj:
+            fobj.write(report)
 
     def __str__(self):
         return f'{self.__class__.__qualname__}({self._name})'
@@ -265,13 +686,72 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
     def get_state(self, **kwargs):
         """
         write system state
+
+        agents with ``state_fields`` only contribute these fields, which are read
+        from the state registry (as floats), asdict is used for the other agents
         """
         kwargs.update(self.asdict() or {})
         for agent, _ in self.df.agents():
-            for key, value in self._agents[agent].asdict().items():
+            obj = self._agents[agent]
+            if obj.state_fields:
+                continue
+            for key, value in obj.asdict().items():
                 kwargs[f'{agent}_{key}'] = value
+        if self._state is not None:
+            kwargs.update(zip(self._state.columns, self._state.values[:len(self._state)].tolist()))
         return kwargs
 
+    def get_state_array(self):
+        """
+        returns a copy of the state fields of all agents (see :meth:`get_state_columns`)
+        """
+        if self._state is None:
+            return None
+        return self._state.snapshot()
+
+    def get_state_columns(self):
+        """
+        returns the column names of :meth:`get_state_array`
+        """
+        if self._state is None:
+            return []
+        return self._state.columns
+
+    def get_random(self, obj=None):
+        """
+        returns an independent random generator for obj (an agent or its name) or the simulation
+
+        The streams only depend on the seed of the run and the name, so they
+        are reproducible independent of other agents, the order of the calls
+        and the partition an agent runs in. Agents should keep a reference to
+        their stream (i.e. in ``__call__``).
+        """
+        key = None if obj is None else str(obj)
+        try:
+            return self._random[key]
+        except KeyError:
+            generator = random.Random(str(self._seed) if key is None else f'{self._seed}/{key}')
+            self._random[key] = generator
+            return generator
+
+    def get_variates(self, obj=None, block=1024):
+        """
+        returns the buffered random variates (:class:`iams.utils.variates.Variates`) of obj or the simulation
+
+        The variates are derived from the seed of the run and the name like
+        :meth:`get_random` (but independent of its stream), i.e.::
+
+            self.processing_time = simulation.get_variates(self).expovariate(0.5)
+            duration = self.processing_time()
+        """
+        key = None if obj is None else str(obj)
+        try:
+            return self._variates[key]
+        except KeyError:
+            variates = Variates(f'{self._seed}' if key is None else f'{self._seed}/{key}', block)
+            self._variates[key] = variates
+            return variates
+
     def register(self, agent):
         """
         register agent
@@ -279,6 +759,10 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
         attrs = agent.attributes() or {}
         self._df.register_agent(str(agent), **attrs)
         self._agents[str(agent)] = agent
+        if agent.state_fields:
+            if self._state is None:
+                self._state = StateRegistry()
+            self._state.register(agent)
 
     def agent(self, name):
         """
@@ -295,23 +779,72 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
         except KeyError:
             pass
 
+    def partition_agents(self, partitions):
+        """
+        returns the sorted names of the agents of every partition (used by :mod:`iams.utils.sharding`)
+
+        Agents connected in the DF's topology (if the DF provides a graph as
+        ``topology``) are kept together, connected components larger than
+        an equal share are split in breadth-first order. The parts are
+        distributed greedily, largest first.
+        """
+        names = sorted(self._agents)
+        size = -(-len(names) // partitions)
+        graph = getattr(self._df, 'topology', None)
+        graph = graph.to_undirected() if hasattr(graph, 'to_undirected') else {}
+
+        parts = []
+        seen = set()
+        for name in names:
+            if name in seen:
+                continue
+            seen.add(name)
+            component = layer = [name]
+            while layer:
+                following = []
+                for node in layer:
+                    for other in sorted(graph[node]) if node in graph else []:
+                        if other not in seen and other in self._agents:
+                            seen.add(other)
+                            following.append(other)
+                component.extend(following)
+                layer = following
+            parts.extend(component[i:i + size] for i in range(0, len(component), size))
+
+        result = [[] for _ in range(partitions)]
+        for part in sorted(parts, key=lambda part: (-len(part), part[0])):
+            min(result, key=len).extend(part)
+        return [sorted(part) for part in result]
+
+    def set_router(self, router):
+        """
+        passes every scheduled event to ``router(obj, dt, callback, args, priority, kwargs)`` first (or None)
+
+        The router returns the handle of an event it takes over (i.e. to
+        send it to another process, see :mod:`iams.utils.sharding`) or None
+        to schedule the event in this simulation.
+        """
+        self._router = router
+
     def schedule(self, obj, dt, callback, *args, priority=Priority.NORMAL, **kwargs):  # pylint: disable=invalid-name
         """
         schedules a new event
-        """
+
+        ``callback`` is the name of a method of ``obj`` or a callable (i.e. a
+        bound method), which is called with ``(simulation, *args, **kwargs)``.
+        The callback is resolved here, so invalid names fail immediately.
+        """
+        function = self.get_function(obj, callback)
+        if self._router is not None:
+            handle = self._router(obj, dt, callback, args, priority, kwargs)
+            if handle is not None:
+                return handle
+        if not isinstance(callback, str):
+            callback = getattr(callback, '__name__', repr(callback))
         self._events += 1
-        event_time = self._time + dt
-        queue = Queue(
-            time=event_time,
-            priority=priority,
-            obj=obj,
-            callback=callback,
-            dt=dt,
-            args=args,
-            kwargs=kwargs,
-        )
-        logger.debug("Adding %s.%s at %s to queue (%s)", obj, callback, event_time, queue.priority.name)
-        heappush(self._queue, queue)
+        queue = self._queue.push(self._time + dt, obj, callback, dt, priority, args, kwargs, function)
+        if self._log_events:
+            logger.debug("Adding %s.%s at %s to queue (%s)", obj, callback, queue.time, queue.priority.name)
         return queue
 
     def write(self, data):
@@ -338,6 +871,55 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
             self._csv_writer.writeheader()
             self._csv_writer.writerow(data)
 
+    def write_columns(self, data):
+        """
+        buffers a data dictionary in typed columns which are written in blocks (see :attr:`columns_format`)
+        """
+        if self._column_writer is None:
+            self._column_writer = get_writer(self._fobj, self.columns_format, self.columns_block)
+        self._column_writer.write(data)
+
+    def open_output(self):
+        """
+        starts a background thread writing the output if :attr:`output_queue` is set
+        """
+        if self.output_queue is not None and self._fobj is not None:
+            logger.info("=== Writing output in a background thread (queue size %s)", self.output_queue)
+            self.attach_output(BackgroundWriter(self._fobj, self.output_queue))
+
+    def attach_output(self, fobj):
+        """
+        sets the simulations fileobject and attaches the writers to it
+        """
+        self._fobj = fobj
+        if self._column_writer is not None:
+            self._column_writer.attach(fobj)
+        if self._csv_writer is not None:
+            self._csv_writer = csv.DictWriter(fobj, fieldnames=self._csv_writer.fieldnames)
+
+    def flush_output(self):
+        """
+        writes the buffered columns and flushes the simulations fileobject
+        """
+        if self._column_writer is not None:
+            self._column_writer.flush()
+        self._fobj.flush()
+
+    def close_output(self):
+        """
+        writes the buffered columns, finalizes the output and stops the background thread
+        """
+        try:
+            if self._column_writer is not None:
+                self._column_writer.close()
+        finally:
+            if isinstance(self._fobj, BackgroundWriter):
+                fobj = self._fobj.fobj
+                try:
+                    self._fobj.close()
+                finally:
+                    self.attach_output(fobj)
+
     def get_time(self):
         """
         returns the current simulation timeframe
@@ -361,6 +943,19 @@ class SimulationInterface(ABC):  # pylint: disable=too-many-instance-attributes
         overwrite to process event callbacks
         """
 
+    def batch_callback(self, events, dt, dryrun):  # pylint: disable=invalid-name
+        """
+        overwrite to process batches of events (calls event_callback for every event by default)
+
+        it is called before the events are executed and the time is updated
+        (like event_callback), ``dt`` is the time since the previous batch
+        """
+        for event in events:
+            if event.deleted:
+                continue
+            self.event_callback(event, dt, dryrun)
+            dt = 0  # pylint: disable=invalid-name
+
     def asdict(self) -> dict:
         """
         returns the agent object's data as a dictionary
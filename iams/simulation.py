@@ -6,9 +6,13 @@
 Manages simulation configurations
 """
 
+from concurrent.futures import FIRST_COMPLETED
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
 from copy import deepcopy
+from functools import lru_cache
 from importlib import import_module
+from itertools import chain
 from itertools import product
 from logging.config import dictConfig
 from math import floor
@@ -16,7 +20,11 @@ from math import log10
 
 import argparse
 import logging
+import multiprocessing
 import os
+import shutil
+import sys
+import time
 import yaml
 
 try:
@@ -26,18 +34,30 @@ try:
 except ImportError:
     SENTRY = False
 
-# from iams.interfaces.df import DirectoryFacilitatorInterface
-
+from iams.interfaces.df import DirectoryFacilitatorInterface
 from iams.interfaces.simulation import SimulationInterface
 from iams.tests.df import DF
+from iams.utils.cache import ResultCache
+from iams.utils.cache import get_run_key
+from iams.utils.sharding import run_sharded
 
 
 logger = logging.getLogger(__name__)
 
+# seconds needed to import the modules of the classes in this process (see import_class)
+# and by the preload of this worker, until it is reported with its first run (see execute)
+IMPORTS = {'classes': 0.0, 'worker': 0.0}
+
 
-def process_config(path, config, dryrun=False, force=False, loglevel=logging.WARNING, dsn=None):  # pylint: disable=too-many-arguments  # noqa: E501
+def process_config(  # pylint: disable=too-many-arguments,too-many-branches,too-many-locals,too-many-statements
+        path, config, dryrun=False, force=False, loglevel=logging.WARNING, dsn=None,
+        checkpoint=None, resume=False, profile=False, progress=None, progress_events=None,
+        cache=None, cache_size=None):
     """
     processes a simulation config
+
+    with ``cache`` the results are reused based on the content of the runs
+    (see :mod:`iams.utils.cache`) instead of the existence of their data-files
     """
     path = os.path.abspath(path)
     folder = os.path.join(os.path.dirname(path), config.get("foldername", "results"))
@@ -67,6 +87,10 @@ def process_config(path, config, dryrun=False, force=False, loglevel=logging.WAR
     else:
         template = project
 
+    # runs which only differ in the products listed in warmup share a warm-up
+    warmup = config.get("warmup")
+    groups = {}
+
     count = 0
     for run_config in product(*products):
         run_config = dict(run_config)
@@ -74,11 +98,32 @@ def process_config(path, config, dryrun=False, force=False, loglevel=logging.WAR
 
         kwargs = prepare_run(count, folder, template, run_config, config.copy())
 
-        if not dryrun and not force and os.path.exists(kwargs['file_data']):  # pragma: no cover
+        resume_run = resume and not dryrun and os.path.exists(kwargs['file_checkpoint'])
+        if not dryrun and not force and not resume_run and not cache and os.path.exists(kwargs['file_data']):  # pragma: no cover  # noqa: E501
             continue
 
+        if warmup and not dryrun and not resume_run:
+            kwargs['warmup'] = prepare_warmup(folder, project, groups, warmup, run_config, kwargs['seed'])
+
+        if cache and not dryrun and not resume_run:
+            kwargs['cache'] = {
+                'files': get_cache_files(kwargs, profile, progress or progress_events),
+                'key': get_run_key(**kwargs),
+                'path': os.path.abspath(cache),
+                'size': cache_size,
+            }
+            result_cache = ResultCache(kwargs['cache']['path'], cache_size)
+            if force:
+                result_cache.delete(kwargs['cache']['key'])
+            elif result_cache.get(kwargs['cache']['key'], kwargs['cache']['files']):
+                logger.warning('Use cached results for "%s"', kwargs['name'])
+                continue
+
         if dryrun:
             kwargs['file_data'] = None
+            kwargs['file_checkpoint'] = None
+            kwargs['file_profile'] = None
+            kwargs['file_progress'] = None
 
         log_config = {
             'version': 1,
@@ -105,7 +150,7 @@ def process_config(path, config, dryrun=False, force=False, loglevel=logging.WAR
                     'level': logging.DEBUG if loglevel < logging.INFO else logging.INFO,
                     'formatter': 'debug' if loglevel < logging.INFO else "logfile",
                     'filename': kwargs.pop("file_log"),
-                    'mode': 'w',
+                    'mode': 'a' if resume_run else 'w',
                 },
             },
             'root': {
@@ -119,11 +164,80 @@ def process_config(path, config, dryrun=False, force=False, loglevel=logging.WAR
             log_config['root']['handlers'].append('file')
             log_config['handlers']['console']['level'] = logging.WARNING
             log_config['handlers']['console']['formatter'] = "logfile"
-        kwargs.update({'log_config': log_config, 'dryrun': dryrun, 'dsn': dsn})
+        kwargs.update({
+            'log_config': log_config,
+            'dryrun': dryrun,
+            'dsn': dsn,
+            'checkpoint': checkpoint,
+            'profile': profile,
+            'progress': progress,
+            'progress_events': progress_events,
+            'resume': resume_run,
+        })
 
         yield kwargs
 
 
+def get_cache_files(kwargs, profile=False, progress=False):
+    """
+    returns the output files of a run stored in the cache
+    """
+    files = {'data': kwargs['file_data'], 'log': kwargs['file_log']}
+    if kwargs['partitions'] and kwargs['partitions'] > 1:
+        for index in range(kwargs['partitions']):
+            files[f'data.{index}'] = f"{kwargs['file_data']}.{index}"
+    if profile:
+        files['profile'] = kwargs['file_profile']
+    if progress:
+        files['progress'] = kwargs['file_progress']
+    return files
+
+
+def prepare_warmup(folder, project, groups, warmup, run_config, seed):  # pylint: disable=too-many-arguments
+    """
+    prepare the warm-up of a run
+
+    The warm-up runs with the seed of the run, so a warm-started run gives
+    the results of the same run started cold. Only runs sharing the seed
+    share a warm-up, i.e. the seed must not depend on the products listed in
+    the warmup (the default seed is the name of the run).
+    """
+    late = warmup.get('products', [])
+    key = (seed, tuple((k, repr(v)) for k, v in sorted(run_config.items()) if k not in late))
+    index = groups.setdefault(key, len(groups) + 1)
+    name = f'{project}-warmup-{index}'
+    return {
+        'file_checkpoint': os.path.join(folder, name + '.checkpoint'),
+        'file_data': os.path.join(folder, name + '.dat'),
+        'file_log': os.path.join(folder, name + '.log'),
+        'name': name,
+        'seed': seed,
+        'time': float(warmup['time']),
+    }
+
+
+@lru_cache(maxsize=None)
+def import_class(module_name, class_name):
+    """
+    returns a class from a module (cached, as it is resolved for every run and agent)
+    """
+    start = time.perf_counter()
+    module = import_module(module_name)
+    IMPORTS['classes'] += time.perf_counter() - start
+    return getattr(module, class_name)
+
+
+def get_df(df):  # pylint: disable=invalid-name
+    """
+    returns the directory facilitator of a run (a new one, if none or its class was given)
+    """
+    if df is None:
+        return DF()
+    if isinstance(df, type):
+        return df()
+    return df
+
+
 def prepare_run(count, folder, template, run_config, config):
     """
     prepare a single run
@@ -132,43 +246,43 @@ def prepare_run(count, folder, template, run_config, config):
     seed = config.get('seed', name).format(count, **run_config)
     start = config.get('start', 0)
     stop = config.get('stop', None)
+    partitions = config.get('partitions', None)
+    lookahead = config.get('lookahead', None)
+    if partitions and partitions > 1 and (lookahead is None or lookahead <= 0):
+        raise ValueError('The configuration-file needs a positive "lookahead" setting with "partitions"')
 
     try:
         module_name, class_name = config["simulation-class"].rsplit('.', 1)
     except (KeyError, AttributeError) as exception:
         raise ValueError('The configuration-file needs a valid "simulation-class-setting') from exception
 
-    simcls = getattr(import_module(module_name), class_name)
+    simcls = import_class(module_name, class_name)
     if not issubclass(simcls, SimulationInterface):
         raise AssertionError(f"{simcls.__qualname__} needs to be a subclass of {SimulationInterface.__qualname__}")
 
-    try:
+    # only the class of the directory facilitator is passed, it is created in the worker (see get_df)
+    df = None  # pylint: disable=invalid-name
+    if isinstance(config.get("directory-facilitator"), str):
         module_name, class_name = config["directory-facilitator"].rsplit('.', 1)
-    except (KeyError, AttributeError):
-        df = DF()  # pylint: disable=invalid-name
-    else:
-        df = None
-        raise NotImplementedError("the directory facilitator cannot be changed")
-        # df = getattr(import_module(module_name), class_name)
-        # if not issubclass(df, DierctoryFacilitatorInterface):
-        #     raise TypeError(
-        #         "%s needs to be a subclass of %s",
-        #         df.__qualname__,
-        #         DirectoryFacilitatorInterface.__qualname__,
-        #     )
-
-    settings = config.get('settings', {})
+        df = import_class(module_name, class_name)  # pylint: disable=invalid-name
+        if not isinstance(df, type) or not issubclass(df, DirectoryFacilitatorInterface):
+            raise AssertionError(f"{df!r} needs to be a subclass of {DirectoryFacilitatorInterface.__qualname__}")
+
+    settings = dict(config.get('settings', {}))
     settings.update(run_config)
 
     for key in [
         "formatter",
         "simulation-class",
         "directory-facilitator",
+        "lookahead",
+        "partitions",
         "products",
         "seed",
         "settings",
         "start",
         "stop",
+        "warmup",
     ]:
         try:
             del config[key]
@@ -178,10 +292,15 @@ def prepare_run(count, folder, template, run_config, config):
     return {
         'config': config,
         'df': df,
+        'file_checkpoint': os.path.join(folder, name + '.checkpoint'),
         'file_data': os.path.join(folder, name + '.dat'),
         'file_log': os.path.join(folder, name + '.log'),
+        'file_profile': os.path.join(folder, name + '.profile'),
+        'file_progress': os.path.join(folder, name + '.progress'),
         'folder': folder,
+        'lookahead': lookahead,
         'name': name,
+        'partitions': partitions,
         'seed': seed,
         'settings': settings,
         'simcls': simcls,
@@ -196,7 +315,7 @@ def load_agent(agents, global_settings):
     """
     for agent in agents:
         module_name, class_name = agent["class"].rsplit('.', 1)
-        cls = getattr(import_module(module_name), class_name)
+        cls = import_class(module_name, class_name)
         settings = agent.get('settings', {})
         for name in agent.get('use_global', []):
             settings[name] = global_settings[name]
@@ -219,35 +338,120 @@ def load_agent(agents, global_settings):
             yield instance
 
 
-def run_simulation(  # pylint: disable=invalid-name,too-many-arguments
+def run_warmup(  # pylint: disable=invalid-name,too-many-arguments,unused-argument
         simcls, df, name, folder, settings, start, stop, seed, config,
-        dryrun, log_config, file_data, dsn):
+        dryrun, log_config, file_data, dsn, warmup, **kwargs):
     """
-    execute single simulation config
+    execute the warm-up shared by several simulation configs and save its checkpoint
     """
+    log_config = deepcopy(log_config)
+    log_config['handlers']['file']['filename'] = warmup['file_log']
     dictConfig(log_config)
     if dsn:
         logger.warning('Using sentry DSN %s', dsn)
         sentry_sdk.init(dsn)  # pylint: disable=abstract-class-instantiated
-    logger.warning('Start simulation "%s"', name)
+    logger.warning('Start warm-up "%s"', warmup['name'])
 
-    with open(file_data or os.devnull, "w", encoding='utf-8') as fobj:
-        # init simulation
+    with open(warmup['file_data'], "w", encoding='utf-8') as fobj:
         simulation = simcls(
-            df=df,
-            name=name,
+            df=get_df(df),
+            name=warmup['name'],
             folder=folder,
             fobj=fobj,
             start=start,
             stop=stop,
-            seed=seed,
+            seed=warmup['seed'],
         )
 
         for agent in load_agent(config.get('agents', []), settings):
             simulation.register(agent)
 
-        # run simulation
-        simulation(dryrun, settings)
+        simulation.warmup(dryrun, settings, warmup['time'], warmup['file_checkpoint'])
+
+
+def run_simulation(  # pylint: disable=invalid-name,too-many-arguments,too-many-locals,too-many-branches
+        simcls, df, name, folder, settings, start, stop, seed, config,
+        dryrun, log_config, file_data, dsn, file_checkpoint=None, checkpoint=None, resume=False, warmup=None,
+        partitions=None, lookahead=None, profile=False, file_profile=None,
+        progress=None, progress_events=None, file_progress=None, cache=None):
+    """
+    execute single simulation config
+
+    with ``partitions`` the agents are split on several processes, which
+    write their data to ``{file_data}.{index}`` (see :mod:`iams.utils.sharding`).
+    Resumed runs and runs started from a warm-up are not partitioned.
+
+    with ``profile`` the statistics of the callbacks are written to ``file_profile``
+    and with ``progress`` (seconds) or ``progress_events`` samples of the progress to ``file_progress``
+
+    with ``cache`` (see :func:`process_config`) the output files are stored in the result cache
+    """
+    dictConfig(log_config)
+    if dsn:
+        logger.warning('Using sentry DSN %s', dsn)
+        sentry_sdk.init(dsn)  # pylint: disable=abstract-class-instantiated
+
+    if resume:
+        logger.warning('Resume simulation "%s"', name)
+        with open(file_data, "r+", encoding='utf-8') as fobj:
+            simulation = simcls.load_checkpoint(file_checkpoint, fobj)
+            if checkpoint:
+                simulation.enable_checkpoints(file_checkpoint, checkpoint)
+            if profile:
+                simulation.enable_profiling(file_profile)
+            if progress or progress_events:
+                simulation.enable_progress(file_progress, progress_events, progress, append=True)
+            simulation.resume(dryrun)
+    elif warmup:
+        logger.warning('Start simulation "%s" from warm-up "%s"', name, warmup['name'])
+        shutil.copyfile(warmup['file_data'], file_data)
+        with open(file_data, "r+", encoding='utf-8') as fobj:
+            simulation = simcls.load_checkpoint(warmup['file_checkpoint'], fobj, name=name)
+            if checkpoint:
+                simulation.enable_checkpoints(file_checkpoint, checkpoint)
+            if profile:
+                simulation.enable_profiling(file_profile)
+            if progress or progress_events:
+                simulation.enable_progress(file_progress, progress_events, progress)
+            simulation.warm_start(**settings)
+            simulation.resume(dryrun)
+    else:
+        logger.warning('Start simulation "%s"', name)
+        with open(file_data or os.devnull, "w", encoding='utf-8') as fobj:
+            # init simulation
+            simulation = simcls(
+                df=get_df(df),
+                name=name,
+                folder=folder,
+                fobj=fobj,
+                start=start,
+                stop=stop,
+                seed=seed,
+            )
+
+            for agent in load_agent(config.get('agents', []), settings):
+                simulation.register(agent)
+
+            if partitions and partitions > 1:
+                if checkpoint:
+                    logger.warning("Checkpoints are not supported with partitions")
+                run_sharded(simulation, partitions, lookahead, dryrun, settings, seed=seed, path=file_data)
+            else:
+                if checkpoint and file_checkpoint:
+                    simulation.enable_checkpoints(file_checkpoint, checkpoint)
+                if profile:
+                    simulation.enable_profiling(file_profile)
+                if progress or progress_events:
+                    simulation.enable_progress(file_progress, progress_events, progress)
+
+                # run simulation
+                simulation(dryrun, settings)
+
+    if file_checkpoint and os.path.exists(file_checkpoint):
+        os.remove(file_checkpoint)
+
+    if cache:
+        ResultCache(cache['path'], cache['size']).put(cache['key'], cache['files'])
 
 
 def parse_command_line(argv=None):
@@ -291,6 +495,82 @@ def parse_command_line(argv=None):
         dest="single",
         help="Only run one instance",
     )
+    parser.add_argument(
+        '--checkpoint',
+        default=None,
+        dest="checkpoint",
+        help="Save a checkpoint every CHECKPOINT seconds",
+        metavar="CHECKPOINT",
+        type=float,
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        default=False,
+        dest="resume",
+        help="Resume runs from their latest checkpoint",
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        default=False,
+        dest="profile",
+        help="Write the calls and wall-time per agent class and callback to a .profile file",
+    )
+    parser.add_argument(
+        '--progress',
+        default=None,
+        dest="progress",
+        help="Write the progress to a .progress file every PROGRESS seconds",
+        metavar="PROGRESS",
+        type=float,
+    )
+    parser.add_argument(
+        '--progress-events',
+        default=None,
+        dest="progress_events",
+        help="Write the progress to a .progress file every N scheduled events",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        '--max-inflight',
+        default=None,
+        dest="max_inflight",
+        help="Submit at most N runs to the process pool at once (default: twice the number of CPUs)",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        '--max-tasks-per-child',
+        default=None,
+        dest="max_tasks_per_child",
+        help="Replace a worker after N runs (python 3.11 or newer)",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        '--start-method',
+        choices=multiprocessing.get_all_start_methods(),
+        default=None,
+        dest="start_method",
+        help="Start method of the workers",
+    )
+    parser.add_argument(
+        '--cache',
+        default=None,
+        dest="cache",
+        help="Reuse the results of runs with the same configuration from the directory CACHE",
+        metavar="CACHE",
+    )
+    parser.add_argument(
+        '--cache-size',
+        default=None,
+        dest="cache_size",
+        help="Remove the least recently used results when the cache is larger than SIZE megabytes",
+        metavar="SIZE",
+        type=float,
+    )
     parser.add_argument(
         '--dsn',
         default=None,
@@ -306,11 +586,11 @@ def parse_command_line(argv=None):
     return parser.parse_args(argv)
 
 
-def main(args, function=run_simulation):
+def load_configs(args):
     """
-    main function
+    loads the config files
     """
-    kwarg_list = []
+    configs = []
     for fobj in args.configs:
         try:
             assert fobj.name.endswith('.yaml'), "Config needs to be '.yaml' file"
@@ -318,19 +598,228 @@ def main(args, function=run_simulation):
             assert isinstance(config, dict), "Config has the wrong format"
         finally:
             fobj.close()
+        configs.append((fobj.name, config))
+    return configs
+
+
+def iterate_configs(args, configs=None):
+    """
+    generates the keyword arguments of the runs lazily (one config file after the other)
+    """
+    if configs is None:
+        configs = load_configs(args)
+
+    for path, config in configs:
+        yield from process_config(
+            path, config, dryrun=args.dryrun,
+            force=args.force, loglevel=args.loglevel,
+            dsn=args.dsn, checkpoint=args.checkpoint, resume=args.resume,
+            profile=args.profile, progress=args.progress, progress_events=args.progress_events,
+            cache=args.cache, cache_size=args.cache_size and int(args.cache_size * 1024 ** 2))
+
+
+def get_modules(configs):
+    """
+    returns the modules of the simulation and agent classes used in the configs
+    """
+    modules = set()
+    for _, config in configs:
+        paths = [config.get('simulation-class'), config.get('directory-facilitator')]
+        for path in paths + [agent.get('class') for agent in config.get('agents', [])]:
+            if isinstance(path, str) and '.' in path:
+                modules.add(path.rsplit('.', 1)[0])
+    return sorted(modules)
 
-        for kwargs in process_config(
-                fobj.name, config, dryrun=args.dryrun,
-                force=args.force, loglevel=args.loglevel,
-                dsn=args.dsn):
-            kwarg_list.append(deepcopy(kwargs))
 
-    if len(kwarg_list) == 1 or args.single:
-        function(**kwarg_list.pop(0))
-    elif len(kwarg_list) > 1:
-        with ProcessPoolExecutor() as executor:
-            for kwargs in kwarg_list:
-                executor.submit(function, **kwargs).add_done_callback(handler)
+def preload(modules):
+    """
+    imports the modules and returns the time needed
+    """
+    start = time.perf_counter()
+    for name in modules:
+        import_module(name)
+    return time.perf_counter() - start
+
+
+def initialize(modules):
+    """
+    initializer of the workers, the time to preload the modules is reported with the first run (see execute)
+    """
+    IMPORTS['worker'] = preload(modules)
+
+
+def execute(function, kwargs):
+    """
+    executes a run (or warm-up) in a worker and returns the time the worker needed to preload the modules
+
+    the time is only returned for the first run of a worker
+    """
+    function(**kwargs)
+    seconds, IMPORTS['worker'] = IMPORTS['worker'], 0.0
+    return seconds
+
+
+def get_executor(modules=(), max_tasks_per_child=None, start_method=None):
+    """
+    creates the process pool for the runs
+
+    The modules are imported once before the workers are started: in this
+    process with "fork" and in the fork-server with "forkserver" (the default
+    when workers are replaced after ``max_tasks_per_child`` runs). With
+    "spawn" every worker imports them in its initializer.
+    """
+    kwargs = {'initializer': initialize, 'initargs': (tuple(modules),)}
+    if max_tasks_per_child and sys.version_info < (3, 11):  # pragma: no cover
+        logger.warning("Replacing workers needs python 3.11 or newer")
+        max_tasks_per_child = None
+    if max_tasks_per_child:
+        kwargs['max_tasks_per_child'] = max_tasks_per_child
+        if start_method == 'fork':
+            logger.warning('Replacing workers is not supported with the start method "fork"')
+            start_method = None
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+    context = multiprocessing.get_context(start_method)
+    if context.get_start_method() == 'forkserver':
+        context.set_forkserver_preload(list(modules))
+        logger.info("The fork-server imports %s modules for the workers", len(modules))
+    elif context.get_start_method() == 'spawn':
+        logger.info("Workers import %s modules on start", len(modules))
+    else:
+        # most modules are already imported while the first runs are prepared
+        missing = [name for name in modules if name not in sys.modules]
+        logger.info(
+            "Imported %s modules for the workers (%s already imported, %.3fs for the others)",
+            len(modules), len(modules) - len(missing), preload(missing),
+        )
+    return ProcessPoolExecutor(mp_context=context, **kwargs)
+
+
+class Progress:  # pylint: disable=too-few-public-methods
+    """
+    reports the number of finished runs (at most every ``interval`` seconds)
+    """
+
+    def __init__(self, interval=10.0):
+        self.finished = 0
+        self.imports = 0.0
+        self.interval = interval
+        self.start = time.monotonic()
+        self.last = self.start
+
+    def __call__(self, future, running):
+        self.add(future)
+        self.finished += 1
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            logger.warning(
+                "Finished %s runs in %.0fs (%s running)", self.finished, now - self.start, running,
+            )
+
+    def add(self, future):
+        """
+        handles the result of a run or warm-up and adds the import time of its worker
+        """
+        self.imports += handler(future) or 0.0
+
+    def summary(self):
+        """
+        logs the number of finished runs and the time the workers needed to import the modules per run
+        """
+        logger.warning("Finished %s runs in %.0fs", self.finished, time.monotonic() - self.start)
+        if self.finished:
+            logger.warning(
+                "Workers needed %.3fs per run to import the modules (%.3fs on the first import in this process)",
+                self.imports / self.finished, IMPORTS['classes'],
+            )
+
+
+def run_pool(iterator, function, warmup_function, warmups, max_inflight=None, executor=None):  # pylint: disable=too-many-arguments,too-many-locals  # noqa: E501
+    """
+    submits the runs to a process pool, with at most ``max_inflight`` runs submitted or waiting at once
+
+    The runs are only generated when there is room in the window, so the
+    memory needed does not depend on the size of the sweep. A warm-up is
+    submitted when it is first needed and the runs depending on it wait
+    until it is finished.
+    """
+    if not max_inflight:
+        max_inflight = 2 * (os.cpu_count() or 1)
+    progress = Progress()
+    waiting = {}  # warm-up checkpoint -> runs waiting for the warm-up
+    pending = {}  # future -> warm-up checkpoint (or None)
+    failed = set()  # warm-up checkpoints of failed warm-ups
+    if executor is None:
+        executor = get_executor()
+    with executor:
+
+        def collect(return_when=FIRST_COMPLETED):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                key = pending.pop(future)
+                if key is None:
+                    progress(future, len(pending))
+                    continue
+                progress.add(future)
+                runs = waiting.pop(key)
+                if future.exception() is not None:
+                    failed.add(key)
+                for kwargs in runs:
+                    submit(kwargs)
+
+        def submit(kwargs):
+            key = kwargs.get('warmup') and kwargs['warmup']['file_checkpoint']
+            if key in failed:
+                logger.error('Skip "%s", its warm-up failed', kwargs['name'])
+            else:
+                pending[executor.submit(execute, function, kwargs)] = None
+
+        for kwargs in iterator:
+            while len(pending) + sum(len(runs) for runs in waiting.values()) >= max_inflight:
+                collect()
+
+            key = kwargs.get('warmup') and kwargs['warmup']['file_checkpoint']
+            if key and key not in warmups:
+                warmups[key] = kwargs
+                waiting[key] = []
+                pending[executor.submit(execute, warmup_function, kwargs)] = key
+            if key in waiting:
+                waiting[key].append(kwargs)
+            else:
+                submit(kwargs)
+
+        while pending:
+            collect()
+    progress.summary()
+
+
+def main(args, function=run_simulation, warmup_function=run_warmup):
+    """
+    main function
+    """
+    configs = load_configs(args)
+    iterator = iterate_configs(args, configs)
+    # warm-ups shared by several runs
+    warmups = {}
+
+    first = next(iterator, None)
+    second = None if first is None or args.single else next(iterator, None)
+    if first is not None and second is None:
+        if first.get('warmup'):
+            warmups[first['warmup']['file_checkpoint']] = first
+            warmup_function(**first)
+        function(**first)
+    elif first is not None:
+        executor = get_executor(get_modules(configs), args.max_tasks_per_child, args.start_method)
+        run_pool(chain([first, second], iterator), function, warmup_function, warmups, args.max_inflight, executor)
+
+    # remove the warm-up states
+    for kwargs in warmups.values():
+        for path in [kwargs['warmup']['file_checkpoint'], kwargs['warmup']['file_data']]:
+            if os.path.exists(path):
+                os.remove(path)
 
 
 def handler(future):
@@ -338,9 +827,10 @@ def handler(future):
     the responde from the process pool exetutor is catched here
     """
     try:
-        future.result()
+        return future.result()
     except Exception as exception:  # pylint: disable=broad-except
         logger.exception(str(exception))
+    return None
 
 
 def execute_command_line():  # pragma: no cover
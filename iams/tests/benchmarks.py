@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmarks for the simulation core
+
+run with ``python -m iams.tests.benchmarks``
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import argparse
+import io
+import os
+import random
+import tracemalloc
+
+from time import time
+
+from iams.exceptions import CanNotSchedule
+from iams.interfaces.simulation import CalendarQueue
+from iams.interfaces.simulation import EventHeap
+from iams.interfaces.simulation import QueueHeap
+from iams.interfaces.simulation import manage_random_state
+from iams.tests.df import ArrayDF
+from iams.tests.df import DF
+from iams.tests.df import IndexedDF
+from iams.tests.tests_df import populate
+from iams.tests.tests_interfaces_simulation import Simulation
+from iams.tests.tests_interfaces_simulation import StateTicker
+from iams.tests.tests_interfaces_simulation import Ticker
+
+try:
+    from iams.utils.scheduler import BufferScheduler
+except ImportError:  # pragma: no cover
+    BufferScheduler = None
+
+
+QUEUES = [QueueHeap, EventHeap, CalendarQueue]
+
+
+def simulation_factory(queue_class, **attrs):
+    return type(f'{queue_class.__name__}Simulation', (Simulation,), dict(attrs, queue_class=queue_class))
+
+
+def run_simulation(simcls, agents, stop):
+    simulation = simcls(df=DF(), name="benchmark", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=stop)
+    for i in range(agents):
+        simulation.register(Ticker(f'ticker{i:05d}', period=(1 + i % 10) / 10))
+    timer = time()
+    simulation(dryrun=True, settings={})
+    return simulation._events, time() - timer  # pylint: disable=protected-access
+
+
+def run_hold(queue_class, size, operations):
+    """
+    classic hold-model: pop the next event and push a new one with a random increment
+    """
+    rng = random.Random(0)
+    queue = queue_class()
+    for _ in range(size):
+        delta = rng.randint(1, 100) / 10
+        queue.push(delta, None, 'hold', delta, 'normal', (), {})
+    timer = time()
+    for _ in range(operations):
+        event = queue.pop()
+        delta = rng.randint(1, 100) / 10
+        queue.push(event.time + delta, None, 'hold', delta, 'normal', (), {})
+    return operations, time() - timer
+
+
+def run_schedule(fast, operations):
+    """
+    schedules (and pops) events with and without the logging variant of schedule
+    """
+    simcls = simulation_factory(EventHeap)
+    simulation = simcls(df=DF(), name="benchmark", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=None)
+    if fast:
+        simulation.bind_fast_mode()
+    ticker = Ticker('ticker', period=1)
+    pop = simulation._queue.pop  # pylint: disable=protected-access
+    timer = time()
+    for _ in range(operations):
+        simulation.schedule(ticker, 1.0, 'tick')
+        pop()
+    return operations, time() - timer
+
+
+def run_write(method, fmt, records, output_queue=None):
+    """
+    writes one state row per event to a file with write_csv or write_columns
+    """
+    simcls = simulation_factory(EventHeap, columns_format=fmt, output_queue=output_queue)
+    with open(os.devnull, 'w', encoding='utf-8') as fobj:
+        simulation = simcls(df=DF(), name="benchmark", folder=None, fobj=fobj, seed=0, start=0, stop=None)
+        simulation.open_output()
+        write = getattr(simulation, method)
+        timer = time()
+        for i in range(records):
+            write({'time': i / 10, 'agent': 'ticker', 'queue': i % 7, 'busy': bool(i % 2), 'load': i / records})
+        simulation.close_output()
+        return records, time() - timer
+
+
+def run_state(ticker_class, agents, snapshots):
+    """
+    takes snapshots of the agents state with get_state or get_state_array
+    """
+    simulation = Simulation(df=DF(), name="benchmark", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=None)
+    for i in range(agents):
+        simulation.register(ticker_class(f'ticker{i:05d}', period=1))
+    snapshot = simulation.get_state_array if ticker_class.state_fields else simulation.get_state
+    timer = time()
+    for _ in range(snapshots):
+        snapshot()
+    return snapshots, time() - timer
+
+
+@manage_random_state
+def managed_generator():
+    while True:
+        yield random.expovariate(1.0)
+
+
+def stream_generator(generator):
+    while True:
+        yield generator.expovariate(1.0)
+
+
+def run_random(managed, draws):
+    """
+    draws random numbers from a generator with managed random-state or from a stream of the simulation
+    """
+    simulation = Simulation(df=DF(), name="benchmark", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=None)
+    iterator = managed_generator() if managed else stream_generator(simulation.get_random('agent'))
+    timer = time()
+    for _ in range(draws):
+        next(iterator)
+    return draws, time() - timer
+
+
+def run_variates(buffered, draws):
+    """
+    draws exponential variates from a random stream or from a buffer
+    """
+    simulation = Simulation(df=DF(), name="benchmark", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=None)
+    if buffered:
+        draw = simulation.get_variates('agent').expovariate(0.5)
+    else:
+        generator = simulation.get_random('agent')
+
+        def draw():
+            return generator.expovariate(0.5)
+    timer = time()
+    for _ in range(draws):
+        draw()
+    return draws, time() - timer
+
+
+def run_df(df_class, agents, queries):
+    """
+    queries agents by their attributes
+    """
+    df = populate(df_class(), agents)
+    timer = time()
+    for i in range(queries):
+        list(df.agents(ability='drill', size=i % 3 + 1))
+    return queries, time() - timer
+
+
+def run_topology(df_class, agents):
+    """
+    builds a ring with shortcuts and iterates over the connections, returns the memory needed (in kB)
+    """
+    tracemalloc.start()
+    timer = time()
+    df = df_class()
+    df()
+    for i in range(agents):
+        df.register_agent(f'agent{i}', ability='move', index=i)
+    for i in range(agents):
+        df.add_connection(f'agent{i}', 'road', f'agent{(i + 1) % agents}')
+        df.add_connection(f'agent{i}', 'road', f'agent{(i * 7) % agents}', weight=2.0)
+    for i in range(agents):
+        list(df.connections(f'agent{i}'))
+    memory = tracemalloc.get_traced_memory()[0] // 1024
+    tracemalloc.stop()
+    return agents, time() - timer, memory
+
+
+def run_offers(incremental, events, offers):
+    """
+    checks offers (can_schedule) against a buffer with saved events
+    """
+    scheduler = BufferScheduler(agent="benchmark", horizon=100, buffer_input=2, incremental=incremental)
+    for i in range(events):
+        scheduler.save(scheduler(eta=(i * 4, i * 4 + 10), duration=3, callback=None))
+    timer = time()
+    for i in range(offers):
+        try:
+            scheduler.can_schedule(scheduler(eta=(i % 50, i % 50 + 20), duration=2, callback=None))
+        except CanNotSchedule:
+            pass
+    return offers, time() - timer
+
+
+def run_rolling(events, **kwargs):
+    """
+    saves events with a rolling horizon (every event is validated after it is saved), returns the solver's time
+    """
+    scheduler = BufferScheduler(agent="benchmark", horizon=200, buffer_input=3, **kwargs)
+    solver = 0.0
+    timer = time()
+    for i in range(events):
+        try:
+            scheduler.save(scheduler(eta=(i * 2, i * 2 + 40), duration=3 + i % 4, callback=None))
+        except CanNotSchedule:
+            pass
+        solver += scheduler.statistics['wall_time']
+        scheduler.validate()
+        solver += scheduler.statistics['wall_time']
+    return events, time() - timer, solver
+
+
+def report(name, events, seconds):
+    print(f"{name:<40s} {events:>10d} events {seconds:8.3f}s {events / seconds:12.0f} per second")  # noqa: T201
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--agents', default=500, type=int)
+    parser.add_argument('--stop', default=100, type=float)
+    parser.add_argument('--size', default=10000, type=int)
+    parser.add_argument('--operations', default=200000, type=int)
+    args = parser.parse_args(argv)
+
+    for queue_class in QUEUES:
+        report(f'hold {queue_class.__name__}', *run_hold(queue_class, args.size, args.operations))
+    for queue_class in QUEUES:
+        report(f'simulation {queue_class.__name__}', *run_simulation(
+            simulation_factory(queue_class), args.agents, args.stop,
+        ))
+    for queue_class in QUEUES[1:]:
+        report(f'simulation {queue_class.__name__} (batches)', *run_simulation(
+            simulation_factory(queue_class, batch_dispatch=True), args.agents, args.stop,
+        ))
+    report('schedule with logging', *run_schedule(False, args.operations))
+    report('schedule fast mode', *run_schedule(True, args.operations))
+    report('simulation EventHeap with logging', *run_simulation(
+        simulation_factory(EventHeap, bind_fast_mode=lambda self: None), args.agents, args.stop,
+    ))
+    report('write_csv', *run_write('write_csv', None, args.operations))
+    for fmt in ['csv', 'npy', 'parquet']:
+        report(f'write_columns {fmt}', *run_write('write_columns', fmt, args.operations))
+    report('get_state', *run_state(Ticker, args.agents, args.operations // 100))
+    report('get_state_array', *run_state(StateTicker, args.agents, args.operations // 100))
+    report('random with managed state', *run_random(True, args.operations))
+    report('random stream', *run_random(False, args.operations))
+    report('expovariate', *run_variates(False, args.operations))
+    report('expovariate (buffered)', *run_variates(True, args.operations))
+    report('write_csv (background thread)', *run_write('write_csv', None, args.operations, 64))
+    report('write_columns npy (background thread)', *run_write('write_columns', 'npy', args.operations, 64))
+    report('df agents', *run_df(DF, args.agents * 10, args.operations // 100))
+    report('df agents (indexed)', *run_df(IndexedDF, args.agents * 10, args.operations // 100))
+    for df_class in [DF, ArrayDF]:
+        agents, seconds, memory = run_topology(df_class, args.agents * 100)
+        report(f'topology {df_class.__name__} ({memory} kB)', agents, seconds)
+    if BufferScheduler is not None:
+        report('can_schedule', *run_offers(False, 20, args.operations // 1000))
+        report('can_schedule (incremental)', *run_offers(True, 20, args.operations // 1000))
+        for name, kwargs in [('', {}), (' with hints', {'hints': True}), (' incremental', {'incremental': True})]:
+            events, seconds, solver = run_rolling(args.operations // 5000, **kwargs)
+            report(f'save{name} (solver {solver:.2f}s)', events, seconds)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -6,6 +6,9 @@ test df
 
 import logging
 
+from array import array
+from math import inf
+
 import networkx as nx
 
 
@@ -14,6 +17,22 @@ from iams.interfaces.df import DirectoryFacilitatorInterface
 logger = logging.getLogger(__name__)
 
 
+class Missing:  # pylint: disable=too-few-public-methods
+    """
+    marks agents without an attribute in the columns of :class:`ArrayDF`
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'MISSING'
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+
 class DF(DirectoryFacilitatorInterface):
     """
     Directory facilitator used in tests and simulations as it does not store its state
@@ -22,9 +41,11 @@ class DF(DirectoryFacilitatorInterface):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.topology = None
+        self._routes = {}
 
     def __call__(self):
         self.topology = nx.DiGraph()
+        self._routes = {}  # source -> (distances, paths)
 
     def agents(self, **kwargs):
         for agent, data in self.topology.nodes.items():
@@ -45,20 +66,401 @@ class DF(DirectoryFacilitatorInterface):
         else:
             self.topology.add_node(name, **kwargs)
 
-#   def agent_unregister(self, name):
-#       self.topology.remove_node(name)
+    def unregister_agent(self, name):
+        """
+        removes an agent and its connections
+        """
+        self.topology.remove_node(name)
+        self._routes = {
+            source: routes for source, routes in self._routes.items() if source != name and name not in routes[0]
+        }
+
+    def connections(self, agent, category=None):
+        """
+        returns the outgoing connections of an agent (with the given category)
+        """
+        for other, data in self.topology.adj[agent].items():
+            if category is None or data.get('category') == category:
+                yield (other, data)
+
+    def add_connection(self, agent, category, other, weight=1.0, **kwargs):
+        """
+        adds (or updates) a connection between agents (a KeyError is raised for unknown agents)
+        """
+        for name in (agent, other):
+            if name not in self.topology:
+                raise KeyError(name)
+        if self.topology.has_edge(agent, other):
+            self.invalidate_routes(agent, other)
+        for source, (distances, _) in list(self._routes.items()):
+            if distances.get(agent, inf) + weight < distances.get(other, inf):
+                del self._routes[source]
+        self.topology.add_edge(agent, other, category=category, weight=weight, **kwargs)
+
+    def remove_connection(self, agent, category, other):  # pylint: disable=unused-argument
+        """
+        removes a connection between agents
+        """
+        self.invalidate_routes(agent, other)
+        self.topology.remove_edge(agent, other)
+
+    def invalidate_routes(self, agent=None, other=None):
+        """
+        removes the cached routes using the connection from agent to other (or all routes)
+
+        Needs to be called when the topology is changed directly.
+        """
+        if agent is None:
+            self._routes = {}
+            return
+        for source, (_, paths) in list(self._routes.items()):
+            path = paths.get(other)
+            if path is not None and len(path) > 1 and path[-2] == agent:
+                del self._routes[source]
+
+    def routes(self, source):
+        """
+        returns the distances and shortest paths from source to all reachable agents
+
+        The routes are cached until a connection used by them is changed, so
+        lookups in callbacks are dictionary accesses.
+        """
+        try:
+            return self._routes[source]
+        except KeyError:
+            routes = nx.single_source_dijkstra(self.topology, source, weight='weight')
+            self._routes[source] = routes
+            return routes
+
+    def compute_routes(self):
+        """
+        computes the routes of all agents (all-pairs shortest paths)
+        """
+        for source in self.topology:
+            self.routes(source)
+
+    def distance(self, source, target):
+        """
+        returns the length of the shortest path from source to target (inf if it is not reachable)
+        """
+        return self.routes(source)[0].get(target, inf)
+
+    def shortest_path(self, source, target):
+        """
+        returns the agents on the shortest path from source to target (None if it is not reachable)
+        """
+        return self.routes(source)[1].get(target)
+
+    def reachable(self, source, target):
+        """
+        returns if target can be reached from source
+        """
+        return target in self.routes(source)[0]
+
+    def nearest(self, source, **kwargs):
+        """
+        returns the nearest other agent with matching filters and its distance (or None)
+        """
+        distances = self.routes(source)[0]
+        result = None
+        for agent, _ in self.agents(**kwargs):
+            distance = distances.get(agent, inf)
+            if agent != source and distance < inf and (result is None or distance < result[1]):
+                result = (agent, distance)
+        return result
+
+
+class IndexedDF(DF):
+    """
+    Directory facilitator with inverted indexes of the attributes
+
+    Filters of :meth:`agents` are intersections of the sets of agents
+    having an attribute value instead of a scan over all agents. The
+    agents are returned in the order of their registration.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = {}
+        self._order = {}
+        self._registrations = 0
+        self._unhashable = {}
+
+    def __call__(self):
+        super().__call__()
+        self._index = {}  # key -> value -> agents
+        self._order = {}  # agent -> registration
+        self._registrations = 0  # increases with every registration, so the order values are unique
+        self._unhashable = {}  # key -> agents with unhashable values
+
+    def agents(self, **kwargs):
+        if not kwargs:
+            yield from self.topology.nodes.items()
+            return
+
+        sets = []
+        compare = {}
+        for key, value in kwargs.items():
+            try:
+                sets.append(self._index.get(key, {}).get(value, set()))
+            except TypeError:
+                # unhashable values can only be equal to unhashable values
+                sets.append(self._unhashable.get(key, set()))
+                compare[key] = value
+        sets.sort(key=len)
+        names = sets[0].intersection(*sets[1:])
+
+        nodes = self.topology.nodes
+        for name in sorted(names, key=self._order.__getitem__):
+            data = nodes[name]
+            if all(data[key] == value for key, value in compare.items()):
+                yield (name, data)
+
+    def register_agent(self, name, **kwargs):
+        if name in self._order:
+            self.unindex(name)
+        else:
+            self._order[name] = self._registrations
+            self._registrations += 1
+        super().register_agent(name, **kwargs)
+        for key, value in kwargs.items():
+            try:
+                self._index.setdefault(key, {}).setdefault(value, set()).add(name)
+            except TypeError:
+                self._unhashable.setdefault(key, set()).add(name)
+
+    def unregister_agent(self, name):
+        if name in self._order:
+            self.unindex(name)
+            del self._order[name]
+        super().unregister_agent(name)
+
+    def unindex(self, name):
+        """
+        removes the attributes of an agent from the indexes
+        """
+        for key, value in self.topology.nodes[name].items():
+            try:
+                names = self._index[key][value]
+            except TypeError:
+                self._unhashable[key].discard(name)
+                continue
+            names.discard(name)
+            if not names:
+                del self._index[key][value]
+
+
+class ArrayDF(DirectoryFacilitatorInterface):  # pylint: disable=too-many-instance-attributes
+    """
+    Directory facilitator storing agents with integer ids, their attributes in columns and
+    the connections in arrays, which are sorted to compressed sparse rows (CSR) when needed
+
+    It needs a lot less memory than the networkx graph of :class:`DF` for
+    large topologies, :meth:`to_networkx` exports the topology (i.e. for
+    plotting or partitions).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._names = []
+        self._ids = {}
+        self._columns = {}
+        self._sources = array('q')
+        self._targets = array('q')
+        self._weights = array('d')
+        self._categories = []
+        self._data = []
+        self._edges = {}
+        self._csr = None
+
+    def __call__(self):
+        self._names = []  # id -> name (None if removed)
+        self._ids = {}  # name -> id
+        self._columns = {}  # attribute -> values (by id)
+        self._sources = array('q')
+        self._targets = array('q')
+        self._weights = array('d')
+        self._categories = []
+        self._data = []  # additional attributes of the connections (or None)
+        self._edges = {}  # (source id, target id) -> position in the arrays
+        self._csr = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def agent_id(self, name):
+        """
+        returns the integer id of an agent
+        """
+        return self._ids[name]
+
+    def attributes(self, name):
+        """
+        returns the attributes of an agent
+        """
+        index = self._ids[name]
+        return {key: column[index] for key, column in self._columns.items() if column[index] is not MISSING}
+
+    def agents(self, **kwargs):
+        names = self._names
+        candidates = range(len(names))
+        for key, value in kwargs.items():
+            try:
+                column = self._columns[key]
+            except KeyError:
+                return
+            candidates = [index for index in candidates if column[index] == value]
+
+        columns = self._columns.items()
+        for index in candidates:
+            name = names[index]
+            if name is not None:
+                yield (name, {key: column[index] for key, column in columns if column[index] is not MISSING})
+
+    def register_agent(self, name, **kwargs):
+        try:
+            index = self._ids[name]
+        except KeyError:
+            index = len(self._names)
+            self._ids[name] = index
+            self._names.append(name)
+            for column in self._columns.values():
+                column.append(MISSING)
+
+        for key, column in self._columns.items():
+            column[index] = kwargs.get(key, MISSING)
+        for key, value in kwargs.items():
+            if key not in self._columns:
+                self._columns[key] = [MISSING] * len(self._names)
+                self._columns[key][index] = value
+
+    def unregister_agent(self, name):
+        """
+        removes an agent and its connections
+        """
+        index = self._ids.pop(name)
+        self._names[index] = None
+        for column in self._columns.values():
+            column[index] = MISSING
+        for source, target in [key for key in self._edges if index in key]:
+            self.remove_edge(source, target)
+
+    def connections(self, agent, category=None):
+        """
+        returns the outgoing connections of an agent (with the given category)
+        """
+        indptr, indices, positions = self.csr()
+        index = self._ids[agent]
+        for i in range(indptr[index], indptr[index + 1]):
+            position = positions[i]
+            if category is None or self._categories[position] == category:
+                yield (self._names[indices[i]], self.connection(position))
+
+    def neighbors(self, agent):
+        """
+        returns the names of the agents connected to agent
+        """
+        indptr, indices, _ = self.csr()
+        index = self._ids[agent]
+        return [self._names[i] for i in indices[indptr[index]:indptr[index + 1]]]
+
+    def connection(self, position):
+        """
+        returns the attributes of a connection
+        """
+        data = {'category': self._categories[position], 'weight': self._weights[position]}
+        if self._data[position]:
+            data.update(self._data[position])
+        return data
+
+    def add_connection(self, agent, category, other, weight=1.0, **kwargs):
+        """
+        adds (or updates) a connection between agents
+        """
+        key = (self._ids[agent], self._ids[other])
+        position = self._edges.get(key)
+        if position is None:
+            self._edges[key] = len(self._sources)
+            self._sources.append(key[0])
+            self._targets.append(key[1])
+            self._weights.append(weight)
+            self._categories.append(category)
+            self._data.append(kwargs or None)
+            self._csr = None
+        else:
+            self._weights[position] = weight
+            self._categories[position] = category
+            self._data[position] = kwargs or None
+
+    def remove_connection(self, agent, category, other):  # pylint: disable=unused-argument
+        """
+        removes a connection between agents
+        """
+        self.remove_edge(self._ids[agent], self._ids[other])
+
+    def remove_edge(self, source, target):
+        """
+        removes the connection between the ids (the arrays are compacted with the next :meth:`csr`)
+        """
+        position = self._edges.pop((source, target))
+        self._sources[position] = -1
+        self._data[position] = None
+        self._csr = None
+
+    def compact(self):
+        """
+        removes the deleted connections from the arrays (keeping the order of the others)
+        """
+        if len(self._edges) == len(self._sources):
+            return
+        keep = [position for position, source in enumerate(self._sources) if source >= 0]
+        self._sources = array('q', (self._sources[position] for position in keep))
+        self._targets = array('q', (self._targets[position] for position in keep))
+        self._weights = array('d', (self._weights[position] for position in keep))
+        self._categories = [self._categories[position] for position in keep]
+        self._data = [self._data[position] for position in keep]
+        self._edges = {key: position for position, key in enumerate(zip(self._sources, self._targets))}
+
+    def csr(self):
+        """
+        returns the index pointers, the target ids and the positions of the connections sorted by their source
+        """
+        if self._csr is None:
+            self.compact()
+            indptr = array('q', [0]) * (len(self._names) + 1)
+            for source in self._sources:
+                indptr[source + 1] += 1
+            for index in range(len(self._names)):
+                indptr[index + 1] += indptr[index]
+            offsets = array('q', indptr)
+            indices = array('q', [0]) * len(self._sources)
+            positions = array('q', [0]) * len(self._sources)
+            for position, (source, target) in enumerate(zip(self._sources, self._targets)):
+                offset = offsets[source]
+                indices[offset] = target
+                positions[offset] = position
+                offsets[source] = offset + 1
+            self._csr = (indptr, indices, positions)
+        return self._csr
 
-#   def agent_register_connection(self, agent, other, bidirectional=False, weight=-1.0):
-#       raise NotImplementedError
-#       self.topology.add_edge(str(agent), str(other), weight=weight)
-#       if bidirectional:
-#           self.topology.add_edge(str(other), str(agent), weight=weight)
+    def to_networkx(self):
+        """
+        exports the agents and connections to a networkx graph
+        """
+        graph = nx.DiGraph()
+        for name, data in self.agents():
+            graph.add_node(name, **data)
+        self.compact()
+        for position, (source, target) in enumerate(zip(self._sources, self._targets)):
+            graph.add_edge(self._names[source], self._names[target], **self.connection(position))
+        return graph
 
-#   def agent_unregister_connection(self, agent, other, bidirectional=False):
-#       raise NotImplementedError
-#       self.topology.remove_edge(str(agent), str(other))
-#       if bidirectional:
-#           self.topology.remove_edge(str(other), str(agent))
+    @property
+    def topology(self):
+        """
+        a read-only copy of the topology as a networkx graph
 
-#   def agent_update_connection(self, agent, other, weight):
-#       raise NotImplementedError
+        The graph is created on every access, changes of it are not applied
+        to the directory facilitator (use :meth:`add_connection` etc. instead).
+        """
+        return self.to_networkx()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+unittests for iams.tests.df
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
+
+import io
+import pickle
+import random
+import unittest
+
+from math import inf
+
+import networkx as nx
+
+from iams.tests.df import ArrayDF
+from iams.tests.df import DF
+from iams.tests.df import IndexedDF
+from iams.tests.tests_interfaces_simulation import Simulation
+from iams.tests.tests_utils_sharding import Relay
+
+
+def populate(df, agents=200, seed=0):
+    generator = random.Random(seed)
+    df()
+    for i in range(agents):
+        df.register_agent(
+            f'agent{i}',
+            ability=generator.choice(['drill', 'mill', 'move']),
+            size=generator.randint(1, 3),
+            **({'tools': [generator.randint(1, 2)]} if i % 5 == 0 else {}),
+        )
+    return df
+
+
+class IndexedDFTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.df = populate(IndexedDF())
+        self.reference = populate(DF())
+
+    def assert_agents(self, **kwargs):
+        self.assertEqual(list(self.df.agents(**kwargs)), list(self.reference.agents(**kwargs)), kwargs)
+
+    def test_filters(self):
+        self.assert_agents()
+        self.assert_agents(ability='drill')
+        self.assert_agents(ability='drill', size=2)
+        self.assert_agents(size=True)
+        self.assert_agents(ability='weld')
+        self.assert_agents(missing=1)
+
+    def test_unhashable(self):
+        self.assert_agents(tools=[1])
+        self.assert_agents(tools=[1], ability='move')
+        self.assert_agents(ability=['drill'])
+
+    def test_register_again(self):
+        for df in [self.df, self.reference]:
+            df.register_agent('agent0', ability='weld', tools=[3])
+            df.register_agent('agent1', ability='weld')
+            df.register_agent('agent0', ability='weld')
+        self.assert_agents(ability='weld')
+        self.assert_agents(tools=[3])
+        self.assertEqual([name for name, _ in self.df.agents(ability='weld')], ['agent0', 'agent1'])
+
+    def test_reset(self):
+        self.df()
+        self.assertEqual(list(self.df.agents(ability='drill')), [])
+
+    def test_unregister(self):
+        for df in [self.df, self.reference]:
+            df.unregister_agent('agent0')
+        self.assert_agents(ability=self.reference.topology.nodes['agent1']['ability'])
+        self.assertNotIn('agent0', self.df._order)
+        # new agents are returned after all others
+        for df in [self.df, self.reference]:
+            df.register_agent('agent200', ability='drill', size=1)
+            df.register_agent('agent0', ability='drill', size=1)
+        self.assert_agents(ability='drill')
+        self.assert_agents(size=1)
+        self.assertEqual(len(set(self.df._order.values())), len(self.df._order))
+
+
+def grid(df_class=DF, size=5):
+    df = df_class()
+    df()
+    for i in range(size):
+        for j in range(size):
+            df.register_agent(f'{i}-{j}', charger=(i, j) == (size - 1, 0))
+    for i in range(size):
+        for j in range(size):
+            if i + 1 < size:
+                df.add_connection(f'{i}-{j}', 'road', f'{i + 1}-{j}')
+                df.add_connection(f'{i + 1}-{j}', 'road', f'{i}-{j}')
+            if j + 1 < size:
+                df.add_connection(f'{i}-{j}', 'road', f'{i}-{j + 1}', weight=2.0)
+    return df
+
+
+class RoutingTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.df = grid()
+
+    def assert_routes(self):
+        # the cached routes match new computations
+        for source in self.df.topology:
+            distances, paths = nx.single_source_dijkstra(self.df.topology, source)
+            self.assertEqual(self.df.routes(source)[0], distances, source)
+            for target, path in self.df.routes(source)[1].items():
+                self.assertEqual(nx.path_weight(self.df.topology, path, 'weight'), distances[target])
+
+    def test_routes(self):
+        self.assertEqual(self.df.distance('0-0', '2-2'), 6.0)
+        self.assertEqual(self.df.shortest_path('0-0', '0-1'), ['0-0', '0-1'])
+        self.assertTrue(self.df.reachable('0-0', '4-4'))
+        self.assertFalse(self.df.reachable('0-1', '0-0'))
+        self.assertEqual(self.df.distance('0-1', '0-0'), inf)
+        self.assertIsNone(self.df.shortest_path('0-1', '0-0'))
+        self.assertIs(self.df.routes('0-0'), self.df.routes('0-0'))
+        self.assertIsNone(self.df.nearest('0-1', charger=True))
+        self.assertEqual(self.df.nearest('0-0', charger=True), ('4-0', 4.0))
+
+    def test_connections(self):
+        self.df.add_connection('0-0', 'power', '4-4', weight=1.0)
+        self.assertEqual([other for other, _ in self.df.connections('0-0')], ['1-0', '0-1', '4-4'])
+        self.assertEqual([other for other, _ in self.df.connections('0-0', 'power')], ['4-4'])
+        # networkx would create the nodes of unknown agents
+        for agent, other in [('0-0', 'unknown'), ('unknown', '0-0')]:
+            with self.assertRaises(KeyError):
+                self.df.add_connection(agent, 'power', other)
+        self.assertNotIn('unknown', self.df.topology)
+        self.assertEqual(len(self.df.topology), 25)
+
+    def test_invalidation(self):
+        generator = random.Random(1)
+        self.df.compute_routes()
+        self.assertEqual(len(self.df._routes), 25)
+        for _ in range(30):
+            edges = list(self.df.topology.edges)
+            agent, other = generator.choice(edges)
+            if generator.random() < 0.5:
+                self.df.remove_connection(agent, 'road', other)
+            else:
+                self.df.add_connection(agent, 'road', other, weight=generator.choice([0.5, 3.0]))
+                agent, other = generator.sample(list(self.df.topology), 2)
+                self.df.add_connection(agent, 'road', other, weight=generator.choice([0.5, 3.0]))
+            self.assert_routes()
+        # only the affected routes are computed again
+        self.df.compute_routes()
+        self.df.add_connection('0-0', 'road', '0-1', weight=10.0)
+        self.assertTrue(0 < len(self.df._routes) < 25)
+        self.assert_routes()
+
+    def test_unregister(self):
+        self.df.compute_routes()
+        self.df.unregister_agent('1-0')
+        self.assertNotIn('1-0', self.df._routes)
+        self.assert_routes()
+
+    def test_indexed(self):
+        df = grid(IndexedDF)
+        self.assertEqual(df.nearest('0-0', charger=True), ('4-0', 4.0))
+        df.unregister_agent('3-0')
+        self.assertIsNone(df.nearest('0-0', charger=True))
+
+
+class ArrayDFTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.df = populate(ArrayDF())
+        self.reference = populate(DF())
+
+    def assert_agents(self, **kwargs):
+        self.assertEqual(list(self.df.agents(**kwargs)), list(self.reference.agents(**kwargs)), kwargs)
+
+    def test_agents(self):
+        self.assertEqual(len(self.df), 200)
+        self.assertEqual(self.df.agent_id('agent3'), 3)
+        self.assert_agents()
+        self.assert_agents(ability='drill', size=2)
+        self.assert_agents(tools=[1])
+        self.assert_agents(missing=1)
+        for df in [self.df, self.reference]:
+            df.register_agent('agent0', ability='weld')
+            df.register_agent('agent1', color='red')
+            df.unregister_agent('agent2')
+        self.assert_agents()
+        self.assertEqual(self.df.attributes('agent1'), {'color': 'red'})
+        with self.assertRaises(KeyError):
+            self.df.unregister_agent('agent2')
+
+    def test_connections(self):
+        grid_df, array_df = grid(), grid(ArrayDF)
+        self.assertEqual(list(array_df.connections('1-1')), list(grid_df.connections('1-1')))
+        self.assertEqual(array_df.neighbors('1-1'), ['0-1', '2-1', '1-2'])
+        array_df.add_connection('1-1', 'power', '0-0', weight=3.0, cable=True)
+        self.assertEqual(list(array_df.connections('1-1', 'power')), [
+            ('0-0', {'category': 'power', 'weight': 3.0, 'cable': True}),
+        ])
+        array_df.add_connection('1-1', 'power', '0-0', weight=2.0)
+        array_df.remove_connection('1-1', 'road', '2-1')
+        self.assertEqual(array_df.neighbors('1-1'), ['0-1', '1-2', '0-0'])
+        with self.assertRaises(KeyError):
+            array_df.remove_connection('1-1', 'road', '2-1')
+
+        array_df.unregister_agent('0-1')
+        grid_df.unregister_agent('0-1')
+        grid_df.add_connection('1-1', 'power', '0-0', weight=2.0)
+        grid_df.remove_connection('1-1', 'road', '2-1')
+        graph = array_df.to_networkx()
+        self.assertEqual(dict(graph.nodes.items()), dict(grid_df.topology.nodes.items()))
+        self.assertEqual(sorted(graph.edges(data=True)), sorted(grid_df.topology.edges(data=True)))
+
+    def test_pickle(self):
+        array_df = grid(ArrayDF)
+        copy = pickle.loads(pickle.dumps(array_df))
+        self.assertEqual(list(copy.agents()), list(array_df.agents()))
+        self.assertEqual(copy.neighbors('0-0'), array_df.neighbors('0-0'))
+
+    def test_partitions(self):
+        simulation = Simulation(df=ArrayDF(), name="name", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=None)
+        for i in range(4):
+            simulation.register(Relay(f'relay{i}', f'relay{(i + 1) % 4}'))
+            simulation.register(Relay(f'single{i}', f'single{i}'))
+        for i in range(4):
+            simulation.df.add_connection(f'relay{i}', 'token', f'relay{(i + 1) % 4}')
+        self.assertEqual(simulation.partition_agents(2), [
+            ['relay0', 'relay1', 'relay2', 'relay3'],
+            ['single0', 'single1', 'single2', 'single3'],
+        ])
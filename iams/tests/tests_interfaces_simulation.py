@@ -6,14 +6,26 @@ unittests for iams.interfaces.simulation
 # pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
 
 import io
+import os
+import pickle
 import random
 import unittest
 
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
 from iams.interfaces.simulation import Agent
+from iams.interfaces.simulation import CalendarQueue
+from iams.interfaces.simulation import EventHeap
+from iams.interfaces.simulation import Priority
 from iams.interfaces.simulation import Queue
+from iams.interfaces.simulation import QueueHeap
 from iams.interfaces.simulation import SimulationInterface
 from iams.interfaces.simulation import manage_random_state
 from iams.tests.df import DF
+from iams.utils.writer import read_npy
 
 
 class Simulation(SimulationInterface):
@@ -25,6 +37,14 @@ class Simulation(SimulationInterface):
         pass
 
 
+class EventHeapSimulation(Simulation):
+    queue_class = EventHeap
+
+
+class CalendarQueueSimulation(Simulation):
+    queue_class = CalendarQueue
+
+
 class SimulationAgent(Agent):
 
     def __init__(self):
@@ -57,6 +77,120 @@ class SimulationAgent(Agent):
         return {}
 
 
+class Ticker(Agent):
+
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+        self.ticks = 0
+
+    def __str__(self):
+        return self.name
+
+    def __call__(self, simulation, dryrun):
+        simulation.schedule(self, self.period, 'tick')
+
+    def tick(self, simulation):
+        self.ticks += 1
+        simulation.schedule(self, self.period, 'tick')
+
+    def attributes(self):
+        return {}
+
+    def asdict(self):
+        return {'ticks': self.ticks}
+
+
+class StateTicker(Ticker):
+    state_fields = ('ticks', 'time')
+
+    def tick(self, simulation):
+        self.state[0] += 1
+        self.state[1] = simulation.get_time()
+        simulation.schedule(self, self.period, 'tick')
+
+    def asdict(self):
+        raise AssertionError("get_state reads the state fields from the registry")
+
+
+class WritingSimulation(Simulation):
+    periodic_events = 10
+
+
+class ColumnWritingSimulation(WritingSimulation):
+    columns_block = 7
+
+
+class BackgroundWritingSimulation(WritingSimulation):
+    output_queue = 2
+
+
+class WritingAgent(Agent):
+    crash = None
+    method = 'write_csv'
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.count = 0
+
+    def __str__(self):
+        return self.name
+
+    def __call__(self, simulation, dryrun):
+        simulation.schedule(self, random.random(), 'callback')
+
+    def callback(self, simulation):
+        if WritingAgent.crash is not None and simulation.get_time() > WritingAgent.crash:
+            raise RuntimeError("crash")
+        self.count += 1
+        getattr(simulation, self.method)({'time': simulation.get_time(), 'agent': self.name, 'value': random.random()})
+        simulation.schedule(self, random.expovariate(1.0), 'callback')
+
+    def attributes(self):
+        return {}
+
+    def asdict(self):
+        return {'count': self.count}
+
+
+class BatchAgent(Agent):
+
+    def __init__(self, name, log, agents):
+        super().__init__()
+        self.name = name
+        self.log = log
+        self.agents = agents
+        self.rng = random.Random(name)
+        self.pending = None
+
+    def __str__(self):
+        return self.name
+
+    def __call__(self, simulation, dryrun):
+        self.pending = simulation.schedule(self, 1.0, 'callback')
+
+    def callback(self, simulation, priority=None):
+        self.log.append((simulation.get_time(), self.name, priority))
+        value = self.rng.random()
+        if value < 0.1:
+            simulation.schedule(self, 0.0, 'callback', priority='highest')
+        elif value < 0.2:
+            other = self.agents[self.rng.randrange(len(self.agents))]
+            if other.pending is not None:
+                other.pending.cancel()
+        self.pending = simulation.schedule(
+            self, self.rng.choice([0.0, 1.0, 2.0]), 'callback',
+            priority=self.rng.choice(['high', 'normal', 'low']),
+        )
+
+    def attributes(self):
+        return {}
+
+    def asdict(self):
+        return {}
+
+
 class AgentTests(unittest.TestCase):  # pragma: no cover
     def test_str(self):
         agent = SimulationAgent()
@@ -136,6 +270,135 @@ class QueueTests(unittest.TestCase):  # pragma: no cover
         self.assertTrue(queue1 != queue2, "%r != %r" % (queue1, queue2))
 
 
+class EventHeapTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.events = [
+            (0.0, 1.0, Priority.NORMAL),
+            (0.0, 0.0, Priority.NORMAL),
+            (0.0, 1.0, Priority.LOW),
+            (1.0, 1.0, Priority.LOW),
+            (0.0, 2.0, Priority.HIGHEST),
+            (2.0, 0.5, Priority.HIGH),
+            (0.5, 0.5, Priority.NORMAL),
+        ]
+
+    def test_order(self):
+        queue = EventHeap()
+        for i, (time, delta, priority) in enumerate(self.events):
+            queue.push(time, None, str(i), delta, priority, (), {})
+        self.assertEqual(len(queue), 7)
+        result = [queue.pop().callback for i in range(len(self.events))]
+        self.assertEqual(result, ['4', '0', '1', '2', '6', '3', '5'])
+        self.assertEqual(len(queue), 0)
+
+    def test_order_matches_queue(self):
+        heap = EventHeap()
+        queue = QueueHeap()
+        for i, (time, delta, priority) in enumerate(self.events):
+            heap.push(time, None, str(i), delta, priority, (), {})
+            queue.push(time, None, str(i), delta, priority, (), {})
+        self.assertEqual(
+            [heap.pop().callback for i in range(len(self.events))],
+            [queue.pop().callback for i in range(len(self.events))],
+        )
+
+    def test_priority_name(self):
+        queue = EventHeap()
+        event = queue.push(0.0, None, 'c', 0.0, 'low', (), {})
+        self.assertEqual(event.priority, Priority.LOW)
+        event = queue.push(0.0, None, 'c', 0.0, 'undefined', (), {})
+        self.assertEqual(event.priority, Priority.NORMAL)
+
+    def test_cancel(self):
+        queue = EventHeap()
+        event = queue.push(0.0, None, 'c', 0.0, Priority.NORMAL, (), {})
+        self.assertEqual(str(event), '0.0000:None:c')
+        self.assertFalse(event.deleted)
+        event.cancel()
+        event.cancel()
+        self.assertTrue(event.deleted)
+        self.assertEqual(queue.cancelled, 1)
+        self.assertTrue(queue.pop().deleted)
+        self.assertEqual(queue.cancelled, 0)
+
+    def test_cancel_after_pop(self):
+        queue = EventHeap()
+        event = queue.push(0.0, None, 'c', 0.0, Priority.NORMAL, (), {})
+        self.assertIs(queue.pop(), event)
+        event.cancel()
+        self.assertEqual(queue.cancelled, 0)
+
+
+class CalendarQueueTests(unittest.TestCase):  # pragma: no cover
+
+    def test_empty(self):
+        with self.assertRaises(IndexError):
+            CalendarQueue().pop()
+
+    def test_order_matches_heap(self):
+        rng = random.Random('calendar')
+        heap = EventHeap()
+        queue = CalendarQueue(width=0.1, buckets=4)
+        now = 0.0
+        result1 = []
+        result2 = []
+        for i in range(2000):
+            for _ in range(rng.randint(0, 3)):
+                delta = rng.choice([0.0, 0.5, 1.0, rng.expovariate(1.0), rng.uniform(0, 1000)])
+                priority = rng.choice(list(Priority))
+                heap.push(now + delta, None, i, delta, priority, (), {})
+                queue.push(now + delta, None, i, delta, priority, (), {})
+            if heap:
+                event1, event2 = heap.pop(), queue.pop()
+                now = event1.time
+                result1.append((event1.time, event1.priority, event1.dt, event1.callback))
+                result2.append((event2.time, event2.priority, event2.dt, event2.callback))
+        while heap:
+            event1, event2 = heap.pop(), queue.pop()
+            result1.append((event1.time, event1.priority, event1.dt, event1.callback))
+            result2.append((event2.time, event2.priority, event2.dt, event2.callback))
+        self.assertEqual(result1, result2)
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(queue.peak > 8)
+
+    def test_event_in_the_past(self):
+        queue = CalendarQueue()
+        queue.push(10.0, None, 'a', 10.0, Priority.NORMAL, (), {})
+        queue.push(20.0, None, 'b', 20.0, Priority.NORMAL, (), {})
+        self.assertEqual(queue.pop().callback, 'a')
+        queue.push(5.0, None, 'c', -5.0, Priority.NORMAL, (), {})
+        self.assertEqual(queue.pop().callback, 'c')
+        self.assertEqual(queue.pop().callback, 'b')
+
+
+class CompactionTests(unittest.TestCase):  # pragma: no cover
+
+    def compaction(self, cls):
+        queue = cls(compaction=0.5, minimum=4)
+        events = [queue.push(float(i), None, str(i), 1.0, Priority.NORMAL, (), {}) for i in range(10)]
+        for event in events[:5]:
+            event.cancel()
+        self.assertEqual(len(queue), 10)
+        self.assertEqual(queue.cancelled, 5)
+        self.assertEqual(queue.compactions, 0)
+        events[5].cancel()
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(queue.cancelled, 0)
+        self.assertEqual(queue.compactions, 1)
+        self.assertEqual(queue.peak, 10)
+        self.assertEqual([queue.pop().callback for i in range(4)], ['6', '7', '8', '9'])
+
+    def test_event_heap(self):
+        self.compaction(EventHeap)
+
+    def test_queue_heap(self):
+        self.compaction(QueueHeap)
+
+    def test_calendar_queue(self):
+        self.compaction(CalendarQueue)
+
+
 class SimulationInterfaceTests(unittest.TestCase):  # pragma: no cover
 
     def setUp(self):
@@ -176,9 +439,66 @@ class SimulationInterfaceTests(unittest.TestCase):  # pragma: no cover
 
     def test_schedule(self):
         self.assertEqual(len(self.instance._queue), 0)
-        self.instance.schedule(None, 0.0, 'cb')
+        self.instance.schedule(SimulationAgent(), 0.0, 'callback')
         self.assertEqual(len(self.instance._queue), 1)
 
+    def test_schedule_invalid_callback(self):
+        with self.assertRaises(AttributeError):
+            self.instance.schedule(SimulationAgent(), 0.0, 'does_not_exist')
+        with self.assertRaises(TypeError):
+            self.instance.schedule(SimulationAgent(), 0.0, 'data')
+        self.assertEqual(len(self.instance._queue), 0)
+
+    def test_schedule_callable(self):
+        agent = SimulationAgent()
+        event = self.instance.schedule(agent, 0.0, agent.callback)
+        self.assertEqual(event.callback, 'callback')
+        self.assertIs(event.function, SimulationAgent.callback)
+        event = self.instance.schedule(agent, 0.0, print)
+        self.assertEqual(event.callback, 'print')
+
+    def test_fast_mode(self):
+        self.instance.bind_fast_mode()
+        self.assertFalse(self.instance._log_events)
+        self.assertNotIn('schedule', self.instance.__dict__)
+        event = self.instance.schedule(SimulationAgent(), 1.0, 'callback', priority='low')
+        self.assertEqual(event.time, 1.0)
+        self.assertEqual(event.priority, Priority.LOW)
+        with self.assertLogs('iams.interfaces.simulation', level='DEBUG') as logs:
+            self.instance.bind_fast_mode()
+            self.assertTrue(self.instance._log_events)
+            self.instance.schedule(SimulationAgent(), 1.0, 'callback')
+        self.assertTrue(any('Adding' in line for line in logs.output))
+
+    def test_get_function_cache(self):
+        agent = SimulationAgent()
+        function = self.instance.get_function(agent, 'callback')
+        self.assertIs(function, SimulationAgent.callback)
+        self.assertIs(self.instance.get_function(SimulationAgent(), 'callback'), function)
+
+    def test_get_function_not_cached(self):
+        calls = []
+        agent = SimulationAgent()
+        agent.callback = lambda simulation: calls.append('instance')
+        self.instance.get_function(agent, 'callback')(agent, self.instance)
+        self.assertEqual(calls, ['instance'])
+        self.assertIs(self.instance.get_function(SimulationAgent(), 'callback'), SimulationAgent.callback)
+
+        class First:  # pylint: disable=too-few-public-methods
+            @staticmethod
+            def callback(simulation):  # pylint: disable=unused-argument
+                calls.append('first')
+
+        class Second:  # pylint: disable=too-few-public-methods
+            @staticmethod
+            def callback(simulation):  # pylint: disable=unused-argument
+                calls.append('second')
+
+        for obj in [First, Second]:
+            self.instance.get_function(obj, 'callback')(obj, self.instance)
+        self.assertEqual(calls, ['instance', 'first', 'second'])
+        self.assertEqual(self.instance._functions, {(SimulationAgent, 'callback'): SimulationAgent.callback})
+
     def test_write(self):
         self.instance.write('test')
         self.instance._fobj.seek(0)
@@ -198,5 +518,429 @@ class SimulationInterfaceTests(unittest.TestCase):  # pragma: no cover
         written = self.instance._fobj.read()
         self.assertEqual(written, 'test\r\n1\r\n2\r\n')
 
+    def test_write_columns(self):
+        with self.assertLogs('iams.utils.writer', level='WARNING'):
+            self.instance.write_columns({'test': 1})
+        self.instance.write_columns({'test': 2})
+        self.instance.close_output()
+        self.instance._fobj.seek(0)
+        written = self.instance._fobj.read()
+        self.assertEqual(written, 'test\r\n1\r\n2\r\n')
+
     def test_get_time(self):
         self.assertEqual(self.instance.get_time(), 0.0)
+
+
+class SimulationCallTests(unittest.TestCase):  # pragma: no cover
+    simulation_class = Simulation
+
+    def setUp(self):
+        self.instance = self.simulation_class(
+            df=DF(),
+            name="name",
+            folder="folder",
+            fobj=io.StringIO(),
+            seed=None,
+            start=0,
+            stop=1,
+        )
+
+    def test_call(self):
+        agent = SimulationAgent()
+        self.instance.register(agent)
+        self.instance(dryrun=True, settings={})
+        self.assertEqual(agent.data, 2)
+
+    def test_call_callables(self):
+        calls = []
+        agent = SimulationAgent()
+        self.instance.schedule(agent, 0.5, agent.callback)
+        self.instance.schedule(agent, 0.25, lambda simulation, value: calls.append(value), 'called')
+        self.instance(dryrun=True, settings={})
+        self.assertEqual(agent.data, 2)
+        self.assertEqual(calls, ['called'])
+
+
+class StateRegistryTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.instance = Simulation(df=DF(), name="name", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=2)
+
+    def test_empty(self):
+        self.assertIsNone(self.instance.get_state_array())
+        self.assertEqual(self.instance.get_state_columns(), [])
+
+    def test_state(self):
+        agents = [StateTicker(f'ticker{i:03d}', period=1 + i % 2) for i in range(100)]
+        for agent in agents:
+            self.instance.register(agent)
+        self.instance.register(Ticker('plain', period=1))
+        self.instance(dryrun=True, settings={})
+
+        columns = self.instance.get_state_columns()
+        self.assertEqual(columns[:4], ['ticker000_ticks', 'ticker000_time', 'ticker001_ticks', 'ticker001_time'])
+        values = self.instance.get_state_array()
+        self.assertEqual(len(values), 200)
+        self.assertEqual(values[:4].tolist(), [2.0, 2.0, 1.0, 2.0])
+        # views of agents registered before the array was resized are updated
+        self.assertIs(agents[0].state.base, self.instance._state.values)
+
+        # snapshots are copies
+        agents[0].state[0] = 10
+        self.assertEqual(values[0], 2.0)
+
+        state = self.instance.get_state()
+        self.assertEqual(state['ticker000_ticks'], 10.0)
+        self.assertIsInstance(state['ticker000_ticks'], float)
+        # agents with state fields only contribute their fields
+        self.assertNotIn('ticker001_period', state)
+        self.assertEqual(state['ticker001_time'], 2.0)
+        self.assertEqual(state['plain_ticks'], 2)
+
+    def test_pickle(self):
+        agent = StateTicker('ticker', period=1)
+        self.instance.register(agent)
+        self.instance.register(StateTicker('other', period=1))
+        instance = pickle.loads(pickle.dumps(self.instance))
+        agent = instance.agent('ticker')
+        agent.state[0] = 5
+        self.assertEqual(instance.get_state_array().tolist(), [5.0, 0.0, 0.0, 0.0])
+
+
+class RandomStreamTests(unittest.TestCase):  # pragma: no cover
+
+    @staticmethod
+    def simulation(seed='streams'):
+        return Simulation(df=DF(), name="name", folder=None, fobj=io.StringIO(), seed=seed, start=0, stop=None)
+
+    def test_reproducible(self):
+        first, second = self.simulation(), self.simulation()
+        # the order in which the streams are created and used does not matter
+        values = [first.get_random('a').random() for _ in range(3)] + [first.get_random('b').random()]
+        value = second.get_random('b').random()
+        self.assertEqual([second.get_random('a').random() for _ in range(3)] + [value], values)
+        self.assertEqual(first.get_random().random(), second.get_random().random())
+
+    def test_independent(self):
+        simulation = self.simulation()
+        agent = SimulationAgent()
+        self.assertIs(simulation.get_random(agent), simulation.get_random('test'))
+        self.assertNotEqual(simulation.get_random('a').random(), simulation.get_random('b').random())
+        self.assertNotEqual(simulation.get_random('a').random(), self.simulation('other').get_random('a').random())
+
+    def test_no_seed(self):
+        self.assertNotEqual(
+            self.simulation(None).get_random('a').random(),
+            self.simulation(None).get_random('a').random(),
+        )
+
+    def test_pickle(self):
+        simulation = self.simulation()
+        simulation.get_random('a').random()
+        copy = pickle.loads(pickle.dumps(simulation))
+        self.assertEqual(copy.get_random('a').random(), simulation.get_random('a').random())
+
+
+class ProfilingTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.instance = Simulation(df=DF(), name="name", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=10)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disabled(self):
+        agent = Ticker('ticker', period=1)
+        self.assertIs(self.instance.get_function(agent, 'tick'), Ticker.tick)
+
+    def test_report(self):
+        path = os.path.join(self.directory.name, 'name.profile')
+        self.instance.enable_profiling(path)
+        self.instance.register(Ticker('ticker', period=1))
+        self.instance.register(SimulationAgent())
+        self.instance.schedule(self.instance, 0.5, lambda simulation: None)
+        self.instance(dryrun=True, settings={})
+
+        stats = self.instance._profile['stats']
+        self.assertEqual(stats[('Ticker', 'tick')][0], 10)
+        self.assertEqual(stats[('Ticker', 'tick')][2], 10)
+        self.assertEqual(stats[('SimulationAgent', 'callback')][0], 20)
+        self.assertEqual(stats[('Simulation', '<lambda>')][0:3:2], [1, 0])
+        with open(path, encoding='utf-8') as fobj:
+            lines = fobj.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('class'))
+
+    def test_log(self):
+        self.instance.enable_profiling()
+        self.instance.register(Ticker('ticker', period=1))
+        with self.assertLogs('iams.interfaces.simulation', level='INFO') as logs:
+            self.instance(dryrun=True, settings={})
+        self.assertTrue(any('Ticker' in line and 'tick' in line for line in logs.output))
+
+    def test_pickle(self):
+        self.instance.enable_profiling()
+        agent = Ticker('ticker', period=1)
+        self.instance.schedule(agent, 1.0, 'tick')
+        instance = pickle.loads(pickle.dumps(self.instance))
+        instance._queue.pop().function(agent, instance)
+        self.assertEqual(instance._profile['stats'][('Ticker', 'tick')][0], 1)
+
+
+class ProgressTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'name.progress')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def simulation(stop=10):
+        simulation = Simulation(df=DF(), name="name", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=stop)
+        for i in range(10):
+            simulation.register(Ticker(f'ticker{i}', period=1))
+        return simulation
+
+    def read(self):
+        with open(self.path, encoding='utf-8') as fobj:
+            return [line.split(',') for line in fobj.read().splitlines()]
+
+    def test_disabled(self):
+        self.assertEqual(self.simulation().next_periodic(), float('inf'))
+
+    def test_events(self):
+        simulation = self.simulation()
+        simulation.enable_progress(self.path, events=25)
+        self.assertEqual(simulation.next_periodic(), 25)
+        simulation(dryrun=True, settings={})
+
+        lines = self.read()
+        self.assertEqual(lines[0], ['wall', 'time', 'events', 'events_per_second', 'queue', 'cancelled', 'eta'])
+        # 110 scheduled events, sampled every 25 events and at the end
+        self.assertEqual(len(lines), 1 + 4 + 1)
+        self.assertEqual([line[1] for line in lines[1:]], ['2', '4', '7', '9', '10'])
+        self.assertEqual(lines[-1][2], '100')
+        self.assertEqual(lines[-1][4], '10')
+        self.assertEqual(float(lines[-1][6]), 0.0)
+
+    def test_interval(self):
+        simulation = self.simulation()
+        simulation.enable_progress(self.path, interval=3600)
+        self.assertEqual(simulation.next_periodic(), simulation.periodic_events)
+        simulation(dryrun=True, settings={})
+        # only the sample at the end is written
+        self.assertEqual(len(self.read()), 2)
+
+    def test_append(self):
+        simulation = self.simulation()
+        simulation.enable_progress(self.path, events=50)
+        simulation(dryrun=True, settings={})
+        simulation.enable_progress(self.path, events=50, append=True)
+        simulation.sample_progress()
+        self.assertEqual(len(self.read()), 1 + 3 + 1)
+
+    def test_log(self):
+        simulation = self.simulation()
+        simulation.enable_progress(None, events=50)
+        with self.assertLogs('iams.interfaces.simulation', level='INFO') as logs:
+            simulation(dryrun=True, settings={})
+        self.assertEqual(len([line for line in logs.output if 'Progress' in line]), 3)
+
+
+class EventHeapSimulationCallTests(SimulationCallTests):  # pragma: no cover
+    simulation_class = EventHeapSimulation
+
+
+class CalendarQueueSimulationCallTests(SimulationCallTests):  # pragma: no cover
+    simulation_class = CalendarQueueSimulation
+
+
+class BenchmarkTests(unittest.TestCase):  # pragma: no cover
+
+    def test_main(self):
+        from iams.tests.benchmarks import main as benchmark  # pylint: disable=import-outside-toplevel
+        with redirect_stdout(io.StringIO()) as stdout:
+            benchmark(['--agents', '10', '--stop', '1', '--size', '10', '--operations', '100'])
+        self.assertIn('CalendarQueue', stdout.getvalue())
+
+
+class BatchDispatchTests(unittest.TestCase):  # pragma: no cover
+
+    @staticmethod
+    def run_simulation(queue_class, batch_dispatch, event_callback=False):
+        log = []
+        attrs = {'queue_class': queue_class, 'batch_dispatch': batch_dispatch}
+        if event_callback:
+            attrs['event_callback'] = lambda self, event, dt, dryrun: log.append(('event', str(event), event.deleted))
+        simcls = type('BatchSimulation', (Simulation,), attrs)
+        simulation = simcls(df=DF(), name="name", folder="folder", fobj=io.StringIO(), seed=None, start=0, stop=20)
+        agents = []
+        for i in range(50):
+            agents.append(BatchAgent(f'agent{i:02d}', log, agents))
+            simulation.register(agents[-1])
+        simulation(dryrun=True, settings={})
+        return log, simulation._events
+
+    def test_determinism(self):
+        for queue_class in [QueueHeap, EventHeap, CalendarQueue]:
+            with self.subTest(queue=queue_class.__name__):
+                log1, events1 = self.run_simulation(queue_class, False)
+                log2, events2 = self.run_simulation(queue_class, True)
+                self.assertTrue(len(log1) > 500)
+                self.assertEqual(log1, log2)
+                self.assertEqual(events1, events2)
+
+    def test_event_callback(self):
+        # event_callback is called before every event (and not for events cancelled during the batch)
+        log1, events1 = self.run_simulation(EventHeap, False, event_callback=True)
+        log2, events2 = self.run_simulation(EventHeap, True, event_callback=True)
+        self.assertEqual(log1, log2)
+        self.assertEqual(events1, events2)
+        self.assertFalse(any(entry[0] == 'event' and entry[2] for entry in log2))
+
+    def test_batch_callback_cancelled(self):
+        calls = []
+        simulation = Simulation(df=DF(), name="name", folder="folder", fobj=io.StringIO(), seed=None, start=0, stop=1)
+        simulation.event_callback = lambda event, dt, dryrun: calls.append(event)
+        agent = SimulationAgent()
+        events = [simulation.schedule(agent, 0.0, 'callback') for _ in range(2)]
+        events[1].cancel()
+        simulation.batch_callback(events, 0.0, True)
+        self.assertEqual(calls, events[:1])
+
+    def test_batch_callback(self):
+        batches = []
+
+        class BatchSimulation(Simulation):
+            batch_dispatch = True
+
+            def batch_callback(self, events, dt, dryrun):
+                batches.append((dt, len(events)))
+
+        simulation = BatchSimulation(
+            df=DF(), name="name", folder="folder", fobj=io.StringIO(), seed=None, start=0, stop=1,
+        )
+        for i in range(3):
+            simulation.register(Ticker(f'ticker{i}', 0.5))
+        simulation(dryrun=True, settings={})
+        self.assertEqual(batches, [(0.5, 3), (0.5, 3)])
+
+
+class CheckpointTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.checkpoint = os.path.join(self.directory.name, 'name.checkpoint')
+
+    def tearDown(self):
+        WritingAgent.crash = None
+        WritingAgent.method = 'write_csv'
+        self.directory.cleanup()
+
+    def simulation(self, fobj, seed='checkpoint', cls=WritingSimulation):
+        simulation = cls(
+            df=DF(), name="name", folder=self.directory.name, fobj=fobj, seed=seed, start=0, stop=50,
+        )
+        for i in range(5):
+            simulation.register(WritingAgent(f'agent{i}'))
+        return simulation
+
+    def test_resume(self):
+        expected = io.StringIO()
+        self.simulation(expected)(dryrun=False, settings={})
+
+        path = os.path.join(self.directory.name, 'name.dat')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation = self.simulation(fobj)
+            simulation.enable_checkpoints(self.checkpoint, 0)
+            WritingAgent.crash = 30
+            with self.assertRaises(RuntimeError):
+                simulation(dryrun=False, settings={})
+        WritingAgent.crash = None
+
+        # seed the global random-generator differently, the state is restored from the checkpoint
+        random.seed('other')
+        with open(path, 'r+', encoding='utf-8') as fobj:
+            simulation = WritingSimulation.load_checkpoint(self.checkpoint, fobj)
+            self.assertTrue(0 < simulation.get_time() <= 30)
+            simulation.resume(dryrun=False)
+
+        with open(path, encoding='utf-8') as fobj:
+            self.assertEqual(fobj.read(), expected.getvalue().replace('\r\n', '\n'))
+
+    def test_resume_background(self):
+        expected = io.StringIO()
+        self.simulation(expected)(dryrun=False, settings={})
+
+        path = os.path.join(self.directory.name, 'name.dat')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation = self.simulation(fobj, cls=BackgroundWritingSimulation)
+            simulation.enable_checkpoints(self.checkpoint, 0)
+            WritingAgent.crash = 30
+            with self.assertRaises(RuntimeError):
+                simulation(dryrun=False, settings={})
+            # the background thread is stopped and the file is reattached
+            self.assertIs(simulation._fobj, fobj)
+        WritingAgent.crash = None
+
+        with open(path, 'r+', encoding='utf-8') as fobj:
+            simulation = BackgroundWritingSimulation.load_checkpoint(self.checkpoint, fobj)
+            simulation.resume(dryrun=False)
+            self.assertIs(simulation._fobj, fobj)
+
+        with open(path, encoding='utf-8') as fobj:
+            self.assertEqual(fobj.read(), expected.getvalue().replace('\r\n', '\n'))
+
+    def test_resume_columns(self):
+        WritingAgent.method = 'write_columns'
+        expected = os.path.join(self.directory.name, 'expected.dat')
+        with open(expected, 'w', encoding='utf-8') as fobj:
+            self.simulation(fobj, cls=ColumnWritingSimulation)(dryrun=False, settings={})
+
+        path = os.path.join(self.directory.name, 'name.dat')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation = self.simulation(fobj, cls=ColumnWritingSimulation)
+            simulation.enable_checkpoints(self.checkpoint, 0)
+            WritingAgent.crash = 30
+            with self.assertRaises(RuntimeError):
+                simulation(dryrun=False, settings={})
+        WritingAgent.crash = None
+
+        with open(path, 'r+', encoding='utf-8') as fobj:
+            simulation = ColumnWritingSimulation.load_checkpoint(self.checkpoint, fobj)
+            simulation.resume(dryrun=False)
+
+        # checkpoints flush the buffered columns, only the block sizes differ
+        with open(path, 'rb') as fobj, open(expected, 'rb') as data:
+            self.assertEqual(
+                np.concatenate(list(read_npy(fobj))).tolist(),
+                np.concatenate(list(read_npy(data))).tolist(),
+            )
+
+    def test_not_restored(self):
+        simulation = self.simulation(io.StringIO())
+        simulation.enable_checkpoints(self.checkpoint, 3600)
+        simulation.enable_progress(None, events=10)
+        simulation.save_checkpoint()
+        simulation = WritingSimulation.load_checkpoint(self.checkpoint, io.StringIO())
+        self.assertIsNone(simulation._checkpoint)
+        self.assertIsNone(simulation._progress)
+        self.assertIsNone(simulation._csv_fieldnames)
+        self.assertEqual(simulation.next_periodic(), float('inf'))
+
+    def test_wrong_class(self):
+        self.simulation(io.StringIO()).save_checkpoint(self.checkpoint)
+        with self.assertRaises(TypeError):
+            EventHeapSimulation.load_checkpoint(self.checkpoint, io.StringIO())
+
+    def test_not_serializable(self):
+        simulation = self.simulation(io.StringIO())
+        simulation.enable_checkpoints(self.checkpoint, 0)
+        simulation.schedule(simulation, 1.0, lambda simulation: None)
+        with self.assertLogs('iams.interfaces.simulation', level='WARNING'):
+            self.assertFalse(simulation.save_checkpoint())
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(simulation.next_periodic(), float('inf'))
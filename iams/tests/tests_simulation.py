@@ -5,14 +5,32 @@ unittests for iams.simulation
 """
 # pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
 
+import multiprocessing
+import os
 import unittest
 
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from iams.simulation import IMPORTS
+from iams.simulation import execute
+from iams.simulation import get_df
+from iams.simulation import get_executor
+from iams.simulation import get_modules
+from iams.simulation import import_class
+from iams.simulation import initialize
+from iams.simulation import iterate_configs
 from iams.simulation import load_agent
 # from iams.simulation import run_simulation
 # from iams.simulation import prepare_data
 from iams.simulation import process_config
 from iams.simulation import parse_command_line
 from iams.simulation import main
+from iams.simulation import preload
+from iams.simulation import run_pool
+from iams.tests.df import DF
 
 
 class Agent(object):
@@ -60,11 +78,41 @@ class SimulationTests(unittest.TestCase):  # pragma: no cover
         self.assertEqual(result[0].h, 1)
         self.assertEqual(result[1].h, 2)
 
+    def test_import_class(self):
+        import_class.cache_clear()
+        list(load_agent(
+            agents=[{'class': 'iams.tests.tests_simulation.Agent', 'products': {'g': [1, 2, 3]}}],
+            global_settings={},
+        ))
+        result = list(process_config("/does/not/exist.yaml", {
+            'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+            'products': {'a': [1, 2, 3]},
+        }, dryrun=True))
+        self.assertEqual(import_class.cache_info().misses, 2)
+        self.assertEqual(import_class.cache_info().hits, 2)
+        # the directory facilitator is created in the worker
+        self.assertIsNone(result[0]['df'])
+        self.assertIsInstance(get_df(None), DF)
+
     def test_wrong_file(self):
         with self.assertRaises(AssertionError):
             args = parse_command_line(['--dry-run', '-q', 'iams/tests/tests_simulation.py'])
             main(args)
 
+    def test_command_line_resume(self):
+        args = parse_command_line(['--resume', '--checkpoint', '60', 'iams/tests/tests_simulation.py'])
+        args.configs[0].close()
+        self.assertTrue(args.resume)
+        self.assertEqual(args.checkpoint, 60.0)
+
+    def test_config_resume_dryrun(self):
+        result = list(process_config("/does/not/exist.yaml", {
+            'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+        }, dryrun=True, checkpoint=60, resume=True))
+        self.assertEqual(result[0]["checkpoint"], 60)
+        self.assertFalse(result[0]["resume"])
+        self.assertIsNone(result[0]["file_checkpoint"])
+
     def test_config_no_simulation_class(self):
         with self.assertRaises(ValueError):
             list(process_config("/does/not/exist.yaml", {}, dryrun=True))
@@ -82,12 +130,58 @@ class SimulationTests(unittest.TestCase):  # pragma: no cover
             }, dryrun=True))
 
     def test_config_invalid_df_class1(self):
-        with self.assertRaises(NotImplementedError):
+        with self.assertRaises(AssertionError):
             list(process_config("/does/not/exist.yaml", {
                 'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
                 'directory-facilitator': 'iams.interfaces.simulation.Queue',
             }, dryrun=True))
 
+    def test_config_invalid_df_class2(self):
+        with self.assertRaises(ModuleNotFoundError):
+            list(process_config("/does/not/exist.yaml", {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+                'directory-facilitator': 'iams.does_not_exist.DF',
+            }, dryrun=True))
+
+    def test_config_df(self):
+        with TemporaryDirectory() as directory:
+            data = []
+            for name in ['DF', 'IndexedDF', 'ArrayDF']:
+                config = {
+                    'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                    'directory-facilitator': f'iams.tests.df.{name}',
+                    'seed': 'fixed',
+                    'stop': 20,
+                    'agents': [{
+                        'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                        'products': {'name': ['agent1', 'agent2']},
+                    }],
+                }
+                path = os.path.join(directory, f'{name}.yaml')
+                with open(path, 'w', encoding='utf-8') as fobj:
+                    yaml.dump(config, fobj)
+
+                kwargs = next(process_config(path, config, dryrun=True))
+                self.assertIs(kwargs['df'], import_class('iams.tests.df', name))
+                self.assertIsInstance(get_df(kwargs['df']), kwargs['df'])
+                self.assertIn('iams.tests.df', get_modules([(path, config)]))
+
+                main(parse_command_line(['-q', path]))
+                with open(os.path.join(directory, 'results', f'{name}.dat'), encoding='utf-8') as fobj:
+                    data.append(fobj.read())
+            self.assertTrue(len(data[0]) > 100)
+            self.assertEqual(data[0], data[1])
+            self.assertEqual(data[0], data[2])
+
+    def test_config_partitions_without_lookahead(self):
+        for lookahead in [{}, {'lookahead': 0}]:
+            with self.assertRaises(ValueError):
+                list(process_config("/does/not/exist.yaml", {
+                    'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+                    'partitions': 2,
+                    **lookahead,
+                }, dryrun=True))
+
     def test_config_single(self):
         result = list(process_config("/does/not/exist.yaml", {
             'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
@@ -114,6 +208,273 @@ class SimulationTests(unittest.TestCase):  # pragma: no cover
         self.assertEqual(result[0]["name"], "exist-a-2")
         self.assertEqual(result[1]["name"], "exist-a-1")
 
+    def test_warmup(self):
+        self.warmup()
+
+    def test_warmup_max_inflight(self):
+        # the runs of the warm-up wait outside of the process pool
+        self.warmup('--max-inflight', '1')
+
+    def warmup(self, *options):
+        with TemporaryDirectory() as directory:
+            config = {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                'seed': 'fixed',
+                'stop': 20,
+                'agents': [{
+                    'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                    'products': {'name': ['agent1', 'agent2']},
+                }],
+            }
+            with open(os.path.join(directory, 'cold.yaml'), 'w', encoding='utf-8') as fobj:
+                yaml.dump(config, fobj)
+            config.update({
+                'products': {'late': [1, 2]},
+                'warmup': {'time': 10, 'products': ['late']},
+            })
+            with open(os.path.join(directory, 'warm.yaml'), 'w', encoding='utf-8') as fobj:
+                yaml.dump(config, fobj)
+
+            main(parse_command_line([
+                '-q', *options, os.path.join(directory, 'cold.yaml'), os.path.join(directory, 'warm.yaml'),
+            ]))
+
+            results = os.path.join(directory, 'results')
+            self.assertEqual(sorted(os.listdir(results)), [
+                'cold.dat', 'cold.log', 'warm-1.dat', 'warm-1.log', 'warm-2.dat', 'warm-2.log', 'warm-warmup-1.log',
+            ])
+            data = []
+            for name in ['cold.dat', 'warm-1.dat', 'warm-2.dat']:
+                with open(os.path.join(results, name), encoding='utf-8') as fobj:
+                    data.append(fobj.read())
+            self.assertTrue(len(data[0]) > 100)
+            self.assertEqual(data[0], data[1])
+            self.assertEqual(data[0], data[2])
+
+    def test_warmup_default_seed(self):
+        # the warm-up uses the seed of the run, every run with the default seed (its name) has its own warm-up
+        with TemporaryDirectory() as directory:
+            config = {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                'stop': 20,
+                'products': {'late': [1, 2]},
+                'agents': [{
+                    'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                    'settings': {'name': 'agent'},
+                }],
+            }
+            for name in ['cold', 'warm']:
+                os.mkdir(os.path.join(directory, name))
+                if name == 'warm':
+                    config['warmup'] = {'time': 10, 'products': ['late']}
+                with open(os.path.join(directory, name, 'run.yaml'), 'w', encoding='utf-8') as fobj:
+                    yaml.dump(config, fobj)
+
+            main(parse_command_line([
+                '-q', os.path.join(directory, 'cold', 'run.yaml'), os.path.join(directory, 'warm', 'run.yaml'),
+            ]))
+
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, 'warm', 'results'))), [
+                'run-1.dat', 'run-1.log', 'run-2.dat', 'run-2.log', 'run-warmup-1.log', 'run-warmup-2.log',
+            ])
+            data = {}
+            for name in ['cold', 'warm']:
+                for run in ['run-1.dat', 'run-2.dat']:
+                    with open(os.path.join(directory, name, 'results', run), encoding='utf-8') as fobj:
+                        data[name, run] = fobj.read()
+            self.assertNotEqual(data['cold', 'run-1.dat'], data['cold', 'run-2.dat'])
+            self.assertEqual(data['cold', 'run-1.dat'], data['warm', 'run-1.dat'])
+            self.assertEqual(data['cold', 'run-2.dat'], data['warm', 'run-2.dat'])
+
+    def test_failed_warmup(self):
+        started = []
+
+        def warmup_function(warmup, **kwargs):
+            if warmup['file_checkpoint'] == 'failed':
+                raise RuntimeError("warm-up failed")
+
+        def function(name, **kwargs):
+            started.append(name)
+
+        runs = [{'name': f'run{i}', 'warmup': {'file_checkpoint': 'failed' if i % 2 else 'ok'}} for i in range(4)]
+        with self.assertLogs('iams.simulation', level='ERROR') as logs:
+            run_pool(iter(runs), function, warmup_function, {}, executor=ThreadPoolExecutor(2))
+        self.assertEqual(sorted(started), ['run0', 'run2'])
+        self.assertIn('Skip "run3", its warm-up failed', '\n'.join(logs.output))
+        self.assertIn('Skip "run1", its warm-up failed', '\n'.join(logs.output))
+
+    def test_iterate_configs(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.yaml')
+            with open(path, 'w', encoding='utf-8') as fobj:
+                yaml.dump({
+                    'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+                    'products': {'a': list(range(100))},
+                }, fobj)
+            iterator = iterate_configs(parse_command_line(['--dry-run', path]))
+            self.assertEqual(next(iterator)['settings'], {'a': 0})
+            self.assertEqual([kwargs['settings']['a'] for kwargs in iterator], list(range(1, 100)))
+
+    def test_max_inflight(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.yaml')
+            with open(path, 'w', encoding='utf-8') as fobj:
+                yaml.dump({
+                    'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                    'products': {'a': [1, 2, 3, 4, 5]},
+                    'stop': 5,
+                }, fobj)
+            main(parse_command_line(['-q', '--max-inflight', '2', path]))
+            self.assertEqual(
+                sorted(name for name in os.listdir(os.path.join(directory, 'results')) if name.endswith('.dat')),
+                [f'sweep-{i}.dat' for i in range(1, 6)],
+            )
+
+    def test_get_modules(self):
+        self.assertEqual(get_modules([('a.yaml', {
+            'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+            'agents': [{'class': 'iams.tests.tests_simulation.Agent'}, {'class': 'iams.tests.tests_simulation.Agent'}],
+        }), ('b.yaml', {'simulation-class': None})]), [
+            'iams.tests.tests_interfaces_simulation', 'iams.tests.tests_simulation',
+        ])
+
+    def test_preload(self):
+        self.assertTrue(preload(['iams.tests.tests_simulation']) >= 0)
+        with self.assertRaises(ModuleNotFoundError):
+            preload(['iams.does_not_exist'])
+
+    @unittest.skipIf('fork' not in multiprocessing.get_all_start_methods(), 'fork is not available')
+    def test_get_executor_fork(self):
+        with self.assertLogs('iams.simulation', level='INFO') as logs:
+            executor = get_executor(['iams.tests.tests_simulation'], start_method='fork')
+        executor.shutdown()
+        # the modules imported while the configs are prepared are not counted in the import time
+        self.assertIn('Imported 1 modules for the workers (1 already imported, 0.000s', logs.output[0])
+
+    def test_max_tasks_per_child(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.yaml')
+            with open(path, 'w', encoding='utf-8') as fobj:
+                yaml.dump({
+                    'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                    'products': {'a': [1, 2, 3]},
+                    'stop': 5,
+                    'agents': [{
+                        'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                        'settings': {'name': 'agent'},
+                    }],
+                }, fobj)
+            with self.assertLogs('iams.simulation', level='WARNING') as logs:
+                # fork cannot replace workers, another start method is used
+                main(parse_command_line(['-q', '--max-tasks-per-child', '1', '--start-method', 'fork', path]))
+            self.assertEqual(
+                sorted(name for name in os.listdir(os.path.join(directory, 'results')) if name.endswith('.dat')),
+                ['sweep-1.dat', 'sweep-2.dat', 'sweep-3.dat'],
+            )
+            output = '\n'.join(logs.output)
+            self.assertIn('Replacing workers is not supported with the start method "fork"', output)
+            self.assertIn('Workers needed', output)
+
+    def test_execute(self):
+        runs = []
+        initialize(['iams.tests.tests_simulation'])
+        seconds = IMPORTS['worker']
+        self.assertTrue(seconds > 0)
+        self.assertEqual(execute(lambda **kwargs: runs.append(kwargs), {'name': 'run'}), seconds)
+        # the import time is only reported with the first run of a worker
+        self.assertEqual(execute(lambda **kwargs: runs.append(kwargs), {'name': 'run'}), 0.0)
+        self.assertEqual(runs, [{'name': 'run'}, {'name': 'run'}])
+
+    def test_cache(self):
+        with TemporaryDirectory() as directory:
+            cache = os.path.join(directory, 'cache')
+            config = {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                'seed': 'fixed',
+                'stop': 5,
+                'products': {'a': [1, 2]},
+                'agents': [{
+                    'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                    'settings': {'name': 'agent'},
+                }],
+            }
+
+            def run(*options, **kwargs):
+                config.update(kwargs)
+                with open(os.path.join(directory, 'cached.yaml'), 'w', encoding='utf-8') as fobj:
+                    yaml.dump(config, fobj)
+                with self.assertLogs('iams.simulation', level='WARNING') as logs:
+                    main(parse_command_line([
+                        '-q', '--single', '--cache', cache, *options, os.path.join(directory, 'cached.yaml'),
+                    ]))
+                return any('Use cached results' in line for line in logs.output)
+
+            self.assertFalse(run())
+            self.assertTrue(run())
+            # the name of a run does not matter
+            self.assertTrue(run(formatter='a{a}'))
+            with open(os.path.join(directory, 'results', 'cached-a1.dat'), encoding='utf-8') as fobj:
+                self.assertTrue(len(fobj.read()) > 10)
+            # but the settings do
+            self.assertFalse(run(products={'a': [3, 2]}))
+            self.assertFalse(run('--force'))
+
+    def test_partitions(self):
+        with TemporaryDirectory() as directory:
+            config = {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.Simulation',
+                'seed': 'fixed',
+                'stop': 10,
+                'partitions': 2,
+                'lookahead': 1.0,
+                'agents': [{
+                    'class': 'iams.tests.tests_utils_sharding.Relay',
+                    'settings': {'name': 'relay0', 'target': 'relay1', 'tokens': 1},
+                }, {
+                    'class': 'iams.tests.tests_utils_sharding.Relay',
+                    'settings': {'name': 'relay1', 'target': 'relay0'},
+                }],
+            }
+            with open(os.path.join(directory, 'sharded.yaml'), 'w', encoding='utf-8') as fobj:
+                yaml.dump(config, fobj)
+
+            main(parse_command_line(['-q', os.path.join(directory, 'sharded.yaml')]))
+
+            results = os.path.join(directory, 'results')
+            self.assertEqual(sorted(os.listdir(results)), [
+                'sharded.dat', 'sharded.dat.0', 'sharded.dat.1', 'sharded.log',
+            ])
+            # the token is passed between the partitions at 0, 1, ..., 10
+            for name, agent, count in [('sharded.dat.0', 'relay0', 6), ('sharded.dat.1', 'relay1', 5)]:
+                with open(os.path.join(results, name), encoding='utf-8') as fobj:
+                    self.assertEqual(fobj.read().count(agent), count)
+
+    def test_profile(self):
+        with TemporaryDirectory() as directory:
+            config = {
+                'simulation-class': 'iams.tests.tests_interfaces_simulation.WritingSimulation',
+                'stop': 10,
+                'agents': [{
+                    'class': 'iams.tests.tests_interfaces_simulation.WritingAgent',
+                    'settings': {'name': 'agent'},
+                }],
+            }
+            with open(os.path.join(directory, 'profiled.yaml'), 'w', encoding='utf-8') as fobj:
+                yaml.dump(config, fobj)
+
+            main(parse_command_line([
+                '-q', '--profile', '--progress-events', '5', os.path.join(directory, 'profiled.yaml'),
+            ]))
+
+            results = os.path.join(directory, 'results')
+            self.assertEqual(sorted(os.listdir(results)), [
+                'profiled.dat', 'profiled.log', 'profiled.profile', 'profiled.progress',
+            ])
+            with open(os.path.join(results, 'profiled.progress'), encoding='utf-8') as fobj:
+                self.assertTrue(len(fobj.read().splitlines()) > 2)
+            with open(os.path.join(results, 'profiled.profile'), encoding='utf-8') as fobj:
+                self.assertIn('WritingAgent', fobj.read())
+
     # def test_config_no_simulation_class(self):
     #     with self.assertRaises(ValueError):
     #         result = list(process_config("/does/not/exist.yaml", {
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+unittests for iams.utils.cache
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
+
+import os
+import unittest
+
+from tempfile import TemporaryDirectory
+
+from iams.tests.tests_interfaces_simulation import Simulation
+from iams.utils.cache import ResultCache
+from iams.utils.cache import get_key
+from iams.utils.cache import get_run_key
+
+
+class VersionedSimulation(Simulation):
+    version = 2
+
+
+class KeyTests(unittest.TestCase):  # pragma: no cover
+
+    def kwargs(self, **kwargs):
+        result = {
+            'simcls': Simulation, 'seed': 'seed', 'settings': {'a': 1, 'b': 2}, 'config': {}, 'start': 0, 'stop': 10,
+            'name': 'name', 'file_data': 'name.dat',
+        }
+        result.update(kwargs)
+        return result
+
+    def test_key(self):
+        self.assertEqual(get_key(a=1, b=[1, 2]), get_key(b=[1, 2], a=1))
+        self.assertNotEqual(get_key(a=1), get_key(a=2))
+
+    def test_run_key(self):
+        key = get_run_key(**self.kwargs())
+        # the name and the order of the settings do not matter
+        self.assertEqual(key, get_run_key(**self.kwargs(name='other', settings={'b': 2, 'a': 1})))
+        for kwargs in [
+            {'settings': {'a': 1, 'b': 3}},
+            {'seed': 'other'},
+            {'simcls': VersionedSimulation},
+            {'config': {'agents': [{'class': 'Agent'}]}},
+            {'warmup': {'seed': 'seed', 'time': 5.0}},
+        ]:
+            self.assertNotEqual(key, get_run_key(**self.kwargs(**kwargs)), kwargs)
+
+
+class ResultCacheTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.cache = ResultCache(os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name, content=None):
+        path = os.path.join(self.directory.name, name)
+        if content is not None:
+            with open(path, 'w', encoding='utf-8') as fobj:
+                fobj.write(content)
+        return path
+
+    def read(self, name):
+        with open(self.path(name), encoding='utf-8') as fobj:
+            return fobj.read()
+
+    def test_get_put(self):
+        files = {'data': self.path('run.dat', 'data'), 'log': self.path('run.log', 'log')}
+        self.assertFalse(self.cache.get('a' * 64, files))
+        self.cache.put('a' * 64, files)
+
+        files = {'data': self.path('other.dat'), 'log': self.path('other.log')}
+        self.assertTrue(self.cache.get('a' * 64, files))
+        self.assertEqual(self.read('other.dat'), 'data')
+        self.assertEqual(self.read('other.log'), 'log')
+        # entries missing a file are not used
+        self.assertFalse(self.cache.get('a' * 64, {'profile': self.path('other.profile')}))
+
+        self.cache.delete('a' * 64)
+        self.assertFalse(self.cache.get('a' * 64, files))
+
+    def test_evict(self):
+        self.cache.size = 25
+        for i, key in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+            self.cache.put(key, {'data': self.path(f'{i}.dat', 'x' * 10)})
+            os.utime(self.cache.entry(key), (i, i))
+            if i == 1:
+                # the first entry is used again
+                self.assertTrue(self.cache.get('a' * 64, {'data': self.path('copy.dat')}))
+        self.assertEqual([os.path.basename(path) for _, _, path in self.cache.entries()], ['c' * 64, 'a' * 64])
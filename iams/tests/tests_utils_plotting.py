@@ -5,10 +5,15 @@ unittests for iams.utils.auth
 """
 # pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
 
+import os
 import unittest
 
+from tempfile import TemporaryDirectory
+
 try:
     from iams.utils.plotting import PlotInterface
+    from iams.utils.writer import WRITERS
+    from iams.utils.writer import pa
 except Exception as exception:  # pylint: disable=broad-except # pragma: no cover
     SKIP = str(exception)
 else:
@@ -56,3 +61,18 @@ class PlotTests(unittest.TestCase):  # pragma: no cover
     @unittest.expectedFailure
     def test_empty(self):
         Plot()
+
+    def test_read_dataframe(self):
+        formats = [fmt for fmt in WRITERS if fmt != 'parquet' or pa is not None]
+        with TemporaryDirectory() as directory:
+            for fmt in formats:
+                path = os.path.join(directory, fmt + '.dat')
+                with open(path, 'w', encoding='utf-8') as fobj:
+                    writer = WRITERS[fmt](fobj, 2)
+                    for i in range(5):
+                        writer.write({'time': i / 2, 'agent': f'agent{i}'})
+                    writer.close()
+                dataframe = Plot.read_dataframe(path)
+                self.assertEqual(list(dataframe.columns), ['agent', 'time'], fmt)
+                self.assertEqual(dataframe['time'].tolist(), [0.0, 0.5, 1.0, 1.5, 2.0], fmt)
+                self.assertEqual(dataframe['agent'].tolist()[-1], 'agent4', fmt)
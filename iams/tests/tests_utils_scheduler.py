@@ -474,3 +474,91 @@ class BufferSchedulerTests(unittest.TestCase):  # pragma: no cover
         self.assertEqual(event.get_finish(), 1)
         self.assertEqual(event.etd, 1)
         self.assertEqual(event.duration, 2)
+
+
+@unittest.skipIf(SKIP is not None, SKIP)
+class IncrementalBufferSchedulerTests(unittest.TestCase):  # pragma: no cover
+
+    def schedule(self, incremental, model_cache_size=32):
+        scheduler = BufferScheduler(agent="simulation", horizon=20, buffer_input=2, incremental=incremental)
+        if incremental:
+            scheduler.models.size = model_cache_size
+        for eta, duration in [(0, 5), (3, 3), (3, 5)]:
+            self.assertTrue(scheduler.save(scheduler(eta=eta, duration=duration, callback=None)))
+        return scheduler
+
+    @staticmethod
+    def offers(scheduler):
+        results = []
+        for eta in range(0, 30, 2):
+            event = scheduler(eta=(eta, eta + 4), duration=3, callback=None)
+            try:
+                scheduler.can_schedule(event)
+            except CanNotSchedule:
+                results.append(None)
+            else:
+                results.append((event.eta.get(), event.get_start(), event.get_finish(), event.etd.get()))
+        return results
+
+    def test_same_results(self):
+        scheduler = self.schedule(True)
+        self.assertEqual(self.offers(scheduler), self.offers(self.schedule(False)))
+        # the offers share the structure of their model
+        self.assertTrue(len(scheduler.models) < 6)
+
+    def test_reuse(self):
+        scheduler = self.schedule(True)
+        models = len(scheduler.models)
+        model = None
+        for eta in [10, 11]:
+            event = scheduler(eta=eta, duration=2, callback=None)
+            events, makespan = scheduler.get_event_variables(event)
+            result = scheduler.build_model(events, makespan)[0]
+            self.assertTrue(model is None or model is result)
+            model = result
+        self.assertEqual(len(scheduler.models), models + 1)
+
+    def test_cache_size(self):
+        scheduler = self.schedule(True, model_cache_size=1)
+        self.offers(scheduler)
+        self.assertEqual(len(scheduler.models), 1)
+
+
+@unittest.skipIf(SKIP is not None, SKIP)
+class HintTests(unittest.TestCase):  # pragma: no cover
+
+    def schedule(self, hints):
+        scheduler = BufferScheduler(agent="simulation", horizon=20, buffer_input=2, hints=hints)
+        events = []
+        for eta, duration in [(0, 5), (3, 3), (3, 5), (8, 2)]:
+            event = scheduler(eta=(eta, eta + 4), duration=duration, callback=None)
+            self.assertTrue(scheduler.save(event))
+            events.append(event)
+        return scheduler, events
+
+    def test_statistics(self):
+        scheduler, _ = self.schedule(False)
+        self.assertEqual(scheduler.statistics['status'], 'OPTIMAL')
+        self.assertEqual(scheduler.statistics['hints'], 0)
+        statistics = scheduler.optimize_model(*scheduler.build_model(*scheduler.get_event_variables([])), None)
+        self.assertIs(statistics, scheduler.statistics)
+        self.assertEqual(set(statistics), {'status', 'objective', 'wall_time', 'branches', 'conflicts', 'hints'})
+
+        event = scheduler(eta=0, etd=[1, 1], duration=2, callback=None)
+        with self.assertRaises(CanNotSchedule):
+            scheduler.can_schedule(event)
+        self.assertNotEqual(scheduler.statistics['status'], 'OPTIMAL')
+
+    def test_hints(self):
+        scheduler, events = self.schedule(True)
+        # the last event has no schedule when it is added
+        self.assertEqual(scheduler.statistics['hints'], 12)
+        self.assertTrue(scheduler.validate())
+        self.assertEqual(scheduler.statistics['hints'], 16)
+
+        _, reference = self.schedule(False)
+        for event, other in zip(events, reference):
+            self.assertEqual(
+                (event.eta.get(), event.get_start(), event.get_finish(), event.etd.get()),
+                (other.eta.get(), other.get_start(), other.get_finish(), other.etd.get()),
+            )
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+unittests for iams.utils.sharding
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
+
+import csv
+import io
+import math
+import os
+import unittest
+
+from tempfile import TemporaryDirectory
+
+from iams.interfaces.simulation import Agent
+from iams.tests.df import DF
+from iams.tests.tests_interfaces_simulation import Simulation
+from iams.utils.sharding import Message
+from iams.utils.sharding import Shard
+from iams.utils.sharding import before
+from iams.utils.sharding import run_sharded
+
+
+class Relay(Agent):
+    """
+    passes tokens to the next agent of a ring
+    """
+    delay = 1.0
+
+    def __init__(self, name, target, tokens=0):
+        self.name = name
+        self.target = target
+        self.tokens = tokens
+
+    def __str__(self):
+        return self.name
+
+    def __call__(self, simulation, dryrun):
+        for token in range(self.tokens):
+            simulation.schedule(self, token / 4, 'receive', token, 0)
+
+    def receive(self, simulation, token, hops):
+        simulation.write_csv({'time': simulation.get_time(), 'agent': self.name, 'token': token, 'hops': hops})
+        simulation.schedule(simulation.agent(self.target), self.delay, 'receive', token, hops + 1)
+
+    def attributes(self):
+        return {}
+
+    def asdict(self):
+        return {}
+
+
+class FastRelay(Relay):
+    delay = 0.5
+
+
+class RandomRelay(Relay):
+
+    def __call__(self, simulation, dryrun):
+        self.random = simulation.get_random(self)
+        super().__call__(simulation, dryrun)
+
+    def receive(self, simulation, token, hops):
+        simulation.write_csv({'time': simulation.get_time(), 'agent': self.name, 'token': token, 'hops': hops})
+        simulation.schedule(simulation.agent(self.target), 1 + self.random.random(), 'receive', token, hops + 1)
+
+
+class ClockSimulation(Simulation):
+    """
+    writes a row every two time units from an event on the simulation itself
+    """
+
+    def setup(self, **kwargs):
+        self.schedule(self, 0.5, 'tick')
+
+    def tick(self, simulation):
+        self.write_csv({'time': self.get_time(), 'agent': 'clock', 'token': -1, 'hops': 0})
+        self.schedule(self, 2.0, 'tick')
+
+
+def ring(cls=Relay, agents=6, stop=20, simcls=Simulation):
+    df = DF()
+    simulation = simcls(df=df, name="ring", folder=None, fobj=io.StringIO(), seed=0, start=0, stop=stop)
+    for i in range(agents):
+        simulation.register(cls(f'relay{i}', f'relay{(i + 1) % agents}', tokens=i % 2 + 1))
+        df.topology.add_edge(f'relay{i}', f'relay{(i + 1) % agents}')
+    return simulation
+
+
+def read(path):
+    with open(path, encoding='utf-8') as fobj:
+        return [tuple(row.values()) for row in csv.DictReader(fobj)]
+
+
+class BeforeTests(unittest.TestCase):  # pragma: no cover
+
+    @unittest.skipIf(not hasattr(math, 'nextafter'), "needs python 3.9")
+    def test_nextafter(self):
+        for value in [0.0, -0.0, 1.0, -1.0, 0.1, 1e300, -1e-300, 5e-324, math.inf, -math.inf]:
+            self.assertEqual(before(value), math.nextafter(value, -math.inf), value)  # pylint: disable=no-member
+
+    def test_before(self):
+        self.assertTrue(before(10.0) < 10.0)
+        self.assertTrue(math.isnan(before(math.nan)))
+
+
+class PartitionTests(unittest.TestCase):  # pragma: no cover
+
+    def test_topology(self):
+        simulation = ring(agents=4)
+        for i in range(4):
+            simulation.register(Relay(f'single{i}', f'single{i}'))
+        self.assertEqual(simulation.partition_agents(2), [
+            ['relay0', 'relay1', 'relay2', 'relay3'],
+            ['single0', 'single1', 'single2', 'single3'],
+        ])
+        # components larger than an equal share are split
+        self.assertEqual(simulation.partition_agents(4), [
+            ['relay0', 'relay1'], ['relay2', 'relay3'], ['single0', 'single2'], ['single1', 'single3'],
+        ])
+
+    def test_no_topology(self):
+        simulation = ring(agents=5)
+        simulation._df.topology = None
+        self.assertEqual(
+            simulation.partition_agents(2),
+            [['relay0', 'relay2', 'relay4'], ['relay1', 'relay3']],
+        )
+
+
+class ShardTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.simulation = ring(agents=2)
+        self.shard = Shard(self.simulation, 0, [['relay0'], ['relay1']], 1.0)
+        self.shard.setup(False, {})
+
+    def test_message(self):
+        message = self.simulation.schedule(self.simulation.agent('relay1'), 1.0, 'receive', 0, 0)
+        self.assertIsInstance(message, Message)
+        message.cancel()
+        self.assertEqual(self.shard.report()[1], [])
+        with self.assertRaises(ValueError):
+            message.cancel()
+
+    def test_lookahead(self):
+        with self.assertRaises(ValueError):
+            self.simulation.schedule(self.simulation.agent('relay1'), 0.5, 'receive', 0, 0)
+
+    def test_callable(self):
+        with self.assertRaises(TypeError):
+            self.simulation.schedule(self.simulation.agent('relay1'), 1.0, lambda simulation: None)
+
+    def test_simulation_events(self):
+        # events on the simulation itself are only executed in the first partition
+        self.assertNotIsInstance(self.simulation.schedule(self.simulation, 1.0, 'setup'), Message)
+        simulation = ring(agents=2)
+        shard = Shard(simulation, 1, [['relay0'], ['relay1']], 1.0)
+        shard.setup(False, {})
+        events = simulation._events
+        message = simulation.schedule(simulation, 1.0, 'setup')
+        self.assertTrue(message.deleted)
+        self.assertEqual(simulation._events, events)
+        self.assertEqual(shard.report()[1], [])
+
+
+class ShardedRunTests(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_sharded(self, name, partitions, cls=Relay, simcls=Simulation):
+        path = os.path.join(self.directory.name, name)
+        results = run_sharded(ring(cls, simcls=simcls), partitions, 1.0, False, {}, seed=0, path=path)
+        rows = []
+        for i in range(partitions):
+            rows.extend(read(f'{path}.{i}'))
+        return results, sorted(rows)
+
+    def test_matches_sequential(self):
+        simulation = ring()
+        path = os.path.join(self.directory.name, 'sequential')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation._fobj = fobj
+            simulation(dryrun=False, settings={})
+        expected = sorted(read(path))
+
+        results, rows = self.run_sharded('sharded', 3)
+        self.assertEqual(rows, expected)
+        self.assertEqual([result['agents'] for result in results], [2, 2, 2])
+        self.assertEqual(sum(result['events'] for result in results), simulation._events)
+
+    def test_simulation_events(self):
+        simulation = ring(simcls=ClockSimulation)
+        path = os.path.join(self.directory.name, 'sequential')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation._fobj = fobj
+            simulation(dryrun=False, settings={})
+        expected = sorted(read(path))
+        self.assertEqual(len([row for row in expected if row[0] == 'clock']), 10)
+
+        results, rows = self.run_sharded('sharded', 3, simcls=ClockSimulation)
+        self.assertEqual(rows, expected)
+        self.assertEqual(sum(result['events'] for result in results), simulation._events)
+
+    def test_random_streams(self):
+        # the streams of the agents do not depend on the partitions
+        simulation = ring(RandomRelay)
+        path = os.path.join(self.directory.name, 'sequential')
+        with open(path, 'w', encoding='utf-8') as fobj:
+            simulation._fobj = fobj
+            simulation(dryrun=False, settings={})
+        self.assertEqual(self.run_sharded('sharded', 3, cls=RandomRelay)[1], sorted(read(path)))
+
+    def test_deterministic(self):
+        self.assertEqual(self.run_sharded('first', 2), self.run_sharded('second', 2))
+
+    def test_lookahead(self):
+        with self.assertRaises(RuntimeError):
+            self.run_sharded('error', 2, cls=FastRelay)
+        with self.assertRaises(ValueError):
+            run_sharded(ring(), 2, 0, False, {})
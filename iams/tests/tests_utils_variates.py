@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+unittests for iams.utils.variates
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
+
+import io
+import pickle
+import statistics
+import unittest
+
+from iams.tests.df import DF
+from iams.tests.tests_interfaces_simulation import Simulation
+from iams.utils.variates import Variates
+
+
+class VariatesTests(unittest.TestCase):  # pragma: no cover
+
+    def draw(self, buffer, count=4000):
+        return [buffer() for _ in range(count)]
+
+    def test_expovariate(self):
+        values = self.draw(Variates(0).expovariate(0.5))
+        self.assertAlmostEqual(statistics.mean(values), 2.0, delta=0.2)
+        self.assertTrue(min(values) >= 0)
+
+    def test_normalvariate(self):
+        values = self.draw(Variates(0).normalvariate(10, 2))
+        self.assertAlmostEqual(statistics.mean(values), 10.0, delta=0.2)
+        self.assertAlmostEqual(statistics.stdev(values), 2.0, delta=0.2)
+
+    def test_triangular(self):
+        values = self.draw(Variates(0).triangular(1, 3))
+        self.assertAlmostEqual(statistics.mean(values), 2.0, delta=0.1)
+        self.assertTrue(1 <= min(values) <= max(values) <= 3)
+        values = self.draw(Variates(0).triangular(0, 3, 3))
+        self.assertAlmostEqual(statistics.mean(values), 2.0, delta=0.1)
+
+    def test_empirical(self):
+        values = self.draw(Variates(0).empirical(['a', 'b']))
+        self.assertEqual(set(values), {'a', 'b'})
+        values = self.draw(Variates(0).empirical([1, 2, 3], weights=[0, 1, 3]))
+        self.assertNotIn(1, values)
+        self.assertAlmostEqual(values.count(3) / len(values), 0.75, delta=0.05)
+
+    def test_block_size(self):
+        # the values do not depend on the block size or the other buffers
+        first = Variates('seed', block=7)
+        second = Variates('seed', block=1000)
+        buffer = first.expovariate()
+        self.assertEqual(
+            [buffer() for _ in range(20)] + self.draw(first.normalvariate(), 20),
+            self.draw(second.expovariate(), 20) + self.draw(second.normalvariate(), 20),
+        )
+        self.assertNotEqual(self.draw(Variates('other').expovariate(), 20), self.draw(Variates('seed').expovariate(), 20))  # noqa: E501
+
+    def test_pickle(self):
+        buffer = Variates(0, block=10).expovariate()
+        self.draw(buffer, 5)
+        copy = pickle.loads(pickle.dumps(buffer))
+        self.assertEqual(self.draw(copy, 20), self.draw(buffer, 20))
+
+
+class SimulationVariatesTests(unittest.TestCase):  # pragma: no cover
+
+    def simulation(self, seed='variates'):
+        return Simulation(df=DF(), name="name", folder=None, fobj=io.StringIO(), seed=seed, start=0, stop=None)
+
+    def test_reproducible(self):
+        first, second = self.simulation(), self.simulation()
+        self.assertIs(first.get_variates('agent'), first.get_variates('agent'))
+        self.assertEqual(
+            self.draw(first.get_variates('agent').expovariate()),
+            self.draw(second.get_variates('agent').expovariate()),
+        )
+        self.assertNotEqual(
+            self.draw(first.get_variates('other').expovariate()),
+            self.draw(first.get_variates().expovariate()),
+        )
+        self.assertNotEqual(
+            self.draw(self.simulation('other').get_variates('agent').expovariate()),
+            self.draw(second.get_variates('agent').expovariate()),
+        )
+
+    @staticmethod
+    def draw(buffer):
+        return [buffer() for _ in range(10)]
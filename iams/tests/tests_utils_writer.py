@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+unittests for iams.utils.writer
+"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,protected-access
+
+import io
+import pickle
+import threading
+import unittest
+
+from iams.utils.writer import BackgroundWriter
+from iams.utils.writer import Column
+from iams.utils.writer import CsvWriter
+from iams.utils.writer import NpyWriter
+from iams.utils.writer import ParquetWriter
+from iams.utils.writer import detect_format
+from iams.utils.writer import get_writer
+from iams.utils.writer import pa
+from iams.utils.writer import read_npy
+
+
+RECORDS = [{'time': i / 2, 'count': i, 'agent': f'agent{i % 3}', 'busy': bool(i % 2)} for i in range(10)]
+
+
+class ColumnTests(unittest.TestCase):  # pragma: no cover
+
+    def test_types(self):
+        self.assertEqual(Column(1).data.typecode, 'q')
+        self.assertEqual(Column(1.0).data.typecode, 'd')
+        self.assertEqual(Column(True).data, [])
+        self.assertEqual(Column('a').data, [])
+
+    def test_mixed(self):
+        column = Column(1)
+        column.append(1)
+        column.append(1.5)
+        self.assertEqual(column.data, [1, 1.5])
+        self.assertEqual(column.to_numpy().tolist(), [1.0, 1.5])
+        column.clear()
+        self.assertEqual(len(column), 0)
+
+    def test_objects(self):
+        column = Column(None)
+        column.append(None)
+        column.append('a')
+        self.assertEqual(column.to_numpy().tolist(), ['None', 'a'])
+
+
+class WriterTests(unittest.TestCase):  # pragma: no cover
+
+    @staticmethod
+    def write(writer_class, fobj, block=4):
+        writer = writer_class(fobj, block)
+        for record in RECORDS:
+            writer.write(record)
+        writer.close()
+        return writer
+
+    def test_npy(self):
+        fobj = io.BytesIO()
+        writer = self.write(NpyWriter, fobj)
+        self.assertEqual(writer.blocks, 3)
+        fobj.seek(0)
+        self.assertEqual(detect_format(fobj), 'npy')
+        blocks = list(read_npy(fobj))
+        self.assertEqual([len(block) for block in blocks], [4, 4, 2])
+        self.assertEqual(blocks[0].dtype.names, ('agent', 'busy', 'count', 'time'))
+        self.assertEqual([dict(zip(block.dtype.names, row)) for block in blocks for row in block.tolist()], RECORDS)
+
+    def test_csv(self):
+        fobj = io.StringIO()
+        self.write(CsvWriter, fobj)
+        self.assertEqual(fobj.getvalue().split('\r\n')[:3], ['agent,busy,count,time', 'agent0,False,0,0.0', 'agent1,True,1,0.5'])  # noqa: E501
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_parquet(self):
+        fobj = io.BytesIO()
+        self.write(ParquetWriter, fobj)
+        fobj.seek(0)
+        self.assertEqual(detect_format(fobj), 'parquet')
+        self.assertEqual(pa.parquet.read_table(fobj).to_pylist(), [dict(sorted(r.items())) for r in RECORDS])
+
+    def test_parquet_checkpoint(self):
+        with self.assertRaises(TypeError):
+            pickle.dumps(ParquetWriter(io.BytesIO()))
+
+    def test_pickle(self):
+        writer = NpyWriter(io.BytesIO())
+        writer.write(RECORDS[0])
+        writer = pickle.loads(pickle.dumps(writer))
+        self.assertIsNone(writer._fobj)
+        writer.attach(io.BytesIO())
+        writer.write(RECORDS[1])
+        self.assertEqual(writer.length, 2)
+
+    def test_fields(self):
+        writer = NpyWriter(io.BytesIO())
+        writer.write(RECORDS[0])
+        with self.assertRaises(ValueError):
+            writer.write({'time': 1.0})
+
+    def test_get_writer(self):
+        self.assertIsInstance(get_writer(io.BytesIO()), NpyWriter)
+        self.assertIsInstance(get_writer(io.StringIO(), 'csv'), CsvWriter)
+        with self.assertLogs('iams.utils.writer', level='WARNING'):
+            self.assertIsInstance(get_writer(io.StringIO(), 'npy'), CsvWriter)
+
+    def test_text_file(self):
+        fobj = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        writer = get_writer(fobj, 'npy')
+        writer.write(RECORDS[0])
+        writer.close()
+        fobj.seek(0)
+        self.assertEqual(detect_format(fobj.buffer), 'npy')
+
+
+class BlockingFile(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.event = threading.Event()
+
+    def write(self, s):
+        self.event.wait()
+        return super().write(s)
+
+
+class FailingFile(io.StringIO):
+
+    def write(self, s):
+        raise OSError("disk full")
+
+
+class BackgroundWriterTests(unittest.TestCase):  # pragma: no cover
+
+    def test_write(self):
+        fobj = io.StringIO()
+        writer = BackgroundWriter(fobj, maxsize=2, chunk=10)
+        for i in range(100):
+            writer.write(f'{i}\n')
+        self.assertEqual(writer.tell(), len(fobj.getvalue()))
+        writer.close()
+        self.assertEqual(fobj.getvalue(), ''.join(f'{i}\n' for i in range(100)))
+        self.assertTrue(writer.closed)
+        with self.assertRaises(ValueError):
+            writer.write('x')
+        writer.close()
+
+    def test_backpressure(self):
+        fobj = BlockingFile()
+        writer = BackgroundWriter(fobj, maxsize=1, chunk=1)
+        writer.write('a')  # written by the (blocked) thread
+        writer.write('b')  # queued
+        thread = threading.Thread(target=writer.write, args=('c',))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        fobj.event.set()
+        thread.join()
+        writer.close()
+        self.assertEqual(fobj.getvalue(), 'abc')
+
+    def test_exception(self):
+        writer = BackgroundWriter(FailingFile(), chunk=1)
+        writer.write('a')
+        with self.assertRaises(OSError):
+            writer.flush()
+        with self.assertRaises(OSError):
+            writer.write('b')
+        with self.assertRaises(OSError):
+            writer.close()
+        self.assertTrue(writer.closed)
+
+    def test_binary(self):
+        buffer = io.BytesIO()
+        fobj = io.TextIOWrapper(buffer, encoding='utf-8')
+        writer = BackgroundWriter(fobj)
+        columns = get_writer(writer, 'npy')
+        writer.write('text')
+        columns.write(RECORDS[0])
+        columns.close()
+        writer.write('text')
+        writer.close()
+        data = buffer.getvalue()
+        self.assertTrue(data.startswith(b'text\x93NUMPY'))
+        self.assertTrue(data.endswith(b'text'))
+
+    def test_no_buffer(self):
+        writer = BackgroundWriter(io.StringIO())
+        self.assertFalse(hasattr(writer, 'buffer'))
+        with self.assertLogs('iams.utils.writer', level='WARNING'):
+            self.assertIsInstance(get_writer(writer, 'npy'), CsvWriter)
+        writer.close()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+content-addressed cache of simulation results
+
+The results of a run are stored under the hash of everything that
+determines them (simulation class and its ``version``, seed, settings,
+agents, ...), so runs can be renamed or reordered without being executed
+again, while a changed setting gives a new key. Every entry is a directory
+with copies of the output files of the run. The entries are touched when
+they are used and the least recently used entries are removed when the
+cache grows beyond its size.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from iams import __version__
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_key(**parts):
+    """
+    returns the hash of the (json-serializable) parts of a run
+    """
+    data = json.dumps(parts, sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def get_run_key(simcls, seed, settings, config, start, stop, **kwargs):  # pylint: disable=too-many-arguments
+    """
+    returns the key of a run prepared by :func:`iams.simulation.process_config`
+    """
+    warmup = kwargs.get('warmup')
+    parts = {}
+    if kwargs.get('df') is not None:
+        parts['df'] = f"{kwargs['df'].__module__}.{kwargs['df'].__qualname__}"
+    return get_key(
+        **parts,
+        iams=__version__,
+        simulation=f'{simcls.__module__}.{simcls.__qualname__}',
+        version=getattr(simcls, 'version', None),
+        seed=seed,
+        settings=settings,
+        agents=config.get('agents', []),
+        start=start,
+        stop=stop,
+        partitions=kwargs.get('partitions'),
+        lookahead=kwargs.get('lookahead'),
+        warmup=warmup and {'seed': warmup['seed'], 'time': warmup['time']},
+    )
+
+
+class ResultCache:
+    """
+    stores the output files of runs in ``path``, limited to ``size`` bytes
+    """
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = size
+
+    def entry(self, key):
+        """
+        directory of an entry
+        """
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key, files):
+        """
+        copies the files of an entry to ``files`` (name -> path) and returns if the entry exists
+        """
+        entry = self.entry(key)
+        try:
+            names = set(os.listdir(entry))
+        except FileNotFoundError:
+            return False
+        if not set(files).issubset(names):
+            return False
+
+        for name, path in files.items():
+            shutil.copyfile(os.path.join(entry, name), path)
+        os.utime(entry)
+        logger.debug("Restored %s from %s", sorted(files), entry)
+        return True
+
+    def put(self, key, files):
+        """
+        stores the existing ``files`` (name -> path) as the entry ``key`` and removes old entries
+        """
+        entry = self.entry(key)
+        temporary = f'{entry}.{os.getpid()}'
+        os.makedirs(temporary, exist_ok=True)
+        for name, path in files.items():
+            if path and os.path.exists(path):
+                shutil.copyfile(path, os.path.join(temporary, name))
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(temporary, entry)
+        except OSError:  # pragma: no cover
+            # the same entry was just stored by another process
+            shutil.rmtree(temporary, ignore_errors=True)
+        logger.debug("Stored %s in %s", sorted(files), entry)
+        self.evict()
+
+    def delete(self, key):
+        """
+        removes an entry
+        """
+        shutil.rmtree(self.entry(key), ignore_errors=True)
+
+    def entries(self):
+        """
+        returns the entries as (last use, size, path), oldest first
+        """
+        entries = []
+        for prefix in os.scandir(self.path):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if not entry.is_dir() or '.' in entry.name:
+                    continue
+                try:
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except FileNotFoundError:  # pragma: no cover
+                    pass  # removed by another process
+        return sorted(entries)
+
+    def evict(self):
+        """
+        removes the least recently used entries until the cache fits into its size
+        """
+        if self.size is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.size:
+                break
+            logger.debug("Remove %s from the cache", path)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+event sets of simulations
+"""
+
+import logging
+
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import dataclass
+from dataclasses import field
+from enum import Enum
+from functools import total_ordering
+from heapq import heapify
+from heapq import heappop
+from heapq import heappush
+from heapq import nsmallest
+from time import perf_counter
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(Enum):
+    """
+    Event-states enum
+    """
+    HIGHEST = 1
+    HIGH = 3
+    NORMAL = 5
+    LOW = 7
+    LOWEST = 9
+
+
+def get_priority(priority):
+    """
+    returns the priority enum from a priority or its (case insensitive) name
+    """
+    if isinstance(priority, Priority):
+        return priority
+    try:
+        return Priority[priority.upper()]
+    except (AttributeError, KeyError):
+        return Priority.NORMAL
+
+
+@total_ordering
+@dataclass(frozen=True)
+class Queue:  # pylint: disable=too-many-instance-attributes
+    """
+    Storage of simulation events
+    """
+    time: float = field(compare=True, repr=True, hash=False)
+    obj: Any = field(compare=False, repr=False, hash=False)
+    callback: str = field(compare=False, repr=True, hash=False)
+    dt: float = field(compare=True, repr=False, hash=False)  # pylint: disable=invalid-name
+    priority: Priority = field(default=Priority.NORMAL, compare=True, repr=True, hash=True)
+    args: list = field(compare=False, repr=False, default_factory=list, hash=False)
+    kwargs: dict = field(compare=False, repr=False, default_factory=dict, hash=False)
+    deleted: bool = field(compare=False, repr=False, hash=False, default=False)
+    queue: Any = field(compare=False, repr=False, hash=False, default=None)
+    function: Any = field(compare=False, repr=False, hash=False, default=None)
+    # insertion order of events with equal keys
+    sequence: int = field(compare=False, repr=False, hash=False, default=0)
+
+    def __str__(self):
+        return "%.4f:%s:%s" % (self.time, self.obj, self.callback)  # pylint: disable=consider-using-f-string
+
+    def __lt__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) < \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __le__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) <= \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) == \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __ne__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) != \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __ge__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) >= \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __gt__(self, other):
+        if isinstance(other, Queue):
+            return (self.time, self.priority.value, other.dt, self.sequence) > \
+                (other.time, other.priority.value, self.dt, other.sequence)
+        raise NotImplementedError
+
+    def __post_init__(self):
+        if isinstance(self.priority, str):
+            object.__setattr__(self, 'priority', get_priority(self.priority))
+
+    def cancel(self):
+        """
+        cancel event from queue
+        """
+        if not self.deleted:
+            object.__setattr__(self, 'deleted', True)
+            if self.queue is not None:
+                self.queue.cancel(self)
+
+
+class Event:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    Lightweight handle of a simulation event (used by :class:`EventHeap`)
+    """
+    __slots__ = (
+        'time', 'obj', 'callback', 'dt', 'priority', 'args', 'kwargs', 'deleted', 'queue', 'function', 'sequence',
+    )
+
+    def __init__(self, time, obj, callback, dt, priority, args, kwargs, queue=None, function=None, sequence=0):  # pylint: disable=too-many-arguments,invalid-name  # noqa: E501
+        self.time = time
+        self.obj = obj
+        self.callback = callback
+        self.dt = dt  # pylint: disable=invalid-name
+        self.priority = priority
+        self.args = args
+        self.kwargs = kwargs
+        self.deleted = False
+        self.queue = queue
+        self.function = function
+        self.sequence = sequence
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__qualname__}"
+            f"(time={self.time!r}, callback={self.callback!r}, priority={self.priority!r})"
+        )
+
+    def __str__(self):
+        return "%.4f:%s:%s" % (self.time, self.obj, self.callback)  # pylint: disable=consider-using-f-string
+
+    def cancel(self):
+        """
+        cancel event from queue
+        """
+        if not self.deleted:
+            self.deleted = True
+            if self.queue is not None:
+                self.queue.cancel(self)
+
+
+class EventSet(ABC):
+    """
+    Storage of pending simulation events
+
+    The simulation pushes new events with :meth:`push` and retrieves them with
+    :meth:`pop` in the order ``(time, priority, -dt)``.
+
+    Cancelled events stay in the storage until they are popped. Their number is
+    tracked and the storage is rebuilt without them as soon as they exceed the
+    fraction ``compaction`` of all stored events.
+    """
+
+    def __init__(self, compaction=0.5, minimum=1024):
+        self.compaction = compaction
+        self.minimum = minimum
+        self.cancellations = 0
+        self.cancelled = 0
+        self.compactions = 0
+        self.peak = 0
+
+    def cancel(self, event):  # pylint: disable=unused-argument
+        """
+        called by the events handle when it is cancelled
+        """
+        self.cancellations += 1
+        self.cancelled += 1
+        if self.cancelled >= self.minimum and self.cancelled > self.compaction * len(self):
+            self.compact()
+
+    def compact(self):
+        """
+        removes all cancelled events from the storage
+        """
+        logger.debug("Removing %s cancelled events from queue", self.cancelled)
+        self.rebuild()
+        self.cancelled = 0
+        self.compactions += 1
+
+    @abstractmethod
+    def rebuild(self):
+        """
+        rebuilds the storage without cancelled events
+        """
+
+    @abstractmethod
+    def __len__(self):
+        """
+        returns the number of stored events (including cancelled ones)
+        """
+
+    @abstractmethod
+    def push(self, time, obj, callback, dt, priority, args, kwargs, function=None):  # pylint: disable=too-many-arguments,invalid-name  # noqa: E501
+        """
+        adds a new event and returns its handle
+
+        ``function`` is the resolved callback (see :meth:`iams.interfaces.simulation.SimulationInterface.get_function`)
+        """
+
+    @abstractmethod
+    def pop(self):
+        """
+        removes and returns the next event
+        """
+
+    @abstractmethod
+    def peek(self):
+        """
+        returns the next event which is not cancelled without removing it (or None)
+        """
+
+    @abstractmethod
+    def push_back(self, event):
+        """
+        re-inserts a popped event with its original position in the order
+        """
+
+    def pop_batch(self):
+        """
+        removes and returns all (not cancelled) events sharing the time and priority of the next event
+        """
+        batch = []
+        event = self.peek()
+        if event is not None:
+            time_, priority = event.time, event.priority
+            while event is not None and event.time == time_ and event.priority is priority:
+                batch.append(self.pop())
+                event = self.peek()
+        return batch
+
+
+class QueueHeap(EventSet):
+    """
+    Binary heap of :class:`Queue` objects (default)
+
+    The events get a sequence number, which keeps the insertion order of
+    otherwise equal events (like :class:`EventHeap`).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._heap = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, time, obj, callback, dt, priority, args, kwargs, function=None):  # pylint: disable=too-many-arguments  # noqa: E501
+        self._counter += 1
+        event = Queue(
+            time=time, obj=obj, callback=callback, dt=dt, priority=priority, args=args, kwargs=kwargs, queue=self,
+            function=function, sequence=self._counter,
+        )
+        heappush(self._heap, event)
+        if len(self._heap) > self.peak:
+            self.peak = len(self._heap)
+        return event
+
+    def pop(self):
+        event = heappop(self._heap)
+        if event.deleted:
+            self.cancelled -= 1
+        else:
+            object.__setattr__(event, 'queue', None)
+        return event
+
+    def peek(self):
+        heap = self._heap
+        while heap and heap[0].deleted:
+            heappop(heap)
+            self.cancelled -= 1
+        return heap[0] if heap else None
+
+    def push_back(self, event):
+        object.__setattr__(event, 'queue', self)
+        heappush(self._heap, event)
+
+    def rebuild(self):
+        self._heap = [event for event in self._heap if not event.deleted]
+        heapify(self._heap)
+
+
+class EventHeap(EventSet):
+    """
+    Binary heap of precomputed ``(time, priority, -dt, sequence)`` keys
+
+    The keys are plain tuples, so the heap operations compare them in C
+    instead of calling :meth:`Queue.__lt__`. The sequence number makes every
+    key unique and keeps the insertion order of otherwise equal events.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._heap = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, time, obj, callback, dt, priority, args, kwargs, function=None):  # pylint: disable=too-many-arguments  # noqa: E501
+        priority = get_priority(priority)
+        self._counter += 1
+        event = Event(time, obj, callback, dt, priority, args, kwargs, self, function, self._counter)
+        heappush(self._heap, (time, priority.value, -dt, self._counter, event))
+        if len(self._heap) > self.peak:
+            self.peak = len(self._heap)
+        return event
+
+    def pop(self):
+        event = heappop(self._heap)[4]
+        if event.deleted:
+            self.cancelled -= 1
+        else:
+            event.queue = None
+        return event
+
+    def peek(self):
+        heap = self._heap
+        while heap and heap[0][4].deleted:
+            heappop(heap)
+            self.cancelled -= 1
+        return heap[0][4] if heap else None
+
+    def push_back(self, event):
+        event.queue = self
+        heappush(self._heap, (event.time, event.priority.value, -event.dt, event.sequence, event))
+
+    def rebuild(self):
+        self._heap = [entry for entry in self._heap if not entry[4].deleted]
+        heapify(self._heap)
+
+
+class CalendarQueue(EventSet):  # pylint: disable=too-many-instance-attributes
+    """
+    Calendar queue (R. Brown, 1988) with ``(time, priority, -dt, sequence)`` keys
+
+    The events are distributed over buckets of the time-width ``width`` (a
+    bucket holds every event which is scheduled in its timeframe modulo the
+    number of buckets). The buckets are small heaps, so events sharing a
+    bucket are ordered exactly like in :class:`EventHeap`. The number of
+    buckets is doubled or halved with the number of stored events and the
+    width is estimated from the next pending events on each resize. Insert
+    and pop are O(1) amortised for (approximately) uniform workloads, i.e.
+    events scheduled on a fixed-resolution grid.
+    """
+
+    def __init__(self, width=1.0, buckets=16, **kwargs):
+        super().__init__(**kwargs)
+        self._buckets = [[] for i in range(buckets)]
+        self._bucket = 0
+        self._counter = 0
+        self._last = 0.0
+        self._length = 0
+        self._minimum = buckets
+        self._width = width
+
+    def __len__(self):
+        return self._length
+
+    def push(self, time, obj, callback, dt, priority, args, kwargs, function=None):  # pylint: disable=too-many-arguments  # noqa: E501
+        priority = get_priority(priority)
+        self._counter += 1
+        event = Event(time, obj, callback, dt, priority, args, kwargs, self, function, self._counter)
+        self.insert((time, priority.value, -dt, self._counter, event))
+        return event
+
+    def push_back(self, event):
+        event.queue = self
+        self.insert((event.time, event.priority.value, -event.dt, event.sequence, event))
+
+    def insert(self, entry):
+        """
+        inserts a key into its bucket
+        """
+        bucket = int(entry[0] // self._width)
+        if bucket < self._bucket:
+            self._bucket = bucket
+        heappush(self._buckets[bucket % len(self._buckets)], entry)
+        self._length += 1
+        if self._length > self.peak:
+            self.peak = self._length
+        if self._length > 2 * len(self._buckets):
+            self.resize(2 * len(self._buckets))
+
+    def locate(self):
+        """
+        returns the bucket containing the next event
+        """
+        buckets = self._buckets
+        length = len(buckets)
+        width = self._width
+        index = self._bucket
+
+        for _ in range(length):
+            bucket = buckets[index % length]
+            if bucket and bucket[0][0] // width <= index:
+                break
+            index += 1
+        else:
+            # the events are sparse compared to the width: direct search
+            index = int(min(bucket[0] for bucket in buckets if bucket)[0] // width)
+            bucket = buckets[index % length]
+
+        self._bucket = index
+        return bucket
+
+    def pop(self):
+        if not self._length:
+            raise IndexError("pop from empty queue")
+
+        length = len(self._buckets)
+        entry = heappop(self.locate())
+        self._last = entry[0]
+        self._length -= 1
+
+        event = entry[4]
+        if event.deleted:
+            self.cancelled -= 1
+        else:
+            event.queue = None
+
+        if length > self._minimum and self._length < length // 2:
+            self.resize(length // 2)
+        return event
+
+    def peek(self):
+        while self._length:
+            bucket = self.locate()
+            if not bucket[0][4].deleted:
+                return bucket[0][4]
+            self.pop()
+        return None
+
+    def entries(self):
+        """
+        iterator over all stored keys
+        """
+        for bucket in self._buckets:
+            yield from bucket
+
+    def rebuild(self):
+        self.resize(len(self._buckets), [entry for entry in self.entries() if not entry[4].deleted])
+
+    def resize(self, length, entries=None):
+        """
+        redistributes the events on ``length`` buckets and estimates a new width
+        """
+        if entries is None:
+            entries = list(self.entries())
+
+        # the width is estimated from the average separation of the next events
+        sample = sorted({entry[0] for entry in nsmallest(25, entries)})
+        if len(sample) > 1:
+            self._width = 3 * (sample[-1] - sample[0]) / (len(sample) - 1)
+
+        self._buckets = [[] for i in range(length)]
+        for entry in entries:
+            self._buckets[int(entry[0] // self._width) % length].append(entry)
+        for bucket in self._buckets:
+            heapify(bucket)
+
+        self._bucket = int((sample[0] if sample else self._last) // self._width)
+        self._length = len(entries)
+
+
+class AttributeCallback:  # pylint: disable=too-few-public-methods
+    """
+    Calls the attribute ``name`` of an object (used for callbacks which are no methods)
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, obj, *args, **kwargs):
+        return getattr(obj, self.name)(*args, **kwargs)
+
+
+class CallableCallback:  # pylint: disable=too-few-public-methods
+    """
+    Calls ``function`` without the object (used for callables passed as callbacks)
+    """
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, obj, *args, **kwargs):  # pylint: disable=unused-argument
+        return self.function(*args, **kwargs)
+
+
+class ProfiledCallback:  # pylint: disable=too-few-public-methods
+    """
+    counts the calls, wall-time and scheduled events (fan-out) of a callback
+    """
+    __slots__ = ('function', 'stats')
+
+    def __init__(self, function, stats):
+        self.function = function
+        self.stats = stats
+
+    def __call__(self, obj, simulation, *args, **kwargs):
+        stats = self.stats
+        events = simulation._events  # pylint: disable=protected-access
+        timer = perf_counter()
+        try:
+            return self.function(obj, simulation, *args, **kwargs)
+        finally:
+            stats[1] += perf_counter() - timer
+            stats[0] += 1
+            stats[2] += simulation._events - events  # pylint: disable=protected-access
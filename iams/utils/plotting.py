@@ -12,6 +12,9 @@ from pathlib import Path
 
 import pandas as pd
 
+from iams.utils.writer import detect_format
+from iams.utils.writer import read_npy
+
 
 class PlotInterface(ABC):
     """
@@ -92,12 +95,25 @@ class PlotInterface(ABC):
         """
         return str(path).rsplit('.', 1)[0]
 
+    @staticmethod
+    def read_dataframe(path):
+        """
+        reads the data written by the simulation (CSV, parquet or numpy blocks from write_columns)
+        """
+        with open(path, 'rb') as fobj:
+            fmt = detect_format(fobj)
+            if fmt == 'npy':
+                return pd.concat([pd.DataFrame(block) for block in read_npy(fobj)], ignore_index=True)
+        if fmt == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+
     @classmethod
     def load_dataframe(cls, path, parameters):
         """
         load the pandas dataframe for path
         """
-        dataframe = cls.prepare_individual_dataframe(pd.read_csv(path))
+        dataframe = cls.prepare_individual_dataframe(cls.read_dataframe(path))
         basename = cls.basename(path)
         data = {}
 
@@ -5,6 +5,7 @@ ortools implementation for scheduler
 """
 
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass
 # from operator import attrgetter
 from ortools.sat.python import cp_model
@@ -17,6 +18,8 @@ from iams.interfaces import SchedulerState
 
 logger = logging.getLogger(__name__)
 
+INTERVALS = {"i": "interval_i", "p": "interval_p", "o": "interval_o"}
+
 
 @dataclass
 class Interval:
@@ -254,18 +257,55 @@ class Event(SchedulerEvent):
         return data
 
 
+class ModelCache(OrderedDict):
+    """
+    least recently used models of the scheduler, keyed by the structure of the events
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+
+    def get_model(self, key, build):
+        """
+        returns the cached model and its variables of key or builds them with build()
+        """
+        try:
+            model, slots = self[key]
+        except KeyError:
+            model, slots = self[key] = build()
+            if len(self) > self.size:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+            model.ClearHints()
+        return model, slots
+
+
 class BufferScheduler(SchedulerInterface):
     """
     Generic scheduler class for buffers
     """
     # pylint: disable=too-many-locals,too-many-statements,too-many-branches,too-many-function-args
+    # the options and the statistics of the solver add to the attributes of the horizon and the buffers
+    # pylint: disable=too-many-instance-attributes
     event_class = Event
+    # number of models cached in incremental mode
+    model_cache_size = 32
 
     def __init__(self, horizon, resolution=1,  # pylint: disable=keyword-arg-before-vararg,too-many-arguments
                  buffer_input=1, buffer_output=1,
-                 *args, **kwargs):
+                 *args, incremental=False, hints=False, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # reuse the models of events with the same structure
+        self.models = ModelCache(self.model_cache_size) if incremental else None
+        # start the solver from the last schedule of the events (off by default: on the small
+        # models of the rolling-horizon benchmark the solver was slower with hints than without)
+        self.hints = hints
+        # statistics of the last solve (see optimize_model), also set if it fails
+        self.statistics = None
+
         self._horizon = horizon
         self._resolution = resolution
 
@@ -280,6 +320,13 @@ class BufferScheduler(SchedulerInterface):
             buffer_output = [buffer_output]
         self.buffer_output = dict(enumerate(buffer_output, 1))
 
+    @property
+    def incremental(self):
+        """
+        are the models cached?
+        """
+        return self.models is not None
+
     def __call__(self, **kwargs):
         kwargs.update({"scheduler": self})
         return super().__call__(**kwargs)
@@ -324,12 +371,16 @@ class BufferScheduler(SchedulerInterface):
     def add(self, event, now=None):
         """
         schedule the event
+
+        returns the event, the statistics of the solver are kept in ``statistics``
         """
         return self.solve_model(event, now, save=True)
 
     def can_schedule(self, event, now=None):
         """
         can the new event be scheduled?
+
+        returns the event, the statistics of the solver are kept in ``statistics``
         """
         return self.solve_model(event, now, save=False)
 
@@ -419,73 +470,104 @@ class BufferScheduler(SchedulerInterface):
         eta_min eta eta_max start <duration> finish etd_min etd etd_max
 
         constraints: eta <= start <= finish <= etd
-        """
-        model = cp_model.CpModel()
 
+        in incremental mode the models are cached by the structure of the
+        events (states, variables, intervals and order) and only the domains
+        of the variables are updated
+        """
         offset = makespan[0]
         horizon = makespan[1] - offset
 
+        if self.incremental:
+            model, slots = self.models.get_model(self.get_model_key(events), lambda: self.build_skeleton(events))
+        else:
+            model, slots = self.build_skeleton(events)
+
+        for data, variables in zip(events.values(), slots):
+            for name, domain in self.get_domains(data, offset, horizon).items():
+                variables[name].Proto().domain[:] = domain
+
+        return model, dict(zip(events.keys(), slots)), offset
+
+    @staticmethod
+    def get_model_key(events):
+        """
+        returns the structure of the events, events with the same structure share a model
+        """
+        signatures = []
         for event, data in events.items():
-            # logger.debug("build model for %s", event)
-            new_data = {}
-            number = data.pop("number")
+            intervals = tuple(
+                (name, data[name].start_name, data[name].end_name, data[name].duration_name)
+                for name in INTERVALS.values() if name in data
+            )
+            signatures.append((event.state, tuple(sorted(data['ranges'])), intervals))
+        order = sorted(range(len(signatures)), key=list(events.keys()).__getitem__)
+        return tuple(signatures), tuple(order)
+
+    @staticmethod
+    def get_domains(data, offset, horizon):
+        """
+        returns the lower and upper bounds of the variables of an event
+        """
+        domains = {}
+        for variable in data['ranges']:
+            lower, upper = data[variable]
+            domains[variable] = [
+                0 if lower is None else lower - offset,
+                horizon if upper is None else upper - offset,
+            ]
+
+        for name in INTERVALS.values():
+            if name not in data or data[name].duration_name in domains:
+                continue
+            interval = data[name]
+            duration = horizon if interval.duration is None else interval.duration
+            domains[interval.duration_name] = [0 if interval.optional else duration, duration]
+        return domains
+
+    def build_skeleton(self, events):
+        """
+        creates the model with the variables, intervals and constraints of the events (without domains)
+        """
+        model = cp_model.CpModel()
+        slots = []
+
+        for data in events.values():
+            variables = {}
+            number = data["number"]
 
-            # create variables that don't have an upper limit
             for variable in data['ranges']:
-                lower, upper = data.pop(variable)
-                if lower is None:
-                    lower = 0
-                else:
-                    lower -= offset
-                if upper is None:
-                    upper = horizon
-                else:
-                    upper -= offset
-
-                new_data[variable] = model.NewIntVar(
-                    lower,
-                    upper,
-                    f'{variable}_{number}',
-                )
+                variables[variable] = model.NewIntVar(0, 0, f'{variable}_{number}')
 
             # intervals
             previous = None
-            for key, name in {"i": "interval_i", "p": "interval_p", "o": "interval_o"}.items():
+            for key, name in INTERVALS.items():
                 if name not in data:
                     continue
 
                 interval = data[name]
 
                 # load fixed values
-                if interval.start_name not in new_data:
+                if interval.start_name not in variables:
                     raise ValueError(f"Need to set {interval.start_name}")
 
-                if interval.end_name not in new_data:
+                if interval.end_name not in variables:
                     raise ValueError(f"Need to set {interval.end_name}")
 
-                if interval.duration_name not in new_data:
-                    # pylint: disable=protected-access
-                    if interval.duration is None:
-                        duration = horizon
-                    else:
-                        duration = interval.duration
-
-                    new_data[interval.duration_name] = model.NewIntVar(
-                        0 if interval.optional else duration,
-                        duration,
-                        f'{interval.duration_name}_{number}',
+                if interval.duration_name not in variables:
+                    variables[interval.duration_name] = model.NewIntVar(
+                        0, 0, f'{interval.duration_name}_{number}',
                     )
 
-                new_data[name] = model.NewIntervalVar(
-                    new_data[interval.start_name],  # start
-                    new_data[interval.duration_name],  # size
-                    new_data[interval.end_name],  # end
+                variables[name] = model.NewIntervalVar(
+                    variables[interval.start_name],  # start
+                    variables[interval.duration_name],  # size
+                    variables[interval.end_name],  # end
                     f'int_{key}_{number}',
                 )
 
-                # print("add constraint %s <= %s" % (previous, interval.start_name))
                 if previous:
-                    model.Add(new_data[previous] <= new_data[interval.start_name])
+                    model.Add(variables[previous] <= variables[interval.start_name])
                 previous = interval.start_name
 
             # TODO
@@ -495,8 +577,9 @@ class BufferScheduler(SchedulerInterface):
             #         new_data[name] = model.NewIntVar(1, len(storage), var)
             #     else:
             #         new_data[name] = model.NewIntVar(data[name], data[name], var)
-            events[event] = new_data
+            slots.append(variables)
 
+        events = dict(zip(events.keys(), slots))
         previous = None
         states_eta = {SchedulerState.NEW, SchedulerState.SCHEDULED, SchedulerState.ARRIVED}
         for event in sorted(events.keys()):
@@ -510,22 +593,46 @@ class BufferScheduler(SchedulerInterface):
                 #     model.Add(events[previous]["finish"] <= events[event]["finish"])
             previous = event
 
-        intervals = [data["interval_i"] for data in events.values() if "interval_i" in data]
+        intervals = [data["interval_i"] for data in slots if "interval_i" in data]
         model.AddCumulative(intervals, [1] * len(intervals), self.buffer_input[1])
-        intervals = [data["interval_p"] for data in events.values() if "interval_p" in data]
+        intervals = [data["interval_p"] for data in slots if "interval_p" in data]
         model.AddCumulative(intervals, [1] * len(intervals), 1)
-        intervals = [data["interval_o"] for data in events.values() if "interval_o" in data]
+        intervals = [data["interval_o"] for data in slots if "interval_o" in data]
         model.AddCumulative(intervals, [1] * len(intervals), self.buffer_input[1])
 
         # minimize this
-        model.Minimize(sum([data["etd"] for data in events.values()]))  # noqa # pylint: disable=consider-using-generator
+        model.Minimize(sum([data["etd"] for data in slots]))  # noqa # pylint: disable=consider-using-generator
 
-        return model, events, offset
+        return model, slots
 
-    def optimize_model(self, model, events, offset, now, save):  # pylint: disable=too-many-arguments
+    def add_hints(self, model, events, offset, now):
+        """
+        adds the last schedule of the events as hints (warm start) to the model and returns the number of hints
         """
-        optimizes the model with a CP-solver
+        model.ClearHints()
+        hints = 0
+        for event, data in events.items():
+            eta = event.eta.get(now)
+            etd = event.etd.get(now)
+            for name, value in [
+                ("eta", None if eta is None else self.convert_resolution(eta)),
+                ("start", event.get_start(now)),
+                ("finish", event.get_finish(now)),
+                ("etd", None if etd is None else self.convert_resolution(etd)),
+            ]:
+                if value is not None and name in data:
+                    model.AddHint(data[name], value - offset)
+                    hints += 1
+        return hints
+
+    def optimize_model(self, model, events, offset, now):
+        """
+        optimizes the model with a CP-solver and returns the statistics of the solver
+
+        The statistics (status, objective, wall_time, branches, conflicts and
+        the number of hints) are kept in ``statistics``.
         """
+        hints = self.add_hints(model, events, offset, now) if self.hints else 0
         solver = cp_model.CpSolver()
 
         try:
@@ -534,6 +641,15 @@ class BufferScheduler(SchedulerInterface):
             logger.exception("Solver failed")
             raise CanNotSchedule('Solver failed') from exception
 
+        self.statistics = {
+            "status": solver.StatusName(),
+            "objective": solver.ObjectiveValue(),
+            "wall_time": solver.WallTime(),
+            "branches": solver.NumBranches(),
+            "conflicts": solver.NumConflicts(),
+            "hints": hints,
+        }
+
         # solver needs to be optimal to result in a match
         if solver.StatusName() not in ["OPTIMAL"]:
             raise CanNotSchedule(f'Solver returned {solver.StatusName()}')
@@ -609,9 +725,7 @@ class BufferScheduler(SchedulerInterface):
 
         #         previous = event
 
-        if not save:
-            return True
-        return None
+        return self.statistics
 
     @staticmethod
     def optimize_eta(events, event):
@@ -625,13 +739,13 @@ class BufferScheduler(SchedulerInterface):
         optimize event's etd
         """
 
-    def solve_model(self, new_event, now=None, save=False):
+    def solve_model(self, new_event, now=None, save=False):  # pylint: disable=unused-argument
         """
         solve model with linear optimization
         """
         # pylint: disable=unused-variable
         new_events, makespan = self.get_event_variables(new_event, now=now)
         model, events, offset = self.build_model(new_events, makespan)
-        self.optimize_model(model, events, offset, now, save)
+        self.optimize_model(model, events, offset, now)
 
         return new_event
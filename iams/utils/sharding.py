@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sharded execution of a single simulation in several processes
+
+The agents are partitioned (see :meth:`SimulationInterface.partition_agents`)
+and every partition runs in its own process with a copy of the simulation.
+Events scheduled on agents of other partitions are sent as messages and need
+a delay of at least ``lookahead``. The partitions are synchronized with time
+windows: every window starts at the earliest pending event of all partitions
+and ends ``lookahead`` later, so no message can arrive inside the window it
+was sent in. Messages are delivered in a fixed order at the end of a window,
+which makes the results deterministic for a given seed and number of
+partitions. Agents drawing from the streams of
+:meth:`SimulationInterface.get_random` get the same numbers in every
+partition (the global random-state differs).
+
+Agents of other partitions are only copies; they should only be used as the
+target of scheduled events. Events scheduled on the simulation itself are
+only executed in the first partition.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import random
+import struct
+import traceback
+
+from math import inf
+
+from iams.utils.events import get_priority
+
+
+logger = logging.getLogger(__name__)
+
+
+def before(value):
+    """
+    returns the largest float smaller than value (like ``math.nextafter(value, -inf)`` of python 3.9)
+    """
+    if value != value or value == -inf:  # pylint: disable=comparison-with-itself
+        return value
+    if value == 0:
+        return -5e-324
+    bits = struct.unpack('<q', struct.pack('<d', value))[0]
+    return struct.unpack('<d', struct.pack('<q', bits - 1 if value > 0 else bits + 1))[0]
+
+
+class Message:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    event scheduled on an agent of another partition
+    """
+    __slots__ = (
+        'time', 'priority', 'dt', 'source', 'sequence', 'target', 'callback', 'args', 'kwargs', 'deleted', 'sent',
+    )
+
+    def __init__(self, time, priority, dt, source, sequence, target, callback, args, kwargs):  # pylint: disable=too-many-arguments,redefined-outer-name,invalid-name  # noqa: E501
+        self.time = time
+        self.priority = priority
+        self.dt = dt  # pylint: disable=invalid-name
+        self.source = source
+        self.sequence = sequence
+        self.target = target
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.deleted = False
+        self.sent = False
+
+    def __getstate__(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<Message {self.target}.{self.callback} at {self.time} from partition {self.source}>'
+
+    def key(self):
+        """
+        delivery order of the messages
+        """
+        return (self.time, self.priority.value, -self.dt, self.source, self.sequence)
+
+    def cancel(self):
+        """
+        cancels the message (only possible in the window it was scheduled in)
+        """
+        if self.sent:
+            raise ValueError(f"{self!r} was already sent")
+        self.deleted = True
+
+
+class Shard:
+    """
+    runs one partition of the simulation (in a worker process)
+    """
+
+    def __init__(self, simulation, index, partitions, lookahead):
+        self.index = index
+        self.lookahead = lookahead
+        self.outbox = []
+        self.owned = [simulation.agent(name) for name in partitions[index]]
+        self.remote = {}
+        for i, names in enumerate(partitions):
+            if i != index:
+                for name in names:
+                    self.remote[id(simulation.agent(name))] = (i, name)
+        self.sequence = 0
+        self.simulation = simulation
+
+    def setup(self, dryrun, settings):
+        """
+        sets up the simulation and initializes the agents of the partition
+        """
+        simulation = self.simulation
+        simulation.bind_fast_mode()
+        simulation.set_router(self.route)
+
+        logger.info("=== Setup simulation (partition %s)", self.index)
+        simulation.setup(**settings)
+
+        logger.info("=== Init %s agents", len(self.owned))
+        for agent in self.owned:
+            agent(simulation, dryrun)
+        return self.report()
+
+    def route(self, obj, dt, callback, args, priority, kwargs):  # pylint: disable=too-many-arguments,invalid-name
+        """
+        sends events on agents of other partitions as messages (router of the simulation)
+
+        Returns None for local events. Events on the simulation itself are
+        dropped in all but the first partition (a cancelled message is returned).
+        """
+        if obj is self.simulation:
+            if not self.index:
+                return None
+            target = None
+        else:
+            try:
+                target = self.remote[id(obj)]
+            except KeyError:
+                return None
+            if dt < self.lookahead:
+                raise ValueError(f"{obj}.{callback} is scheduled with {dt} on another partition (lookahead {self.lookahead})")  # noqa: E501
+
+        if not isinstance(callback, str):
+            if getattr(callback, '__self__', None) is not obj:
+                raise TypeError(f"{callback!r} cannot be sent to another partition")
+            callback = callback.__name__
+
+        self.sequence += 1
+        message = Message(
+            self.simulation.get_time() + dt, get_priority(priority), dt, self.index, self.sequence,
+            target, callback, args, kwargs,
+        )
+        if target is None:
+            message.deleted = True
+        else:
+            self.outbox.append(message)
+        return message
+
+    def deliver(self, messages):
+        """
+        inserts the messages from other partitions in the event queue
+        """
+        simulation = self.simulation
+        for message in messages:
+            obj = simulation.agent(message.target[1])
+            simulation._events += 1  # pylint: disable=protected-access
+            simulation._queue.push(  # pylint: disable=protected-access
+                message.time, obj, message.callback, message.dt, message.priority, message.args, message.kwargs,
+                simulation.get_function(obj, message.callback),
+            )
+
+    def window(self, dryrun, end, messages):
+        """
+        delivers the messages and processes all events before ``end``
+        """
+        simulation = self.simulation
+        self.deliver(messages)
+        limit = simulation._limit  # pylint: disable=protected-access
+        simulation._limit = before(end) if limit is None else min(before(end), limit)  # pylint: disable=protected-access  # noqa: E501
+        try:
+            simulation.process(dryrun)
+        finally:
+            simulation._limit = limit  # pylint: disable=protected-access
+        return self.report()
+
+    def report(self):
+        """
+        returns the time of the next event, the messages sent and if the simulation was stopped
+        """
+        event = self.simulation._queue.peek()  # pylint: disable=protected-access
+        outbox = [message for message in self.outbox if not message.deleted]
+        for message in self.outbox:
+            message.sent = True
+        self.outbox = []
+        return inf if event is None else event.time, outbox, self.simulation._stopped  # pylint: disable=protected-access  # noqa: E501
+
+    def stop(self, dryrun):
+        """
+        stops the agents of the partition and the simulation
+        """
+        simulation = self.simulation
+        simulation._events -= len(simulation._queue)  # pylint: disable=protected-access
+        for agent in self.owned:
+            try:
+                agent.stop(simulation, dryrun)
+            except (AttributeError, TypeError, NotImplementedError):
+                logger.debug("%s does not provide a stop method", agent)
+        simulation.stop(dryrun)
+        simulation.close_output()
+        return {
+            'partition': self.index,
+            'agents': len(self.owned),
+            'events': simulation._events,  # pylint: disable=protected-access
+            'time': simulation.get_time(),
+        }
+
+
+def worker(connection, data, index, partitions, lookahead, dryrun, settings, seed, path):  # pylint: disable=too-many-arguments  # noqa: E501
+    """
+    process of a partition, answers the commands of :func:`run_sharded`
+    """
+    try:
+        random.seed(f'{seed}-{index}')
+        simulation = pickle.loads(data)
+        with open(path or os.devnull, 'w', encoding='utf-8') as fobj:
+            simulation.attach_output(fobj)
+            shard = Shard(simulation, index, partitions, lookahead)
+            connection.send(shard.setup(dryrun, settings))
+            while True:
+                command, end, messages = connection.recv()
+                if command == 'stop':
+                    connection.send(shard.stop(dryrun))
+                    break
+                connection.send(shard.window(dryrun, end, messages))
+    except Exception:  # pylint: disable=broad-except
+        connection.send(RuntimeError(f"partition {index} failed:\n{traceback.format_exc()}"))
+    finally:
+        connection.close()
+
+
+def receive(connections):
+    """
+    receives the answers of all partitions (raises the errors of the partitions)
+    """
+    answers = [connection.recv() for connection in connections]
+    for answer in answers:
+        if isinstance(answer, Exception):
+            raise answer
+    return answers
+
+
+def synchronize(connections, lookahead, limit):
+    """
+    delivers the messages and runs the windows until all partitions are finished, returns the number of windows
+    """
+    windows = 0
+    answers = receive(connections)
+    while True:
+        inbox = [[] for _ in connections]
+        for _, outbox, _ in answers:
+            for message in outbox:
+                inbox[message.target[0]].append(message)
+        for messages in inbox:
+            messages.sort(key=Message.key)
+
+        start = min([answer[0] for answer in answers] + [messages[0].time for messages in inbox if messages])
+        if any(answer[2] for answer in answers) or start == inf or limit is not None and start > limit:
+            return windows
+
+        windows += 1
+        for connection, messages in zip(connections, inbox):
+            connection.send(('window', start + lookahead, messages))
+        answers = receive(connections)
+
+
+def run_sharded(simulation, partitions, lookahead, dryrun, settings, seed=None, path=None):  # pylint: disable=too-many-arguments,too-many-locals  # noqa: E501
+    """
+    runs a simulation with registered agents in ``partitions`` processes
+
+    Every partition writes its data to ``{path}.{index}`` and the summaries
+    of the partitions are returned.
+    """
+    if lookahead <= 0:
+        raise ValueError("The lookahead needs to be positive")
+    names = simulation.partition_agents(partitions)
+    logger.info("=== Start %s partitions with %s agents", partitions, [len(part) for part in names])
+
+    data = pickle.dumps(simulation)
+    context = multiprocessing.get_context()
+    connections = []
+    processes = []
+    for index in range(partitions):
+        connection, child = context.Pipe()
+        process = context.Process(
+            target=worker,
+            args=(child, data, index, names, lookahead, dryrun, settings, seed, path and f'{path}.{index}'),
+            name=f'partition-{index}',
+        )
+        process.start()
+        child.close()
+        connections.append(connection)
+        processes.append(process)
+
+    try:
+        windows = synchronize(connections, lookahead, simulation._limit)  # pylint: disable=protected-access
+        for connection in connections:
+            connection.send(('stop', None, None))
+        results = receive(connections)
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    logger.info(
+        "=== Processed %s events in %s windows (%s partitions)",
+        sum(result['events'] for result in results), windows, partitions,
+    )
+    return results
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+state registry of simulations
+"""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class StateRegistry:
+    """
+    keeps the numeric state fields declared by the agents (``state_fields``) in one numpy array
+
+    Every agent gets a view of its fields as ``agent.state`` and updates it
+    in place, a snapshot is a copy of the array. The column names are
+    computed once on registration.
+    """
+
+    def __init__(self, size=64):
+        if np is None:  # pragma: no cover
+            raise ImportError("numpy is required for agents with state_fields")
+        self.agents = []
+        self.columns = []
+        self.length = 0
+        self.values = np.zeros(size)
+
+    def __len__(self):
+        return self.length
+
+    def __setstate__(self, state):
+        # the views of the agents are restored as copies
+        self.__dict__.update(state)
+        self.bind()
+
+    def register(self, agent):
+        """
+        adds the state fields of agent and binds its view
+        """
+        offset, length = self.length, len(agent.state_fields)
+        self.length += length
+        self.columns.extend(f'{agent}_{key}' for key in agent.state_fields)
+        self.agents.append((agent, offset, length))
+
+        if self.length > len(self.values):
+            values = np.zeros(max(2 * len(self.values), self.length))
+            values[:offset] = self.values[:offset]
+            self.values = values
+            self.bind()
+        else:
+            agent.state = self.values[offset:self.length]
+
+    def bind(self):
+        """
+        binds the views of all agents
+        """
+        for agent, offset, length in self.agents:
+            agent.state = self.values[offset:offset + length]
+
+    def snapshot(self):
+        """
+        returns a copy of the state values
+        """
+        return self.values[:self.length].copy()
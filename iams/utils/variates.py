@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+buffered random variates for simulation agents
+
+The variates are generated with numpy in blocks and served one by one,
+which is a lot cheaper than drawing scalars from :mod:`random`. Every buffer
+has its own generator (spawned from the seed in the order the buffers are
+created), so the values do not depend on the block size or on other buffers.
+"""
+
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class Buffer:
+    """
+    returns the next variate when called and generates a new block when the buffer is exhausted
+    """
+    __slots__ = ('block', 'function', 'kwargs', '_iterator')
+
+    def __init__(self, function, block, **kwargs):
+        self.block = block
+        self.function = function
+        self.kwargs = kwargs
+        self._iterator = iter(())
+
+    def __call__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._iterator = iter(self.function(size=self.block, **self.kwargs).tolist())
+            return next(self._iterator)
+
+
+class Variates:
+    """
+    creates buffers of random variates with independent generators derived from ``seed``
+    """
+
+    def __init__(self, seed, block=1024):
+        if np is None:  # pragma: no cover
+            raise ImportError("numpy is required for buffered random variates")
+        if isinstance(seed, str):
+            seed = int.from_bytes(hashlib.sha256(seed.encode()).digest(), 'big')
+        self.block = block
+        self.sequence = np.random.SeedSequence(seed)
+
+    def generator(self):
+        """
+        returns a new numpy generator
+        """
+        return np.random.Generator(np.random.PCG64(self.sequence.spawn(1)[0]))
+
+    def expovariate(self, lambd=1.0):
+        """
+        exponential distribution with the rate ``lambd`` (like :func:`random.expovariate`)
+        """
+        return Buffer(self.generator().exponential, self.block, scale=1.0 / lambd)
+
+    def normalvariate(self, mu=0.0, sigma=1.0):  # pylint: disable=invalid-name
+        """
+        normal distribution (like :func:`random.normalvariate`)
+        """
+        return Buffer(self.generator().normal, self.block, loc=mu, scale=sigma)
+
+    def triangular(self, low=0.0, high=1.0, mode=None):
+        """
+        triangular distribution (like :func:`random.triangular`, mode defaults to the midpoint)
+        """
+        if mode is None:
+            mode = (low + high) / 2
+        return Buffer(self.generator().triangular, self.block, left=low, mode=mode, right=high)
+
+    def empirical(self, values, weights=None):
+        """
+        draws from the (observed) values, optionally with weights (like :func:`random.choices`)
+        """
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            weights = weights / weights.sum()
+        return Buffer(self.generator().choice, self.block, a=np.asarray(values), p=weights)
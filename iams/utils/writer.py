@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+buffered columnar writers for simulation results
+
+Records (dictionaries) are collected in typed columns and written in blocks:
+
+- ``npy``: a stream of structured numpy arrays (one ``.npy`` record per block)
+- ``parquet``: a parquet file with one row group per block (requires pyarrow)
+- ``csv``: CSV rows (fallback if the format is not available or the file is not binary)
+
+:class:`BackgroundWriter` moves the writing of the (serialized) output to a thread.
+"""
+
+import csv
+import io
+import logging
+import queue
+import threading
+
+from abc import ABC
+from abc import abstractmethod
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+
+logger = logging.getLogger(__name__)
+
+NPY_MAGIC = b'\x93NUMPY'
+PARQUET_MAGIC = b'PAR1'
+
+
+class Column:
+    """
+    buffers the values of a column in an array (int or float) or a list (everything else)
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, value):
+        if isinstance(value, bool):
+            self.data = []
+        elif isinstance(value, int):
+            self.data = array('q')
+        elif isinstance(value, float):
+            self.data = array('d')
+        else:
+            self.data = []
+
+    def __len__(self):
+        return len(self.data)
+
+    def append(self, value):
+        """
+        appends a value, changes the array to a list if the value does not fit
+        """
+        try:
+            self.data.append(value)
+        except (OverflowError, TypeError):
+            self.data = list(self.data)
+            self.data.append(value)
+
+    def clear(self):
+        """
+        removes the values but keeps the type of the column
+        """
+        if isinstance(self.data, array):
+            self.data = array(self.data.typecode)
+        else:
+            self.data = []
+
+    def to_numpy(self):
+        """
+        returns the values as numpy array (objects which have no numpy type are converted to strings)
+        """
+        if isinstance(self.data, array):
+            return np.frombuffer(self.data, dtype=self.data.typecode).copy()
+        data = np.array(self.data)
+        if data.dtype.kind == 'O':
+            data = np.array([str(value) for value in self.data])
+        return data
+
+
+class ColumnWriter(ABC):
+    """
+    collects records in columns and writes them in blocks of ``block`` records
+    """
+    def __init__(self, fobj, block=65536):
+        self.block = block
+        self.blocks = 0
+        self.columns = None
+        self.fieldnames = None
+        self.length = 0
+        self._fobj = fobj
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_fobj'] = None
+        return state
+
+    def attach(self, fobj):
+        """
+        attaches the writer to a (reopened) file object
+        """
+        self._fobj = fobj
+
+    def write(self, data):
+        """
+        buffers a data dictionary
+        """
+        if self.columns is None:
+            self.fieldnames = sorted(data.keys())
+            self.columns = [Column(data[name]) for name in self.fieldnames]
+        elif len(data) != len(self.fieldnames):
+            raise ValueError(f"dict contains different fields than fieldnames: {sorted(data.keys())}")
+
+        for name, column in zip(self.fieldnames, self.columns):
+            column.append(data[name])
+        self.length += 1
+        if self.length >= self.block:
+            self.flush()
+
+    def flush(self):
+        """
+        writes the buffered records as a block
+        """
+        if not self.length:
+            return
+        self.write_block()
+        self.blocks += 1
+        self.length = 0
+        for column in self.columns:
+            column.clear()
+
+    def close(self):
+        """
+        writes the buffered records and finalizes the output
+        """
+        self.flush()
+
+    def binary(self):
+        """
+        returns the binary stream of the file object
+        """
+        if isinstance(self._fobj, BackgroundWriter):
+            return self._fobj.buffer
+        if isinstance(self._fobj, io.TextIOBase):
+            self._fobj.flush()
+            return self._fobj.buffer
+        return self._fobj
+
+    @abstractmethod
+    def write_block(self):
+        """
+        writes the buffered records
+        """
+
+
+class CsvWriter(ColumnWriter):
+    """
+    writes the blocks as CSV (with a header before the first block)
+    """
+    def write_block(self):
+        writer = csv.writer(self._fobj)
+        if self.blocks == 0:
+            writer.writerow(self.fieldnames)
+        writer.writerows(zip(*[column.data for column in self.columns]))
+
+
+class NpyWriter(ColumnWriter):
+    """
+    writes every block as a structured numpy array
+    """
+    def write_block(self):
+        data = [column.to_numpy() for column in self.columns]
+        block = np.empty(self.length, dtype=[(name, value.dtype) for name, value in zip(self.fieldnames, data)])
+        for name, value in zip(self.fieldnames, data):
+            block[name] = value
+        np.lib.format.write_array(self.binary(), block, allow_pickle=False)
+
+
+class ParquetWriter(ColumnWriter):
+    """
+    writes every block as a row group of a parquet file (cannot be checkpointed)
+    """
+    def __init__(self, fobj, block=65536):
+        super().__init__(fobj, block)
+        self._writer = None
+
+    def __getstate__(self):
+        raise TypeError("parquet output cannot be saved in a checkpoint")
+
+    @staticmethod
+    def to_arrow(column):
+        """
+        returns the values of the column as an arrow array
+        """
+        if isinstance(column.data, list):
+            try:
+                return pa.array(column.data)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+        return pa.array(column.to_numpy())
+
+    def write_block(self):
+        table = pa.table([self.to_arrow(column) for column in self.columns], names=self.fieldnames)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.binary(), table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'npy': NpyWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def get_writer(fobj, fmt='npy', block=65536):
+    """
+    returns a column writer for fobj, falls back to CSV if the format is not available
+    """
+    cls = WRITERS[fmt]
+    if cls is NpyWriter and np is None or cls is ParquetWriter and pa is None:  # pragma: no cover
+        logger.warning("Cannot write %s, the required libraries are not installed (using CSV)", fmt)
+        cls = CsvWriter
+    elif cls is not CsvWriter and isinstance(fobj, io.TextIOBase) and not hasattr(fobj, 'buffer'):
+        logger.warning("Cannot write %s to %r (using CSV)", fmt, fobj)
+        cls = CsvWriter
+    return cls(fobj, block)
+
+
+def detect_format(fobj):
+    """
+    returns the format of the data in a binary file object (without changing its position)
+    """
+    position = fobj.tell()
+    magic = fobj.read(len(NPY_MAGIC))
+    fobj.seek(position)
+    if magic == NPY_MAGIC:
+        return 'npy'
+    if magic.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    return 'csv'
+
+
+def read_npy(fobj):
+    """
+    yields the blocks written by :class:`NpyWriter`
+    """
+    while True:
+        try:
+            yield np.load(fobj, allow_pickle=False)
+        except EOFError:
+            return
+
+
+class BinaryChannel:
+    """
+    binary stream of a :class:`BackgroundWriter` (used by the column writers)
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    @property
+    def closed(self):
+        """
+        True if the background writer is closed
+        """
+        return self.writer.closed
+
+    def write(self, data):
+        """
+        hands the data to the background thread
+        """
+        self.writer.handover()
+        self.writer.put(self.writer.write_binary, bytes(data))
+        return len(data)
+
+    def flush(self):
+        """
+        flushes the background writer
+        """
+        self.writer.flush()
+
+
+class BackgroundWriter(io.TextIOBase):
+    """
+    collects the written text in chunks of ``chunk`` characters which are written by a background thread
+
+    The queue holds at most ``maxsize`` chunks, writing blocks if it is full
+    (backpressure). Exceptions of the thread are raised on the next write,
+    flush or close.
+    """
+
+    def __init__(self, fobj, maxsize=64, chunk=65536):
+        super().__init__()
+        self.chunk = chunk
+        self.fobj = fobj
+        self._binary = BinaryChannel(self) if hasattr(fobj, 'buffer') else None
+        self._data = []
+        self._exception = None
+        self._queue = queue.Queue(maxsize)
+        self._size = 0
+        threading.Thread(target=self.worker, name="BackgroundWriter", daemon=True).start()
+
+    @property
+    def buffer(self):
+        """
+        binary stream (if fobj has one)
+        """
+        if self._binary is None:
+            raise AttributeError(f"{self.fobj!r} has no binary buffer")
+        return self._binary
+
+    def worker(self):
+        """
+        writes the queued chunks to fobj
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._exception is None:
+                    item[0](item[1])
+            except Exception as exception:  # pylint: disable=broad-except
+                self._exception = exception
+            finally:
+                self._queue.task_done()
+
+    def write_binary(self, data):
+        """
+        writes data to the binary buffer of fobj (called from the thread)
+        """
+        self.fobj.flush()
+        self.fobj.buffer.write(data)
+
+    def check(self):
+        """
+        raises the exception of the thread or a ValueError if the writer is closed
+        """
+        if self._exception is not None:
+            raise self._exception
+        # pylint infers the closed property of io.TextIOBase as a method
+        if self.closed:  # pylint: disable=using-constant-test
+            raise ValueError("I/O operation on closed file.")
+
+    def put(self, function, data):
+        """
+        queues data which is written with function (blocks if the queue is full)
+        """
+        self.check()
+        self._queue.put((function, data))
+
+    def handover(self):
+        """
+        hands the collected text to the background thread
+        """
+        if self._data:
+            data, self._data, self._size = ''.join(self._data), [], 0
+            self.put(self.fobj.write, data)
+
+    def write(self, data):
+        self.check()
+        self._data.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk:
+            self.handover()
+        return len(data)
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        self.handover()
+        self._queue.join()
+        if self._exception is not None:
+            raise self._exception
+        self.fobj.flush()
+
+    def tell(self):
+        self.flush()
+        return self.fobj.tell()
+
+    def close(self):
+        if self.closed:  # pylint: disable=using-constant-test
+            return
+        try:
+            self.flush()
+        finally:
+            # the thread marks the None as done when it stops
+            self._queue.put(None)
+            self._queue.join()
+            super().close()